@@ -21,7 +21,12 @@ def requires_auth(endpoint_class):
 
     :param endpoint_class: the 'class' to which the decorated endpoint belongs
                            to.  Can be 'resource' (resource endpoint), 'item'
-                           (item endpoint) and 'home' for the API entry point.
+                           (item endpoint), 'home' for the API entry point and
+                           'admin' for administrative endpoints.
+
+    .. versionchanged:: 2.2
+       Support for 'admin' endpoints, which are restricted to ADMIN_ROLES,
+       and forbidden when authentication or ADMIN_ROLES are not set.
 
     .. versionchanged:: 0.0.7
        Passing the 'resource' argument when inoking auth.authenticate()
@@ -67,6 +72,17 @@ def requires_auth(endpoint_class):
                     else:
                         roles += resource["allowed_item_write_roles"]
                 auth = resource_auth(resource_name)
+            elif endpoint_class == "admin":
+                # administrative endpoints are never public: without
+                # authentication or ADMIN_ROLES nobody is an administrator.
+                if request.method != "OPTIONS" and not (
+                    app.auth and app.config["ADMIN_ROLES"]
+                ):
+                    abort(403)
+                resource_name = resource = None
+                public = ["OPTIONS"]
+                roles = list(app.config["ADMIN_ROLES"])
+                auth = app.auth
             else:
                 # home or media endpoints
                 resource_name = resource = None
@@ -87,6 +103,22 @@ def requires_auth(endpoint_class):
     return fdec
 
 
+def admin_request():
+    """Returns True if the current request is authorized with ADMIN_ROLES,
+    the roles allowed to access administrative endpoints and features. Always
+    False when the API has no authentication or ADMIN_ROLES is empty, so that
+    administrative features are never exposed to anonymous clients, nor to
+    every authenticated user.
+
+    .. versionadded:: 2.2
+    """
+    auth = app.auth
+    roles = list(app.config["ADMIN_ROLES"])
+    if not auth or not roles:
+        return False
+    return bool(auth.authorized(roles, None, request.method))
+
+
 class BasicAuth():
     """Implements Basic AUTH logic. Should be subclassed to implement custom
     authentication checking.
@@ -11,6 +11,41 @@
     :copyright: (c) 2017 by Nicola Iarocci.
     :license: BSD, see LICENSE for more details.
 
+    .. versionchanged:: 2.2
+       'MONGO_QUERY_GUARD' added and set to None.
+       'MONGO_GUARD_MAX_TIME_MS' added and set to 1000.
+       'MONGO_INDEX_CACHE_TTL' added and set to 300.
+       'MONGO_ALLOW_DISK_USE' added and set to False.
+       'QUERY_STATS' added and set to False.
+       'QUERY_STATS_MAX_SHAPES' added and set to 1000.
+       'QUERY_STATS_ENDPOINT' added and set to None.
+       'ADMIN_ROLES' added and set to [].
+       'MONGO_READ_PREFERENCE' added and set to None.
+       'MONGO_CAUSAL_CONSISTENCY' added and set to False.
+       'CAUSAL_TOKEN_HEADER' added and set to 'X-Causal-Token'.
+       'MONGO_MAX_TIME_MS' added and set to None.
+       'REQUEST_TIMEOUT_HEADER' added and set to 'Request-Timeout'.
+       'MONGO_RETRY_AFTER' added and set to 1.
+       503 added to 'STANDARD_ERRORS'.
+       'MONGO_INDEXED_SOFT_DELETE' added and set to False.
+       'QUERY_HINT' added and set to 'hint'.
+       'QUERY_EXPLAIN' added and set to 'explain'.
+       'QUERY_NAMED' added and set to 'query'.
+       'MATERIALIZATIONS_COLLECTION' added and set to 'materializations'.
+       'VALIDATION_ENGINE' added and set to 'cerberus'.
+       'BULK_INGEST' added and set to False.
+       'BULK_INGEST_URL' added and set to 'ingest'.
+       'BULK_INGEST_CHUNK_SIZE' added and set to 1000.
+       'BULK_ORDERED' added and set to True.
+       'BULK_WRITE' added and set to False.
+       'BULK_WRITE_URL' added and set to 'bulk'.
+       'DIRECT_WRITES' added and set to False.
+       'PATCH_OPERATORS' added and set to [].
+       'GROUP_COMMIT' added and set to False.
+       'GROUP_COMMIT_WINDOW_MS' added and set to 5.
+       'GROUP_COMMIT_MAX_SIZE' added and set to 100.
+       'GROUP_COMMIT_STATS_ENDPOINT' added and set to None.
+
     .. versionchanged:: 2.0
        'MONGO_OPTIONS', 'uuidRepresentation' option added.
 
@@ -132,9 +167,13 @@ NORMALIZE_DOTTED_FIELDS = True
 # is retuned as string, while multiple errors are returned as a list).
 VALIDATION_ERROR_AS_LIST = False
 
+# payloads are validated by Cerberus. Set to "compiled" to validate them with
+# functions generated from the resource schemas.
+VALIDATION_ENGINE = "cerberus"
+
 # codes for which we want to return a standard response which includes
 # a JSON body with the status, code, and description.
-STANDARD_ERRORS = [400, 401, 403, 404, 405, 406, 409, 410, 412, 422, 428, 429]
+STANDARD_ERRORS = [400, 401, 403, 404, 405, 406, 409, 410, 412, 422, 428, 429, 503]
 
 # field returned on GET requests so we know if we have the latest copy even if
 # we access a specific version
@@ -178,6 +217,21 @@ JSONP_ARGUMENT = None  # JSONP disabled by default.
 SOFT_DELETE = False  # soft delete disabled by default.
 SHOW_DELETED_PARAM = "show_deleted"
 BULK_ENABLED = True
+BULK_ORDERED = True  # a failed bulk insert aborts the remaining documents.
+BULK_INGEST = False  # streaming bulk ingest endpoints disabled by default.
+BULK_INGEST_URL = "ingest"
+BULK_INGEST_CHUNK_SIZE = 1000  # documents validated and inserted at once.
+BULK_WRITE = False  # bulk PATCH, PUT and DELETE endpoints disabled by default.
+BULK_WRITE_URL = "bulk"
+
+# group commit of concurrent POST requests is disabled by default. When
+# enabled, documents are buffered for up to GROUP_COMMIT_WINDOW_MS
+# milliseconds, or until GROUP_COMMIT_MAX_SIZE of them are waiting, and then
+# inserted at once.
+GROUP_COMMIT = False
+GROUP_COMMIT_WINDOW_MS = 5
+GROUP_COMMIT_MAX_SIZE = 100
+GROUP_COMMIT_STATS_ENDPOINT = None
 
 OPLOG = False  # oplog is disabled by default.
 OPLOG_NAME = "oplog"  # default oplog resource name.
@@ -212,6 +266,8 @@ ITEM_LOOKUP = True
 ITEM_LOOKUP_FIELD = ID_FIELD
 ITEM_URL = 'regex("[a-f0-9]{24}")'
 UPSERT_ON_PUT = True  # insert unexisting documents on PUT.
+DIRECT_WRITES = False  # item writes read the document first by default.
+PATCH_OPERATORS = []  # no update operators allowed in PATCH payloads.
 MERGE_NESTED_DOCUMENTS = True
 
 # use a simple file response format by default
@@ -229,6 +285,16 @@ JSON_REQUEST_CONTENT_TYPES = ["application/json"]
 
 SCHEMA_ENDPOINT = None
 
+# query shape statistics are disabled by default. When enabled, at most
+# QUERY_STATS_MAX_SHAPES shapes are tracked; the least recently seen are
+# evicted first.
+QUERY_STATS = False
+QUERY_STATS_MAX_SHAPES = 1000
+QUERY_STATS_ENDPOINT = None
+
+# roles allowed to access administrative endpoints and features.
+ADMIN_ROLES = []
+
 # list of extra fields to be included with every POST response. This list
 # should not include the 'standard' fields (ID_FIELD, LAST_UPDATED,
 # DATE_CREATED, and ETAG). Only relevant when bandwidth saving mode is on.
@@ -243,6 +309,9 @@ QUERY_PAGE = "page"
 QUERY_MAX_RESULTS = "max_results"
 QUERY_EMBEDDED = "embedded"
 QUERY_AGGREGATION = "aggregate"
+QUERY_HINT = "hint"
+QUERY_EXPLAIN = "explain"
+QUERY_NAMED = "query"
 
 HEADER_TOTAL_COUNT = "X-Total-Count"
 OPTIMIZE_PAGINATION_FOR_SPEED = False
@@ -273,6 +342,47 @@ MONGO_QUERY_WHITELIST = []
 MONGO_WRITE_CONCERN = {"w": 1}
 MONGO_OPTIONS = {"connect": True, "tz_aware": True, "uuidRepresentation": "standard"}
 
+# the unindexed query guard is disabled by default. When set to 'reject',
+# 'timeout' or 'log', finds which would result in a collection scan or in an
+# in-memory sort are respectively rejected, capped to MONGO_GUARD_MAX_TIME_MS,
+# or logged. Collection index metadata is refreshed every
+# MONGO_INDEX_CACHE_TTL seconds.
+MONGO_QUERY_GUARD = None
+MONGO_GUARD_MAX_TIME_MS = 1000
+MONGO_INDEX_CACHE_TTL = 300
+# let MongoDB use temporary files for sorts exceeding its memory limit.
+MONGO_ALLOW_DISK_USE = False
+# collection storing the refresh state of materialized aggregations.
+MATERIALIZATIONS_COLLECTION = "materializations"
+
+# read preference of GET requests: either a mode name ('secondaryPreferred'),
+# a dict with 'mode', 'max_staleness_seconds' and 'tag_sets' keys, or a dict
+# mapping data layer read methods ('find', 'find_one', 'aggregate') to one of
+# the former. None means the client default (usually 'primary').
+MONGO_READ_PREFERENCE = None
+# when enabled, writes return a causal consistency token in the
+# CAUSAL_TOKEN_HEADER response header. Reads sending the token back are
+# performed within a causally consistent session (read-your-writes).
+MONGO_CAUSAL_CONSISTENCY = False
+CAUSAL_TOKEN_HEADER = "X-Causal-Token"
+
+# server-side time budget (maxTimeMS) of reads: either a number of
+# milliseconds, or a dict mapping operations ('find', 'count', 'find_one',
+# 'aggregate') to their own budget. The first budgeted read of a request sets
+# a deadline which the following ones share. Clients can ask for a shorter
+# budget with the REQUEST_TIMEOUT_HEADER header (in milliseconds). Reads
+# exceeding their budget return a 503, with a Retry-After of MONGO_RETRY_AFTER
+# seconds.
+MONGO_MAX_TIME_MS = None
+REQUEST_TIMEOUT_HEADER = "Request-Timeout"
+MONGO_RETRY_AFTER = 1
+
+# with soft delete enabled, filter out deleted documents with an equality on
+# DELETED instead of a '$ne' condition. Documents missing DELETED are
+# backfilled on startup, and 'mongo_indexes' and 'unique' fields get partial
+# indexes covering non deleted documents only.
+MONGO_INDEXED_SOFT_DELETE = False
+
 # if true, the document will be normalized according to the schema during patch
 # this means fields will be reset their the default value, if any, unless
 # contained in the patch body.
@@ -12,15 +12,18 @@
     :license: BSD, see LICENSE for more details.
 """
 import re
+from datetime import datetime
 
 from bson import tz_util
 from flask import Response, abort
 from flask import current_app as app
 from flask import request
+from werkzeug.http import http_date
 
 import eve
 from eve.auth import requires_auth, resource_auth
-from eve.methods import delete, deleteitem, get, getitem, patch, post, put
+from eve.methods import (bulk_write, delete, deleteitem, get, getitem, ingest,
+                         patch, post, put)
 from eve.methods.common import ratelimit
 from eve.render import send_response
 from eve.utils import config, date_to_rfc1123, weak_date
@@ -107,6 +110,37 @@ def item_endpoint(**lookup):
     return send_response(resource, response)
 
 
+def ingest_endpoint(**lookup):
+    """Bulk ingest endpoint handler, active for resources with 'bulk_ingest'
+    enabled. Streams the documents of the payload into the resource.
+
+    .. versionadded:: 2.2
+    """
+    resource = _resource()
+    response = None
+    if request.method == "POST":
+        response = ingest(resource)
+    elif request.method != "OPTIONS":
+        abort(405)
+    return send_response(resource, response)
+
+
+def bulk_endpoint(**lookup):
+    """Bulk write endpoint handler, active for resources with 'bulk_write'
+    enabled. Performs a batch of PATCH, PUT or DELETE operations on the
+    documents of the resource.
+
+    .. versionadded:: 2.2
+    """
+    resource = _resource()
+    response = None
+    if request.method in ("PATCH", "PUT", "DELETE"):
+        response = bulk_write(resource)
+    elif request.method != "OPTIONS":
+        abort(405)
+    return send_response(resource, response)
+
+
 @ratelimit()
 @requires_auth("home")
 def home_endpoint():
@@ -162,9 +196,18 @@ def home_endpoint():
 def error_endpoint(error):
     """Response returned when an error is raised by the API (e.g. my means of
     an abort(4xx).
+
+    .. versionchanged:: 2.2
+       Send the Retry-After header of 503 and 429 errors.
     """
     headers = []
 
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after:
+        if isinstance(retry_after, datetime):
+            retry_after = http_date(retry_after)
+        headers.append(("Retry-After", str(retry_after)))
+
     try:
         headers.append(error.response.headers)
     except AttributeError:
@@ -291,3 +334,40 @@ def schema_collection_endpoint():
         schemas[resource_name] = resource_config["schema"]
 
     return send_response(None, (schemas,))
+
+
+@requires_auth("admin")
+def query_stats_endpoint():
+    """This endpoint is active when QUERY_STATS_ENDPOINT != None. It returns
+    the query shapes recorded by the data layer, ranked by total time, along
+    with index suggestions. Shapes can be restricted to a single resource with
+    the 'resource' query parameter. DELETE resets the statistics.
+
+    .. versionadded:: 2.2
+    """
+    if not hasattr(app.data, "query_stats_report"):
+        abort(404)
+
+    if request.method == "DELETE":
+        app.data.query_stats.clear()
+        return send_response(None, ({}, None, None, 204))
+
+    report = app.data.query_stats_report(request.args.get("resource"))
+    return send_response(None, (report,))
+
+
+@requires_auth("admin")
+def group_commit_stats_endpoint():
+    """This endpoint is active when GROUP_COMMIT_STATS_ENDPOINT != None. It
+    returns the statistics of the group commit flushes of each resource,
+    which can be restricted to a single resource with the 'resource' query
+    parameter. DELETE resets the statistics.
+
+    .. versionadded:: 2.2
+    """
+    if request.method == "DELETE":
+        app.group_commit.clear()
+        return send_response(None, ({}, None, None, 204))
+
+    report = app.group_commit.report(request.args.get("resource"))
+    return send_response(None, ({config.ITEMS: report},))
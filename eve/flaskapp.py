@@ -22,14 +22,22 @@ from werkzeug.serving import WSGIRequestHandler
 
 import eve
 from eve import default_settings
-from eve.endpoints import (collections_endpoint, error_endpoint, home_endpoint,
-                           item_endpoint, media_endpoint,
+from eve.endpoints import (bulk_endpoint, collections_endpoint,
+                           error_endpoint, group_commit_stats_endpoint,
+                           home_endpoint, ingest_endpoint, item_endpoint,
+                           media_endpoint, query_stats_endpoint,
                            schema_collection_endpoint, schema_item_endpoint)
 from eve.exceptions import ConfigException, SchemaException
-from eve.io.mongo import (GridFSMediaStorage, Mongo, Validator,
-                          ensure_mongo_indexes)
+from eve.io.group_commit import GroupCommit
+from eve.io.mongo import (READ_METHODS, GridFSMediaStorage, Mongo, Validator,
+                          compile_named_queries, compile_schema_types,
+                          ensure_mongo_indexes, method_read_preference,
+                          request_max_time_ms, validate_hints,
+                          validate_materialize)
 from eve.logging import RequestFilter
-from eve.utils import api_prefix, extract_key_values
+from eve.methods.patch import UPDATE_OPERATORS
+from eve.utils import aggregation_template, api_prefix, extract_key_values
+from eve.validation import compile_schema
 
 
 class EveWSGIRequestHandler(WSGIRequestHandler):
@@ -168,6 +176,7 @@ class Eve(Flask, Events):
 
         self.media = media(self) if media else None
         self.redis = redis
+        self.group_commit = GroupCommit()
 
         if auth:
             self.auth = auth() if callable(auth) else auth
@@ -180,6 +189,8 @@ class Eve(Flask, Events):
             self._init_media_endpoint()
 
         self._init_schema_endpoint()
+        self._init_query_stats_endpoint()
+        self._init_group_commit_stats_endpoint()
 
         if self.config["OPLOG"] is True:
             self._init_oplog()
@@ -357,6 +368,19 @@ class Eve(Flask, Events):
         :param resource: name of the resource which settings refer to.
         :param settings: settings of resource to be validated.
 
+        .. versionchanged:: 2.2
+           validate 'mongo_query_guard', 'mongo_read_preference',
+           'mongo_max_time_ms', datasource 'hints' and aggregation
+           'pagination' and 'materialize'.
+           Compile 'named_queries', warning about those which are not backed
+           by 'mongo_indexes'.
+           Validate 'validation_engine' and compile the schema of resources
+           using the 'compiled' engine.
+           Validate 'bulk_ingest_chunk_size'.
+           Find out the methods which can be performed with 'direct_writes'.
+           Validate 'patch_operators', 'group_commit_window_ms' and
+           'group_commit_max_size'.
+
         .. versionchanged:: 0.4
            validate that auth_field is not set to ID_FIELD. See #266.
 
@@ -399,8 +423,179 @@ class Eve(Flask, Events):
                 "(%s)" % (resource, settings["id_field"])
             )
 
+        aggregation = settings["datasource"]["aggregation"]
+        if aggregation and aggregation["pagination"] not in ("facet", "cursor"):
+            raise ConfigException(
+                '"%s": aggregation pagination must be "facet" or "cursor" '
+                "(%s)" % (resource, aggregation["pagination"])
+            )
+        try:
+            validate_materialize(aggregation["materialize"] if aggregation else None)
+        except ValueError as e:
+            raise ConfigException('"%s": aggregation materialize: %s' % (resource, e))
+
+        guard = settings["mongo_query_guard"]
+        if guard not in (None, False, "reject", "timeout", "log"):
+            raise ConfigException(
+                '"%s": mongo_query_guard must be one of "reject", "timeout" '
+                'or "log" (%s)' % (resource, guard)
+            )
+
+        try:
+            for method in READ_METHODS:
+                method_read_preference(settings["mongo_read_preference"], method)
+        except ValueError as e:
+            raise ConfigException('"%s": mongo_read_preference: %s' % (resource, e))
+
+        try:
+            request_max_time_ms(settings["mongo_max_time_ms"])
+        except ValueError as e:
+            raise ConfigException('"%s": mongo_max_time_ms: %s' % (resource, e))
+
+        try:
+            validate_hints(settings["datasource"]["hints"], settings["mongo_indexes"])
+        except ValueError as e:
+            raise ConfigException('"%s": datasource hints: %s' % (resource, e))
+
+        try:
+            settings["_named_queries"] = compile_named_queries(
+                settings["named_queries"],
+                Mongo.operators | set(settings["mongo_query_whitelist"]),
+                self.config["MONGO_QUERY_BLACKLIST"],
+                self._query_arguments(),
+            )
+        except ValueError as e:
+            raise ConfigException('"%s": named_queries: %s' % (resource, e))
+
+        indexes = [[(settings["id_field"], 1)]]
+        for value in settings["mongo_indexes"].values():
+            indexes.append(value[0] if isinstance(value, tuple) else value)
+        for name, query in settings["_named_queries"].items():
+            if not query.is_indexed(indexes):
+                self.logger.warning(
+                    '"%s": named query "%s" is not backed by any of the '
+                    "declared mongo_indexes",
+                    resource,
+                    name,
+                )
+
         self.validate_schema(resource, settings["schema"])
 
+        engine = settings["validation_engine"]
+        if engine not in ("cerberus", "compiled"):
+            raise ConfigException(
+                '"%s": validation_engine must be "cerberus" or "compiled" '
+                "(%s)" % (resource, engine)
+            )
+        settings["_compiled_schema"] = None
+        if engine == "compiled":
+            settings["_compiled_schema"] = compile_schema(
+                self.validator, settings["schema"], settings["allow_unknown"]
+            )
+
+        chunk_size = settings["bulk_ingest_chunk_size"]
+        if (
+            not isinstance(chunk_size, int)
+            or isinstance(chunk_size, bool)
+            or chunk_size < 1
+        ):
+            raise ConfigException(
+                '"%s": bulk_ingest_chunk_size must be a positive integer (%s)'
+                % (resource, chunk_size)
+            )
+
+        window_ms = settings["group_commit_window_ms"]
+        if (
+            not isinstance(window_ms, (int, float))
+            or isinstance(window_ms, bool)
+            or window_ms < 0
+        ):
+            raise ConfigException(
+                '"%s": group_commit_window_ms must be a non-negative number (%s)'
+                % (resource, window_ms)
+            )
+        max_size = settings["group_commit_max_size"]
+        if not isinstance(max_size, int) or isinstance(max_size, bool) or max_size < 1:
+            raise ConfigException(
+                '"%s": group_commit_max_size must be a positive integer (%s)'
+                % (resource, max_size)
+            )
+
+        for operator in settings["patch_operators"]:
+            if operator not in UPDATE_OPERATORS:
+                raise ConfigException(
+                    '"%s": patch_operators must be among %s (%s)'
+                    % (resource, ", ".join(UPDATE_OPERATORS), operator)
+                )
+
+        settings["_direct_writes"] = self._direct_write_methods(settings)
+
+    def _query_arguments(self):
+        """Returns the names of the query arguments supported by resource
+        endpoints, which named query parameters can't be named after.
+
+        .. versionadded:: 2.2
+        """
+        keys = (
+            "QUERY_WHERE",
+            "QUERY_SORT",
+            "QUERY_PAGE",
+            "QUERY_MAX_RESULTS",
+            "QUERY_PROJECTION",
+            "QUERY_EMBEDDED",
+            "QUERY_AGGREGATION",
+            "QUERY_HINT",
+            "QUERY_EXPLAIN",
+            "QUERY_NAMED",
+            "SHOW_DELETED_PARAM",
+            "VERSION_PARAM",
+        )
+        return set(self.config[key] for key in keys if self.config.get(key))
+
+    def _direct_write_methods(self, settings):
+        """Returns the item methods of a resource which can be performed with
+        a single conditional write when 'direct_writes' is enabled, as they
+        don't need the original document. Versioning, soft delete, media
+        fields and etags ignoring some fields all need it, and so do the
+        'readonly' and 'dependencies' rules, which compare values with the
+        stored ones, and defaults applied on PATCH. PUT also needs it to check
+        the owner of documents with User-Restricted Resource Access.
+
+        .. versionadded:: 2.2
+        """
+        if (
+            not settings["direct_writes"]
+            or settings["versioning"]
+            or settings["soft_delete"]
+            or settings["_media"]
+            or settings["etag_ignore_fields"]
+        ):
+            return ()
+
+        def uses_rules(value, rules):
+            if isinstance(value, dict):
+                return any(
+                    key in rules or uses_rules(definition, rules)
+                    for key, definition in value.items()
+                )
+            if isinstance(value, (list, tuple)):
+                return any(uses_rules(definition, rules) for definition in value)
+            return False
+
+        schema = settings["schema"]
+        if uses_rules(schema, ("readonly", "dependencies")):
+            return ()
+
+        methods = ["DELETE"]
+        if not (
+            settings["normalize_on_patch"]
+            and uses_rules(schema, ("default", "default_setter"))
+        ):
+            methods.append("PATCH")
+        if not settings["auth_field"]:
+            methods.append("PUT")
+        return tuple(methods)
+
     def validate_roles(self, directive, candidate, resource):
         """Validates that user role directives are syntactically and formally
         adequate.
@@ -594,6 +789,17 @@ class Eve(Flask, Events):
     def _set_resource_defaults(self, resource, settings):
         """Low-level method which sets default values for one resource.
 
+        .. versionchanged:: 2.2
+           Support for '_schema_types' helper.
+           Added 'mongo_query_guard', 'mongo_guard_max_time_ms',
+           'mongo_allow_disk_use', 'mongo_read_preference',
+           'mongo_causal_consistency', 'mongo_max_time_ms',
+           'mongo_indexed_soft_delete', 'named_queries',
+           'validation_engine', 'bulk_ordered', 'bulk_ingest',
+           'bulk_ingest_chunk_size', 'bulk_write', 'direct_writes',
+           'patch_operators', 'group_commit', 'group_commit_window_ms' and
+           'group_commit_max_size'.
+
         .. versionchanged:: 1.1.0
            Added 'mongo_query_whitelist'.
 
@@ -654,6 +860,21 @@ class Eve(Flask, Events):
         settings.setdefault("versioning", self.config["VERSIONING"])
         settings.setdefault("soft_delete", self.config["SOFT_DELETE"])
         settings.setdefault("bulk_enabled", self.config["BULK_ENABLED"])
+        settings.setdefault("bulk_ordered", self.config["BULK_ORDERED"])
+        settings.setdefault("bulk_ingest", self.config["BULK_INGEST"])
+        settings.setdefault(
+            "bulk_ingest_chunk_size", self.config["BULK_INGEST_CHUNK_SIZE"]
+        )
+        settings.setdefault("bulk_write", self.config["BULK_WRITE"])
+        settings.setdefault("direct_writes", self.config["DIRECT_WRITES"])
+        settings.setdefault("patch_operators", self.config["PATCH_OPERATORS"])
+        settings.setdefault("group_commit", self.config["GROUP_COMMIT"])
+        settings.setdefault(
+            "group_commit_window_ms", self.config["GROUP_COMMIT_WINDOW_MS"]
+        )
+        settings.setdefault(
+            "group_commit_max_size", self.config["GROUP_COMMIT_MAX_SIZE"]
+        )
         settings.setdefault("internal_resource", self.config["INTERNAL_RESOURCE"])
         settings.setdefault("etag_ignore_fields", None)
         # TODO make sure that this we really need the test below
@@ -664,6 +885,7 @@ class Eve(Flask, Events):
         settings.setdefault("item_methods", item_methods)
         settings.setdefault("auth_field", self.config["AUTH_FIELD"])
         settings.setdefault("allow_unknown", self.config["ALLOW_UNKNOWN"])
+        settings.setdefault("validation_engine", self.config["VALIDATION_ENGINE"])
         settings.setdefault(
             "extra_response_fields", self.config["EXTRA_RESPONSE_FIELDS"]
         )
@@ -672,6 +894,22 @@ class Eve(Flask, Events):
         )
         settings.setdefault("mongo_write_concern", self.config["MONGO_WRITE_CONCERN"])
         settings.setdefault("mongo_indexes", {})
+        settings.setdefault("mongo_query_guard", self.config["MONGO_QUERY_GUARD"])
+        settings.setdefault(
+            "mongo_guard_max_time_ms", self.config["MONGO_GUARD_MAX_TIME_MS"]
+        )
+        settings.setdefault("mongo_allow_disk_use", self.config["MONGO_ALLOW_DISK_USE"])
+        settings.setdefault(
+            "mongo_read_preference", self.config["MONGO_READ_PREFERENCE"]
+        )
+        settings.setdefault(
+            "mongo_causal_consistency", self.config["MONGO_CAUSAL_CONSISTENCY"]
+        )
+        settings.setdefault("mongo_max_time_ms", self.config["MONGO_MAX_TIME_MS"])
+        settings.setdefault(
+            "mongo_indexed_soft_delete", self.config["MONGO_INDEXED_SOFT_DELETE"]
+        )
+        settings.setdefault("named_queries", {})
         settings.setdefault("hateoas", self.config["HATEOAS"])
         settings.setdefault("authentication", self.auth if self.auth else None)
         settings.setdefault(
@@ -684,12 +922,19 @@ class Eve(Flask, Events):
         # empty schemas are allowed for read-only access to resources
         schema = settings.setdefault("schema", {})
         self.set_schema_defaults(schema, settings["id_field"])
+        settings["_schema_types"] = compile_schema_types(schema)
 
         self._set_resource_datasource(resource, schema, settings)
 
     def _set_resource_datasource(self, resource, schema, settings):
         """Set the default values for the resource 'datasource' setting.
 
+        .. versionchanged:: 2.2
+           Added 'hints'.
+           Aggregation pipelines are compiled into templates.
+           Added aggregation 'pagination', 'count', 'count_cache_ttl' and
+           'materialize'.
+
         .. versionadded:: 0.7
         """
 
@@ -699,11 +944,22 @@ class Eve(Flask, Events):
         ds.setdefault("source", resource)
         ds.setdefault("filter", None)
         ds.setdefault("default_sort", None)
+        ds.setdefault("hints", None)
 
         self._set_resource_projection(ds, schema, settings)
         aggregation = ds.setdefault("aggregation", None)
         if aggregation:
             aggregation.setdefault("options", {})
+            aggregation.setdefault("pagination", "facet")
+            aggregation.setdefault("count", True)
+            aggregation.setdefault("count_cache_ttl", 0)
+            materialize = aggregation.setdefault("materialize", None)
+            if isinstance(materialize, dict):
+                materialize.setdefault("collection", "%s_materialized" % resource)
+                materialize.setdefault("mode", "out")
+                materialize.setdefault("refresh", None)
+                materialize.setdefault("refresh_on", None)
+            aggregation_template(settings)
 
             # endpoints serving aggregation queries are read-only and do not
             # support item lookup.
@@ -828,6 +1084,11 @@ class Eve(Flask, Events):
         """Builds the API url map for one resource. Methods are enabled for
         each mapped endpoint, as configured in the settings.
 
+        .. versionchanged:: 2.2
+           Add the bulk ingest endpoint of resources with 'bulk_ingest'
+           enabled, and the bulk write endpoint of resources with
+           'bulk_write' enabled.
+
         .. versionchanged:: 0.5
            Don't add resource to url rules if it's flagged as internal.
            Strip regexes out of config.URLS helper. Closes #466.
@@ -898,6 +1159,32 @@ class Eve(Flask, Events):
                     methods=["GET", "OPTIONS"],
                 )
 
+        # streaming bulk ingest endpoint
+        if settings["bulk_ingest"] and "POST" in settings["resource_methods"]:
+            endpoint = resource + "|ingest"
+            self.add_url_rule(
+                "%s/%s" % (url, self.config["BULK_INGEST_URL"]),
+                endpoint,
+                view_func=ingest_endpoint,
+                methods=["POST", "OPTIONS"],
+            )
+
+        # bulk PATCH, PUT and DELETE endpoint
+        if settings["bulk_write"]:
+            methods = [
+                method
+                for method in ("PATCH", "PUT", "DELETE")
+                if method in settings["item_methods"]
+            ]
+            if methods:
+                endpoint = resource + "|bulk"
+                self.add_url_rule(
+                    "%s/%s" % (url, self.config["BULK_WRITE_URL"]),
+                    endpoint,
+                    view_func=bulk_endpoint,
+                    methods=methods + ["OPTIONS"],
+                )
+
     def _init_url_rules(self):
         """Builds the API url map. Methods are enabled for each mapped
         endpoint, as configured in the settings.
@@ -931,6 +1218,8 @@ class Eve(Flask, Events):
         # helpers
         self.config["URLS"] = {}  # maps resources to urls
         self.config["SOURCES"] = {}  # maps resources to their datasources
+        # maps resources to the materialized aggregations depending on them
+        self.config["MATERIALIZED"] = {}
 
         # we choose not to care about trailing slashes at all.
         # Both '/resource/' and '/resource' will work, same with
@@ -995,6 +1284,8 @@ class Eve(Flask, Events):
                 versioned_resource, self.config["DOMAIN"][versioned_resource]
             )
 
+        self._set_materialized_dependencies()
+
         # create the mongo db indexes
         ensure_mongo_indexes(self, resource)
 
@@ -1003,6 +1294,32 @@ class Eve(Flask, Events):
             connect = self.config["DOMAIN"]["MONGO_OPTIONS"].get("connect", True)
             self.config["DOMAIN"]["MONGO_CONNECT"] = connect
 
+    def _set_materialized_dependencies(self):
+        """Maps the registered resources to the materialized aggregations
+        depending on them, so that writes don't have to walk the whole domain
+        to invalidate them. Materialized aggregations depend on the resources
+        listed in their 'refresh_on' setting or, when it is not set, on those
+        sharing their datasource source.
+
+        .. versionadded:: 2.2
+        """
+        sources = {}
+        for name, datasource in self.config["SOURCES"].items():
+            sources.setdefault(datasource["source"], []).append(name)
+
+        dependencies = {}
+        for name, datasource in self.config["SOURCES"].items():
+            aggregation = datasource.get("aggregation")
+            materialize = aggregation.get("materialize") if aggregation else None
+            if not materialize:
+                continue
+            refresh_on = materialize["refresh_on"]
+            if refresh_on is None:
+                refresh_on = sources[datasource["source"]]
+            for dependency in refresh_on:
+                dependencies.setdefault(dependency, []).append(name)
+        self.config["MATERIALIZED"] = dependencies
+
     def register_error_handlers(self):
         """Register custom error handlers so we make sure that all errors
         return a parseable body.
@@ -1091,6 +1408,45 @@ class Eve(Flask, Events):
                 methods=["GET", "OPTIONS"],
             )
 
+    def _init_query_stats_endpoint(self):
+        """Configures the query statistics endpoint if set in configuration.
+
+        .. versionadded:: 2.2
+        """
+        endpoint = self.config["QUERY_STATS_ENDPOINT"]
+
+        if endpoint:
+            if not self.config["ADMIN_ROLES"]:
+                raise ConfigException(
+                    "ADMIN_ROLES must be set to enable QUERY_STATS_ENDPOINT."
+                )
+            self.add_url_rule(
+                "%s/%s" % (self.api_prefix, endpoint),
+                "query_stats",
+                view_func=query_stats_endpoint,
+                methods=["GET", "DELETE", "OPTIONS"],
+            )
+
+    def _init_group_commit_stats_endpoint(self):
+        """Configures the group commit statistics endpoint if set in
+        configuration.
+
+        .. versionadded:: 2.2
+        """
+        endpoint = self.config["GROUP_COMMIT_STATS_ENDPOINT"]
+
+        if endpoint:
+            if not self.config["ADMIN_ROLES"]:
+                raise ConfigException(
+                    "ADMIN_ROLES must be set to enable GROUP_COMMIT_STATS_ENDPOINT."
+                )
+            self.add_url_rule(
+                "%s/%s" % (self.api_prefix, endpoint),
+                "group_commit_stats",
+                view_func=group_commit_stats_endpoint,
+                methods=["GET", "DELETE", "OPTIONS"],
+            )
+
     def __call__(self, environ, start_response):
         """If HTTP_X_METHOD_OVERRIDE is included with the request and method
         override is allowed, make sure the override method is returned to Eve
@@ -158,6 +158,36 @@ class DataLayer():
         """
         raise NotImplementedError
 
+    def aggregate_count(self, resource, pipeline, options):
+        """Returns the number of documents returned by an aggregation
+        pipeline. Consumed by aggregation endpoints which are not paginated
+        with a '$facet' stage. Data layers may cache the result.
+
+        :param resource: resource being accessed.
+        :param pipeline: aggregation pipeline to be counted.
+        :param options: aggregation options to be considered.
+
+        .. versionadded:: 2.2
+        """
+        cursor = self.aggregate(resource, pipeline + [{"$count": "count"}], options)
+        for result in cursor:
+            return result["count"]
+        return 0
+
+    def materialize(self, resource, force=False):
+        """Refreshes the materialized results of an aggregation resource, if
+        they are due or if `force` is True. Returns a dict with the time of
+        the last refresh ('updated') and whether the results are known to be
+        out of date ('stale'). Only implement this if the underlying db engine
+        supports writing aggregation results to a collection.
+
+        :param resource: the aggregation resource.
+        :param force: refresh the results even if they are not due.
+
+        .. versionadded:: 2.2
+        """
+        raise NotImplementedError
+
     def find_one(
         self,
         resource,
@@ -228,6 +258,25 @@ class DataLayer():
         """
         raise NotImplementedError
 
+    def find_existing(self, resource, fields, references):
+        """Returns the `references` which match a document of `resource`.
+        Each reference is a tuple holding a value for each of the `fields`.
+        Used to look up the data relations of a payload at once. This
+        default implementation performs a :meth:`find_one` per reference;
+        data layers should override it with a single query when possible.
+
+        :param resource: resource name.
+        :param fields: a tuple of field names.
+        :param references: a list of tuples of values, one per field.
+
+        .. versionadded:: 2.2
+        """
+        return [
+            reference
+            for reference in references
+            if self.find_one(resource, None, **dict(zip(fields, reference)))
+        ]
+
     def insert(self, resource, doc_or_docs):
         """Inserts a document into a resource collection/table.
 
@@ -243,7 +292,32 @@ class DataLayer():
         """
         raise NotImplementedError
 
-    def update(self, resource, id_, updates, original):
+    def insert_unordered(self, resource, documents):
+        """Inserts a list of documents into a resource collection/table, going
+        on with the remaining documents when some of them fail. Returns a list
+        with the id of each document (None for those which failed) and a dict
+        mapping the index of each failed document to a (code, message) tuple.
+
+        :param resource: resource being accessed.
+        :param documents: list of json documents to be added to the database.
+
+        .. versionadded:: 2.2
+        """
+        raise NotImplementedError
+
+    def insert_target(self, resource):
+        """Returns a key identifying where the current request inserts the
+        documents of a resource, for example its database when it depends on
+        the request. The documents of concurrent requests are only inserted
+        together by group commits when their targets are equal.
+
+        :param resource: resource being accessed.
+
+        .. versionadded:: 2.2
+        """
+        return resource
+
+    def update(self, resource, id_, updates, original, operators=None):
         """Updates a collection/table document/row.
         :param resource: resource being accessed. You should then use
                          the ``datasource`` helper function to retrieve
@@ -253,8 +327,37 @@ class DataLayer():
                         (or row).
         :param original: definition of the json document that should be
         updated.
+        :param operators: update operators enabled with 'patch_operators',
+                          as in ``{"$inc": {"count": 1}}``. They must be
+                          applied atomically: `updates` holds the values they
+                          are expected to produce on `original`. Only passed
+                          when the PATCH payload uses them.
         :raise OriginalChangedError: raised if the database layer notices a
         change from the supplied `original` parameter.
+
+        .. versionchanged:: 2.2
+           Added 'operators' argument.
+        """
+        raise NotImplementedError
+
+    def update_with_operators(self, resource, id_, updates, operators):
+        """Applies the update `operators` to a document as it is stored,
+        along with the plain `updates`, with a single write which matches the
+        document by id alone, and returns the updated document, or None if
+        there is no such document. Used by PATCH requests which do not check
+        the etag, so that concurrent updates are not lost. The returned
+        document is projected like those returned by :meth:`find_one`.
+
+        :param resource: resource being accessed.
+        :param id_: the unique id of the document.
+        :param updates: the fields to update. Fields updated by `operators`
+                        are ignored.
+        :param operators: update operators enabled with 'patch_operators',
+                          as in ``{"$inc": {"count": 1}}``.
+        :raise OriginalChangedError: raised if the operators would take a
+        field of the stored document past its schema bounds.
+
+        .. versionadded:: 2.2
         """
         raise NotImplementedError
 
@@ -290,6 +393,74 @@ class DataLayer():
         """
         raise NotImplementedError
 
+    def update_if_match(self, resource, req, lookup, updates, etag=None):
+        """Updates the document matching `lookup` with a single conditional
+        write, without retrieving it first, and returns the updated document
+        (projected like :meth:`find_one` would), or None if there is no such
+        document. When `etag` is given, the document is only updated if its
+        stored etag matches, and :class:`OriginalChangedError` is raised
+        otherwise.
+
+        :param resource: resource being accessed.
+        :param req: a :class:`ParsedRequest` instance.
+        :param lookup: the lookup query of the document.
+        :param updates: the fields to update.
+        :param etag: the etag the document is expected to have.
+
+        .. versionadded:: 2.2
+        """
+        raise NotImplementedError
+
+    def replace_if_match(self, resource, req, lookup, document, etag=None):
+        """Replaces the document matching `lookup` with a single conditional
+        write, like :meth:`update_if_match` does. The creation date of the
+        document is preserved.
+
+        .. versionadded:: 2.2
+        """
+        raise NotImplementedError
+
+    def remove_if_match(self, resource, req, lookup, etag=None):
+        """Removes the document matching `lookup` with a single conditional
+        write, like :meth:`update_if_match` does, and returns the removed
+        document.
+
+        .. versionadded:: 2.2
+        """
+        raise NotImplementedError
+
+    def bulk_write(self, resource, operations):
+        """Performs a batch of write operations on the documents of a
+        resource, going on with the remaining operations when some of them
+        fail. Each operation is a (op, id_, changes, original) tuple, where
+        `op` is either 'update', 'replace' or 'remove', and is only performed
+        if the document has not changed since `original` was retrieved.
+        Returns the set of the indexes of the operations which were not
+        performed because their document has changed, and a dict mapping the
+        index of each failed operation to a (code, message) tuple.
+
+        The default implementation performs the operations one at a time.
+        Data layers which support batched writes should override it.
+
+        :param resource: resource being accessed.
+        :param operations: the list of operations to be performed.
+
+        .. versionadded:: 2.2
+        """
+        id_field = config.DOMAIN[resource]["id_field"]
+        changed = set()
+        for index, (op, id_, changes, original) in enumerate(operations):
+            try:
+                if op == "update":
+                    self.update(resource, id_, changes, original)
+                elif op == "replace":
+                    self.replace(resource, id_, changes, original)
+                else:
+                    self.remove(resource, {id_field: id_})
+            except self.OriginalChangedError:
+                changed.add(index)
+        return changed, {}
+
     def combine_queries(self, query_a, query_b):
         """Takes two db queries and applies db-specific syntax to produce
         the intersection.
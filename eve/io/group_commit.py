@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+    eve.io.group_commit
+    ~~~~~~~~~~~~~~~~~~~
+
+    Group commit of the documents inserted by concurrent requests, and
+    statistics of the flushes.
+
+    :copyright: (c) 2017 by Nicola Iarocci.
+    :license: BSD, see LICENSE for more details.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import abort, g
+
+
+class GroupCommit():
+    """Coalesces the documents inserted into a resource by concurrent
+    requests, so that they are written with a single unordered insert. The
+    first request to arrive leads the batch: it waits up to `window_ms` for
+    other documents to join, or until `max_size` documents are buffered, then
+    inserts them all and hands each request back its own results. The timing
+    of the flushes is recorded for each resource.
+
+    .. versionadded:: 2.2
+    """
+
+    # upper bounds of the flush latency histogram buckets, in milliseconds.
+    # The last bucket collects all the slower flushes.
+    buckets = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+    # seconds a request waits for the insert of its batch, past the window,
+    # before failing.
+    flush_timeout = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batches = {}
+        self._stats = OrderedDict()
+
+    def insert(self, resource, documents, insert, window_ms, max_size, target=None):
+        """Inserts `documents` along with those of concurrent requests, and
+        returns their ids and insertion errors, as
+        :meth:`eve.io.base.DataLayer.insert_unordered` does. Requests which
+        wait for the insert of their batch for longer than `flush_timeout`
+        seconds past the window are aborted with a 503, as the outcome of the
+        insert is unknown.
+
+        :param resource: resource name.
+        :param documents: the documents to be inserted.
+        :param insert: the function which inserts a batch of documents,
+                       called like ``insert_unordered(resource, documents)``.
+        :param window_ms: how long a batch waits for documents, in
+                          milliseconds.
+        :param max_size: the number of documents which flushes a batch
+                         before the window expires.
+        :param target: where the documents are inserted, as returned by
+                       :meth:`eve.io.base.DataLayer.insert_target`. Only
+                       documents with the same target are inserted together.
+                       Defaults to `resource`.
+        """
+        key = resource if target is None else target
+        with self._lock:
+            batch = self._batches.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._batches[key] = _Batch()
+            start = len(batch.documents)
+            batch.documents.extend(documents)
+            if len(batch.documents) >= max_size:
+                # following documents will join a new batch.
+                del self._batches[key]
+                batch.full.set()
+
+        if leader:
+            self._flush(resource, key, batch, insert, window_ms)
+        elif not batch.done.wait(window_ms / 1000.0 + self.flush_timeout):
+            abort(503, description="Timed out waiting for the group commit")
+
+        if batch.error is not None:
+            raise batch.error
+        if batch.causal_token and not leader:
+            g.causal_token = batch.causal_token
+
+        ids, errors = batch.result
+        end = start + len(documents)
+        return ids[start:end], dict(
+            (index - start, error)
+            for index, error in errors.items()
+            if start <= index < end
+        )
+
+    def _flush(self, resource, key, batch, insert, window_ms):
+        full = batch.full.wait(window_ms / 1000.0)
+        with self._lock:
+            if self._batches.get(key) is batch:
+                del self._batches[key]
+
+        started = time.perf_counter()
+        try:
+            batch.result = insert(resource, batch.documents)
+            # the token of the batch write is valid for all its documents.
+            batch.causal_token = g.get("causal_token")
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+        flushed = time.perf_counter()
+        self.record(
+            resource,
+            len(batch.documents),
+            full,
+            (started - batch.opened) * 1000,
+            (flushed - started) * 1000,
+        )
+
+    def record(self, resource, size, full, wait_ms, flush_ms):
+        """Records a flush.
+
+        :param resource: resource name.
+        :param size: the number of documents flushed.
+        :param full: whether the batch was flushed because it was full.
+        :param wait_ms: how long the batch waited for documents.
+        :param flush_ms: how long the insert took.
+        """
+        bucket = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if flush_ms <= bound:
+                bucket = i
+                break
+
+        with self._lock:
+            entry = self._stats.get(resource)
+            if entry is None:
+                entry = self._stats[resource] = {
+                    "resource": resource,
+                    "flushes": 0,
+                    "full_flushes": 0,
+                    "documents": 0,
+                    "max_size": 0,
+                    "total_wait_ms": 0.0,
+                    "max_wait_ms": 0.0,
+                    "total_flush_ms": 0.0,
+                    "max_flush_ms": 0.0,
+                    "histogram": [0] * (len(self.buckets) + 1),
+                }
+            entry["flushes"] += 1
+            entry["full_flushes"] += 1 if full else 0
+            entry["documents"] += size
+            entry["max_size"] = max(entry["max_size"], size)
+            entry["total_wait_ms"] += wait_ms
+            entry["max_wait_ms"] = max(entry["max_wait_ms"], wait_ms)
+            entry["total_flush_ms"] += flush_ms
+            entry["max_flush_ms"] = max(entry["max_flush_ms"], flush_ms)
+            entry["histogram"][bucket] += 1
+
+    def report(self, resource=None):
+        """Returns the flush statistics of all resources, or of a given
+        resource.
+        """
+        with self._lock:
+            entries = [
+                dict(entry, histogram=list(entry["histogram"]))
+                for entry in self._stats.values()
+                if resource is None or entry["resource"] == resource
+            ]
+        labels = ["<=%s" % bound for bound in self.buckets]
+        labels.append(">%s" % self.buckets[-1])
+        for entry in entries:
+            entry["avg_size"] = entry["documents"] / entry["flushes"]
+            entry["avg_wait_ms"] = entry["total_wait_ms"] / entry["flushes"]
+            entry["avg_flush_ms"] = entry["total_flush_ms"] / entry["flushes"]
+            entry["histogram"] = OrderedDict(zip(labels, entry["histogram"]))
+        return entries
+
+    def clear(self):
+        """Drops all the recorded statistics."""
+        with self._lock:
+            self._stats.clear()
+
+
+class _Batch():
+    """The documents buffered for a single insert, and its outcome."""
+
+    def __init__(self):
+        self.documents = []
+        self.opened = time.perf_counter()
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.causal_token = None
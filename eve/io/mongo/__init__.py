@@ -11,6 +11,13 @@
 """
 
 # flake8: noqa
-from eve.io.mongo.mongo import Mongo, MongoJSONEncoder, ensure_mongo_indexes
+from eve.io.mongo.mongo import (READ_METHODS, TIMED_OPERATIONS, Mongo,
+                                MongoJSONEncoder, backfill_soft_delete,
+                                compile_schema_types, ensure_mongo_indexes,
+                                method_read_preference, operation_max_time_ms,
+                                operator_bounds, query_hint, read_preference,
+                                request_max_time_ms, soft_delete_filter,
+                                validate_hints, validate_materialize)
 from eve.io.mongo.media import GridFSMediaStorage
+from eve.io.mongo.queries import NamedQuery, compile_named_queries
 from eve.io.mongo.validation import Validator
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+    eve.io.mongo.indexes
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Helpers which tell whether a MongoDB query can be served by the indexes
+    available on a collection.
+
+    :copyright: (c) 2017 by Nicola Iarocci.
+    :license: BSD, see LICENSE for more details.
+"""
+
+# operators which let the query planner bound an index scan on the field
+# they apply to.
+SELECTIVE_OPERATORS = set(
+    ["$eq", "$gt", "$gte", "$lt", "$lte", "$in", "$all", "$elemMatch"]
+    + ["$near", "$nearSphere", "$geoWithin", "$geoIntersects"]
+)
+
+# operators which are always backed by a (mandatory) special index.
+INDEXED_QUERY_OPERATORS = set(["$text"])
+
+
+def index_keys(index_information):
+    """Returns the key lists of the indexes which can be used by the query
+    planner, out of a `Collection.index_information()` result.
+
+    .. versionadded:: 2.2
+    """
+    return [
+        list(info["key"])
+        for info in index_information.values()
+        if not info.get("hidden")
+    ]
+
+
+def equality_fields(spec):
+    """Returns the fields which are matched by equality in the query, either
+    at the top level or within an `$and` clause.
+
+    .. versionadded:: 2.2
+    """
+    fields = set()
+    for field, value in spec.items():
+        if field == "$and":
+            for clause in value:
+                fields |= equality_fields(clause)
+        elif not field.startswith("$") and _is_equality(value):
+            fields.add(field)
+    return fields
+
+
+def query_fields(spec):
+    """Returns the fields the query has conditions on, either at the top
+    level or within an `$and` clause.
+
+    .. versionadded:: 2.2
+    """
+    fields = set()
+    for field, value in spec.items():
+        if field == "$and":
+            for clause in value:
+                fields |= query_fields(clause)
+        elif not field.startswith("$"):
+            fields.add(field)
+    return fields
+
+
+def filter_is_indexed(spec, indexes):
+    """Returns True if the query can be served by an index scan rather than
+    a full collection scan. An empty query is considered to be indexed, as
+    it is the plain (paginated) listing of the collection.
+
+    :param spec: the query.
+    :param indexes: key lists of the collection indexes, as returned by
+                    :func:`index_keys`.
+
+    .. versionadded:: 2.2
+    """
+    if not spec:
+        return True
+    leading = set(keys[0][0] for keys in indexes if keys)
+    return _is_indexed(spec, leading)
+
+
+def sort_is_indexed(sort, spec, indexes):
+    """Returns True if the sort can be obtained by walking an index, which
+    spares MongoDB an in-memory sort. Index keys matched by equality in the
+    query may precede the sort keys.
+
+    :param sort: the sort, as a list of (field, direction) pairs.
+    :param spec: the query.
+    :param indexes: key lists of the collection indexes, as returned by
+                    :func:`index_keys`.
+
+    .. versionadded:: 2.2
+    """
+    if not sort:
+        return True
+    sort = list(sort)
+    sort_fields = [field for field, _ in sort]
+    equalities = equality_fields(spec or {})
+    for keys in indexes:
+        keys = list(keys)
+        while keys and keys[0][0] in equalities and keys[0][0] not in sort_fields:
+            keys.pop(0)
+        candidate = keys[: len(sort)]
+        if [field for field, _ in candidate] != sort_fields:
+            continue
+        directions = [(i, s) for (_, i), (_, s) in zip(candidate, sort)]
+        if all(i == s for i, s in directions) or all(
+            _is_direction(i) and _is_direction(s) and i == -s for i, s in directions
+        ):
+            return True
+    return False
+
+
+def _is_direction(value):
+    return isinstance(value, int) and value in (1, -1)
+
+
+def _is_equality(value):
+    if not isinstance(value, dict):
+        return True
+    operators = [k for k in value if k.startswith("$")]
+    if not operators:
+        # exact match on an embedded document.
+        return True
+    if operators == ["$in"]:
+        return isinstance(value["$in"], list) and len(value["$in"]) == 1
+    return operators == ["$eq"]
+
+
+def _is_selective(value):
+    if not isinstance(value, dict):
+        return True
+    operators = [k for k in value if k.startswith("$")]
+    if not operators:
+        return True
+    if SELECTIVE_OPERATORS.intersection(operators):
+        return True
+    regex = value.get("$regex")
+    return hasattr(regex, "startswith") and regex.startswith("^")
+
+
+def _is_indexed(spec, leading):
+    for field, value in spec.items():
+        if field in INDEXED_QUERY_OPERATORS:
+            return True
+        if field == "$and":
+            if any(_is_indexed(clause, leading) for clause in value):
+                return True
+        elif field == "$or":
+            if value and all(_is_indexed(clause, leading) for clause in value):
+                return True
+        elif field.startswith("$"):
+            continue
+        elif field in leading and _is_selective(value):
+            return True
+    return False
@@ -10,29 +10,54 @@
     :license: BSD, see LICENSE for more details.
 """
 import ast
+import base64
 import decimal
 import itertools
+import time
 from collections import OrderedDict
 from copy import copy
-from datetime import datetime
+from datetime import datetime, timezone
 
+import bson
 import pymongo
 import simplejson as json
-from bson import ObjectId, decimal128
+from bson import SON, ObjectId, decimal128
 from bson.dbref import DBRef
 from flask import abort, g, request
-from pymongo import WriteConcern
-from werkzeug.exceptions import HTTPException
+from pymongo import WriteConcern, read_preferences
+from werkzeug.exceptions import HTTPException, ServiceUnavailable
 
-from eve.auth import resource_auth
+from eve.auth import admin_request, resource_auth
 from eve.io.base import BaseJSONEncoder, ConnectionException, DataLayer
+from eve.io.mongo.indexes import (filter_is_indexed, index_keys, query_fields,
+                                  sort_is_indexed)
+from eve.io.mongo.normalizer import normalize_query
 from eve.io.mongo.parser import ParseError, parse
-from eve.utils import (config, debug_error_message, str_to_date, str_type,
-                       validate_filters)
+from eve.io.mongo.stats import (QueryStats, TimedCursor, index_name, query_shape,
+                                sort_shape, suggest_index)
+from eve.utils import (config, debug_error_message, document_diff, str_to_date,
+                       str_type, validate_filters)
 
 from ...versioning import versioned_id_field
 from .flask_pymongo import PyMongo
 
+# data layer methods which honor 'mongo_read_preference'.
+READ_METHODS = ("find", "find_one", "aggregate")
+
+# operations which honor 'mongo_max_time_ms'.
+TIMED_OPERATIONS = ("find", "count", "find_one", "aggregate")
+
+# aggregation options which don't change the count of the results.
+COUNT_CACHE_IGNORED_OPTIONS = ("allowDiskUse", "batchSize", "comment", "maxTimeMS")
+
+READ_PREFERENCE_MODES = {
+    "primary": read_preferences.Primary,
+    "primaryPreferred": read_preferences.PrimaryPreferred,
+    "secondary": read_preferences.Secondary,
+    "secondaryPreferred": read_preferences.SecondaryPreferred,
+    "nearest": read_preferences.Nearest,
+}
+
 
 class MongoJSONEncoder(BaseJSONEncoder):
     """Proprietary JSONEconder subclass used by the json render function.
@@ -124,6 +149,13 @@ class Mongo(DataLayer):
         + ["$center", "$expr"]
     )
 
+    # cached aggregation counts are dropped once this many are stored.
+    max_aggregation_counts = 1000
+
+    # seconds after which a materialization left unfinished (for example by
+    # a crashed process) can be taken over by another request.
+    materialize_lease = 300
+
     def init_app(self, app):
         """Initialize PyMongo.
 
@@ -136,6 +168,13 @@ class Mongo(DataLayer):
         # mongod must be running or this will raise an exception
         self.driver = PyMongos(self)
         self.mongo_prefix = None
+        self.index_cache = {}
+        self.aggregation_counts = {}
+        self.query_stats = QueryStats(app.config["QUERY_STATS_MAX_SHAPES"])
+        app.teardown_appcontext(self._end_sessions)
+        app.register_error_handler(
+            pymongo.errors.ExecutionTimeout, self._execution_timeout
+        )
 
     def find(self, resource, req, sub_resource_lookup, perform_count=True):
         """Retrieves a set of documents matching a given request. Queries can
@@ -154,6 +193,17 @@ class Mongo(DataLayer):
         :param req: a :class:`ParsedRequest`instance.
         :param sub_resource_lookup: sub-resource lookup from the endpoint url.
 
+        .. versionchanged:: 2.2
+           Support for 'mongo_query_guard' and 'mongo_allow_disk_use'.
+           Record query shape statistics when QUERY_STATS is enabled.
+           Support for 'mongo_read_preference' and causal consistency tokens.
+           Support for 'mongo_max_time_ms' budgets.
+           The query is normalized, flattening '$and' chains.
+           Support for 'mongo_indexed_soft_delete'.
+           Index hints from datasource 'hints' or the admin-only '?hint='
+           query parameter are applied to both the query and its count.
+           Support for 'named_queries'.
+
         .. versionchanged:: 0.6
            Support for multiple databases.
            Filter soft deleted documents by default
@@ -199,6 +249,72 @@ class Mongo(DataLayer):
         .. versionchanged:: 0.0.4
            retrieves the target collection via the new config.SOURCES helper.
         """
+        target, spec, sort, args = self._find_query(resource, req, sub_resource_lookup)
+
+        count_options = {}
+        if "hint" in args:
+            count_options["hint"] = args["hint"]
+
+        guard_max_time_ms = self._guard_query(resource, target, spec, sort)
+        max_time_ms = self._max_time_ms(resource, "find", guard_max_time_ms)
+        if max_time_ms:
+            args["max_time_ms"] = max_time_ms
+
+        session = self._read_session(resource)
+        if session:
+            args["session"] = count_options["session"] = session
+
+        recorder = self._query_recorder(resource, "find", spec, sort)
+        try:
+            if recorder:
+                result = TimedCursor(target, on_exhausted=recorder, **args)
+            else:
+                result = target.find(**args)
+        except TypeError as e:
+            # pymongo raises ValueError when invalid query paramenters are
+            # included. We do our best to catch them beforehand but, especially
+            # with key/value sort syntax, invalid ones might still slip in.
+            self.app.logger.exception(e)
+            abort(400, description=debug_error_message(str(e)))
+
+        if perform_count:
+            max_time_ms = self._max_time_ms(resource, "count", guard_max_time_ms)
+            if max_time_ms:
+                count_options["maxTimeMS"] = max_time_ms
+
+            started = time.perf_counter()
+            try:
+                count = target.count_documents(spec, **count_options)
+            except pymongo.errors.ExecutionTimeout:
+                raise
+            except Exception:
+                # fallback to deprecated method. this might happen when the query
+                # includes operators not supported by count_documents(). one
+                # documented use-case is when we're running on mongo 3.4 and below,
+                # which does not support $expr ($expr must replace $where # in
+                # count_documents()).
+
+                # 1. Mongo 3.6+; $expr: pass
+                # 2. Mongo 3.6+; $where: pass (via fallback)
+                # 3. Mongo 3.4; $where: pass (via fallback)
+                # 4. Mongo 3.4; $expr: fail (operator not supported by db)
+
+                # See: http://api.mongodb.com/python/current/api/pymongo/collection.html#pymongo.collection.Collection.count
+                count = target.count()
+            if recorder:
+                result.elapsed += time.perf_counter() - started
+        else:
+            count = None
+
+        return result, count
+
+    def _find_query(self, resource, req, sub_resource_lookup):
+        """Builds the query performed by :meth:`find`. Returns the target
+        collection, the final query and sort, and the arguments to be passed
+        to `Collection.find()`.
+
+        .. versionadded:: 2.2
+        """
         args = {}
 
         if req and req.max_results:
@@ -215,11 +331,16 @@ class Mongo(DataLayer):
         # return an error)
 
         client_sort = self._convert_sort_request_to_dict(req)
-        spec = self._convert_where_request_to_dict(resource, req)
+        if req and req.named_query:
+            # named queries are declared by the API maintainer, and have been
+            # validated when the resource was registered.
+            spec = self._named_query(resource, req)
+        else:
+            spec = self._convert_where_request_to_dict(resource, req)
 
-        bad_filter = validate_filters(spec, resource)
-        if bad_filter:
-            abort(400, bad_filter)
+            bad_filter = validate_filters(spec, resource)
+            if bad_filter:
+                abort(400, bad_filter)
 
         if sub_resource_lookup:
             spec = self.combine_queries(spec, sub_resource_lookup)
@@ -232,7 +353,7 @@ class Mongo(DataLayer):
             # Soft delete filtering applied after validate_filters call as
             # querying against the DELETED field must always be allowed when
             # soft_delete is enabled
-            spec = self.combine_queries(spec, {config.DELETED: {"$ne": True}})
+            spec = self.combine_queries(spec, soft_delete_filter(resource))
 
         spec = self._mongotize(spec, resource)
 
@@ -245,6 +366,8 @@ class Mongo(DataLayer):
         if req and req.if_modified_since:
             spec[config.LAST_UPDATED] = {"$gt": req.if_modified_since}
 
+        spec = normalize_query(spec)
+
         if len(spec) > 0:
             args["filter"] = spec
 
@@ -254,37 +377,16 @@ class Mongo(DataLayer):
         if projection:
             args["projection"] = projection
 
-        target = self.pymongo(resource).db[datasource]
-        try:
-            result = target.find(**args)
-        except TypeError as e:
-            # pymongo raises ValueError when invalid query paramenters are
-            # included. We do our best to catch them beforehand but, especially
-            # with key/value sort syntax, invalid ones might still slip in.
-            self.app.logger.exception(e)
-            abort(400, description=debug_error_message(str(e)))
+        if sort and config.DOMAIN[resource]["mongo_allow_disk_use"]:
+            args["allow_disk_use"] = True
 
-        if perform_count:
-            try:
-                count = target.count_documents(spec)
-            except Exception:
-                # fallback to deprecated method. this might happen when the query
-                # includes operators not supported by count_documents(). one
-                # documented use-case is when we're running on mongo 3.4 and below,
-                # which does not support $expr ($expr must replace $where # in
-                # count_documents()).
-
-                # 1. Mongo 3.6+; $expr: pass
-                # 2. Mongo 3.6+; $where: pass (via fallback)
-                # 3. Mongo 3.4; $where: pass (via fallback)
-                # 4. Mongo 3.4; $expr: fail (operator not supported by db)
+        target = self._read_collection(resource, datasource, "find")
 
-                # See: http://api.mongodb.com/python/current/api/pymongo/collection.html#pymongo.collection.Collection.count
-                count = target.count()
-        else:
-            count = None
+        hint = self._query_hint(resource, req, target, spec, sort)
+        if hint:
+            args["hint"] = hint
 
-        return result, count
+        return target, spec, sort, args
 
     def find_one(
         self,
@@ -302,6 +404,13 @@ class Mongo(DataLayer):
         :param mongo_options: Dict of parameters to pass to PyMongo with_options.
         :param **lookup: lookup query.
 
+        .. versionchanged:: 2.2
+           Record query shape statistics when QUERY_STATS is enabled.
+           Support for 'mongo_read_preference' and causal consistency tokens.
+           Support for 'mongo_max_time_ms' budgets.
+           The query is normalized, flattening '$and' chains.
+           Support for 'mongo_indexed_soft_delete'.
+
         .. versionchanged:: 0.6
            Support for multiple databases.
            Filter soft deleted documents by default
@@ -323,6 +432,42 @@ class Mongo(DataLayer):
         .. versionchanged:: 0.0.4
            retrieves the target collection via the new config.SOURCES helper.
         """
+        target, filter_, projection = self._find_one_query(
+            resource,
+            req,
+            lookup,
+            check_auth_value,
+            force_auth_field_projection,
+            mongo_options,
+        )
+
+        recorder = self._query_recorder(resource, "find_one", filter_)
+        started = time.perf_counter()
+        # Here, we feed pymongo with `None` if projection is empty.
+        document = target.find_one(
+            filter_,
+            projection or None,
+            session=self._read_session(resource),
+            max_time_ms=self._max_time_ms(resource, "find_one"),
+        )
+        if recorder:
+            recorder(time.perf_counter() - started)
+        return document
+
+    def _find_one_query(
+        self,
+        resource,
+        req,
+        lookup,
+        check_auth_value=True,
+        force_auth_field_projection=False,
+        mongo_options=None,
+    ):
+        """Builds the query performed by :meth:`find_one`. Returns the target
+        collection, the final query and the projection.
+
+        .. versionadded:: 2.2
+        """
         self._mongotize(lookup, resource)
 
         client_projection = self._client_projection(req)
@@ -340,14 +485,93 @@ class Mongo(DataLayer):
             and (not req or not req.show_deleted)
             and (not self.query_contains_field(lookup, config.DELETED))
         ):
-            filter_ = self.combine_queries(filter_, {config.DELETED: {"$ne": True}})
-        # Here, we feed pymongo with `None` if projection is empty.
-        target = self.pymongo(resource).db[datasource]
+            filter_ = self.combine_queries(filter_, soft_delete_filter(resource))
+        filter_ = normalize_query(filter_)
+        target = self._read_collection(resource, datasource, "find_one")
         if mongo_options:
-            return target.with_options(**mongo_options).find_one(
-                filter_, projection or None
-            )
-        return target.find_one(filter_, projection or None)
+            target = target.with_options(**mongo_options)
+
+        return target, filter_, projection
+
+    def explain(self, resource, req, sub_resource_lookup, perform_count=True):
+        """Returns the query :meth:`find` would perform for a request (filter,
+        projection, sort, skip, limit and hint), along with its count, the
+        'executionStats' explain output of both, and the wall time of each
+        phase in milliseconds. Documents are not retrieved.
+
+        :param resource: resource name.
+        :param req: a :class:`ParsedRequest` instance.
+        :param sub_resource_lookup: sub-resource lookup from the endpoint url.
+        :param perform_count: whether the count should be explained too.
+
+        .. versionadded:: 2.2
+        """
+        timings = {}
+        started = time.perf_counter()
+        target, spec, sort, args = self._find_query(resource, req, sub_resource_lookup)
+        timings["query"] = _elapsed_ms(started)
+
+        command = SON([("find", target.name), ("filter", spec)])
+        for arg, key in (
+            ("projection", "projection"),
+            ("sort", "sort"),
+            ("skip", "skip"),
+            ("limit", "limit"),
+            ("hint", "hint"),
+            ("allow_disk_use", "allowDiskUse"),
+        ):
+            if arg in args:
+                command[key] = SON(args[arg]) if arg == "sort" else args[arg]
+
+        explain = {"find": dict(command)}
+        started = time.perf_counter()
+        explain["find"]["explain"] = _explain(target, command)
+        timings["find"] = _elapsed_ms(started)
+
+        if perform_count:
+            # the pipeline run by Collection.count_documents().
+            pipeline = [{"$match": spec}, {"$group": {"_id": 1, "n": {"$sum": 1}}}]
+            command = SON([("aggregate", target.name), ("pipeline", pipeline)])
+            command["cursor"] = {}
+            if "hint" in args:
+                command["hint"] = args["hint"]
+            explain["count"] = dict(command)
+            started = time.perf_counter()
+            explain["count"]["explain"] = _explain(target, command)
+            timings["count"] = _elapsed_ms(started)
+
+        explain["timings"] = timings
+        return explain
+
+    def explain_one(self, resource, req, **lookup):
+        """Returns the query :meth:`find_one` would perform for a request,
+        along with its 'executionStats' explain output and the wall time of
+        each phase in milliseconds. The document is not retrieved.
+
+        :param resource: resource name.
+        :param req: a :class:`ParsedRequest` instance.
+        :param **lookup: lookup query.
+
+        .. versionadded:: 2.2
+        """
+        timings = {}
+        started = time.perf_counter()
+        target, filter_, projection = self._find_one_query(resource, req, lookup)
+        timings["query"] = _elapsed_ms(started)
+
+        command = SON([("find", target.name), ("filter", filter_)])
+        if projection:
+            command["projection"] = projection
+        command["limit"] = 1
+        command["singleBatch"] = True
+
+        explain = {"find": dict(command)}
+        started = time.perf_counter()
+        explain["find"]["explain"] = _explain(target, command)
+        timings["find"] = _elapsed_ms(started)
+
+        explain["timings"] = timings
+        return explain
 
     def find_one_raw(self, resource, **lookup):
         """Retrieves a single raw document.
@@ -395,6 +619,11 @@ class Mongo(DataLayer):
         :return: a list of documents matching the ids in `ids` from the
         collection specified in `resource`
 
+        .. versionchanged:: 2.2
+           Support for 'mongo_read_preference' and causal consistency tokens.
+           Support for 'mongo_max_time_ms' budgets.
+           The query is normalized, flattening '$and' chains.
+
         .. versionchanged:: 0.6
            Support for multiple databases.
 
@@ -412,25 +641,247 @@ class Mongo(DataLayer):
         # projection of {} return all fields in MongoDB, but
         # pymongo will only return `_id`. It's a design flaw upstream.
         # Here, we feed pymongo with `None` if projection is empty.
-        documents = (
-            self.pymongo(resource)
-            .db[datasource]
-            .find(filter=spec, projection=(projection or None))
+        documents = self._read_collection(resource, datasource, "find").find(
+            filter=normalize_query(spec),
+            projection=(projection or None),
+            session=self._read_session(resource),
+            max_time_ms=self._max_time_ms(resource, "find"),
         )
         return documents
 
+    def find_existing(self, resource, fields, references):
+        """Returns the `references` which match a document of `resource`,
+        with a single query of the form
+
+            {field_1: {'$in': [...]}, field_2: {'$in': [...]}, ...}
+
+        Each reference is a tuple holding a value for each of the `fields`,
+        which are matched like :meth:`find_one` would (values are
+        mongotized, datasource filter, auth field and soft delete apply).
+
+        :param resource: resource name.
+        :param fields: a tuple of (top-level) field names.
+        :param references: a list of tuples of values, one per field.
+
+        .. versionadded:: 2.2
+        """
+        candidates = {}
+        for reference in references:
+            lookup = dict(zip(fields, reference))
+            self._mongotize(lookup, resource)
+            key = _reference_key(lookup[field] for field in fields)
+            if key is not None:
+                candidates.setdefault(key, []).append(reference)
+        if not candidates:
+            return []
+
+        query = {}
+        for position, field in enumerate(fields):
+            values = {}
+            for key in candidates:
+                values.setdefault(key[position], key[position][1])
+            query[field] = {"$in": list(values.values())}
+
+        target, filter_, _ = self._find_one_query(resource, None, query)
+        documents = target.find(
+            filter_,
+            projection={field: 1 for field in fields},
+            session=self._read_session(resource),
+            max_time_ms=self._max_time_ms(resource, "find"),
+        )
+        existing = []
+        for document in documents:
+            values = []
+            for field in fields:
+                value = document.get(field)
+                values.append(value if isinstance(value, list) else [value])
+            # array fields match any of their elements, as in find_one().
+            for stored in itertools.product(*values):
+                existing.extend(candidates.pop(_reference_key(stored), []))
+        return existing
+
     def aggregate(self, resource, pipeline, options):
         """
+        .. versionchanged:: 2.2
+           Pipeline stages are mongotized against the resource schema types.
+           Record query shape statistics when QUERY_STATS is enabled.
+           Support for 'mongo_read_preference' and causal consistency tokens.
+           Support for 'mongo_max_time_ms' budgets.
+           Datasource 'hints' are matched against the leading '$match' and
+           '$sort' stages, unless a 'hint' option is provided.
+           Honor 'mongo_allow_disk_use' unless an 'allowDiskUse' option is
+           provided.
+           Materialized aggregations run against their backing collection.
+
         .. versionadded:: 0.7
         """
         datasource, _, _, _ = self.datasource(resource)
-        challenge = self._mongotize({"key": pipeline}, resource)["key"]
+        materialize = config.DOMAIN[resource]["datasource"]["aggregation"].get(
+            "materialize"
+        )
+        if materialize:
+            datasource = materialize["collection"]
+        challenge = [self._mongotize(stage, resource) for stage in pipeline]
+
+        if "allowDiskUse" not in options and config.DOMAIN[resource][
+            "mongo_allow_disk_use"
+        ]:
+            options = dict(options, allowDiskUse=True)
+
+        if "hint" not in options:
+            hints = config.DOMAIN[resource]["datasource"].get("hints")
+            hint = query_hint(hints, *_pipeline_query(challenge))
+            if hint:
+                options = dict(options, hint=hint)
+
+        session = self._read_session(resource)
+        if session:
+            options = dict(options, session=session)
+
+        max_time_ms = self._max_time_ms(resource, "aggregate", options.get("maxTimeMS"))
+        if max_time_ms:
+            options = dict(options, maxTimeMS=max_time_ms)
+
+        target = self._read_collection(resource, datasource, "aggregate")
+        recorder = self._query_recorder(resource, "aggregate", challenge)
+        started = time.perf_counter()
+        result = target.aggregate(challenge, **options)
+        if recorder:
+            recorder(time.perf_counter() - started)
+        return result
+
+    def aggregate_count(self, resource, pipeline, options):
+        """Returns the number of documents returned by an aggregation
+        pipeline. Counts are cached for 'count_cache_ttl' seconds, when set in
+        the resource aggregation settings. Cached counts are specific to the
+        database, the pipeline and the options which can change the result,
+        such as the collation.
+
+        .. versionadded:: 2.2
+        """
+        ttl = config.DOMAIN[resource]["datasource"]["aggregation"]["count_cache_ttl"]
+        if not ttl:
+            return super().aggregate_count(resource, pipeline, options)
+
+        # options which don't change the result are left out of the key.
+        key_options = SON(
+            sorted(
+                (name, value)
+                for name, value in options.items()
+                if name not in COUNT_CACHE_IGNORED_OPTIONS
+            )
+        )
+        try:
+            key = (
+                resource,
+                self.current_mongo_prefix(resource),
+                bson.encode({"pipeline": pipeline, "options": key_options}),
+            )
+        except (bson.errors.InvalidDocument, TypeError):
+            return super().aggregate_count(resource, pipeline, options)
+
+        now = time.time()
+        cached = self.aggregation_counts.get(key)
+        if cached and now - cached[0] < ttl:
+            return cached[1]
+
+        count = super().aggregate_count(resource, pipeline, options)
+        if len(self.aggregation_counts) >= self.max_aggregation_counts:
+            self.aggregation_counts.clear()
+        self.aggregation_counts[key] = (now, count)
+        return count
+
+    def materialize(self, resource, force=False):
+        """Refreshes the materialized results of an aggregation resource when
+        they are due, that is when they have never been computed, when its
+        'refresh' interval has elapsed or when one of its source resources
+        has been written since the last refresh. The 'materialize' pipeline
+        is run against the resource datasource, after a '$match' stage on the
+        datasource filter, and its results are written to the backing
+        collection with a final '$out' or '$merge' stage.
+
+        A lease makes sure that only one request at a time refreshes the
+        results, while the others keep serving the current ones. Returns a
+        dict with the time of the last refresh ('updated') and whether the
+        results are known to be out of date ('stale').
+
+        :param resource: the aggregation resource.
+        :param force: refresh the results even if they are not due, which
+                      allows to refresh them from a scheduled job.
+
+        .. versionadded:: 2.2
+        """
+        materialize = config.DOMAIN[resource]["datasource"]["aggregation"][
+            "materialize"
+        ]
+        states = self.pymongo(resource).db[config.MATERIALIZATIONS_COLLECTION]
+        now = time.time()
+        state = states.find_one({"_id": resource}) or {}
+        if not force and not _materialization_due(state, materialize, now):
+            return _materialization_meta(state, False)
 
-        return self.pymongo(resource).db[datasource].aggregate(challenge, **options)
+        try:
+            states.find_one_and_update(
+                {
+                    "_id": resource,
+                    "$or": [{"lease": None}, {"lease": {"$lt": now}}],
+                },
+                {"$set": {"lease": now + self.materialize_lease}},
+                upsert=True,
+            )
+        except pymongo.errors.DuplicateKeyError:
+            # another request holds the lease and is refreshing the results.
+            return _materialization_meta(state, True)
+
+        source, filter_, _, _ = self.datasource(resource)
+        pipeline = materialize["pipeline"]
+        if filter_:
+            pipeline = [{"$match": self._mongotize(filter_, resource)}] + pipeline
+        if materialize["mode"] == "merge":
+            output = {"$merge": {"into": materialize["collection"]}}
+        else:
+            output = {"$out": materialize["collection"]}
+        options = {}
+        if config.DOMAIN[resource]["mongo_allow_disk_use"]:
+            options["allowDiskUse"] = True
+        try:
+            self.pymongo(resource).db[source].aggregate(pipeline + [output], **options)
+        except Exception:
+            states.update_one({"_id": resource}, {"$unset": {"lease": ""}})
+            raise
+        state = states.find_one_and_update(
+            {"_id": resource},
+            {"$set": {"refreshed": now}, "$unset": {"lease": ""}},
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        return _materialization_meta(state, False)
+
+    def _invalidate_materialized(self, resource):
+        """Records a write on a resource, so that the materialized
+        aggregations depending on it are refreshed on their next read. The
+        dependencies are mapped when the resources are registered.
+
+        .. versionadded:: 2.2
+        """
+        for name in config.MATERIALIZED.get(resource, ()):
+            try:
+                self.pymongo(name).db[config.MATERIALIZATIONS_COLLECTION].update_one(
+                    {"_id": name}, {"$max": {"written": time.time()}}, upsert=True
+                )
+            except pymongo.errors.PyMongoError as e:
+                self.app.logger.warning(
+                    "unable to invalidate the materialized '%s' aggregation: %s",
+                    name,
+                    e,
+                )
 
     def insert(self, resource, doc_or_docs):
         """Inserts a document into a resource collection.
 
+        .. versionchanged:: 2.2
+           Causal consistency token support.
+           Invalidate the materialized aggregations depending on the resource.
+
         .. versionchanged:: 0.6.1
            Support for PyMongo 3.0.
 
@@ -458,8 +909,12 @@ class Mongo(DataLayer):
         if isinstance(doc_or_docs, dict):
             doc_or_docs = [doc_or_docs]
 
+        session = self._write_session(resource)
         try:
-            return coll.insert_many(doc_or_docs, ordered=True).inserted_ids
+            ids = coll.insert_many(doc_or_docs, ordered=True, session=session)
+            self._set_causal_token(session)
+            self._invalidate_materialized(resource)
+            return ids.inserted_ids
         except pymongo.errors.BulkWriteError as e:
             self.app.logger.exception(e)
 
@@ -490,9 +945,62 @@ class Mongo(DataLayer):
                 ),
             )
 
+    def insert_unordered(self, resource, documents):
+        """Inserts documents into a resource collection with an unordered bulk
+        operation, so that failing documents (duplicate keys, for example) do
+        not abort the insertion of the remaining ones. Returns the ids of the
+        documents, None for those which failed, and a dict mapping the index
+        of each failed document to a (code, message) tuple.
+
+        .. versionadded:: 2.2
+        """
+        datasource, _, _, _ = self._datasource_ex(resource)
+
+        coll = self.get_collection_with_write_concern(datasource, resource)
+
+        session = self._write_session(resource)
+        errors = {}
+        try:
+            coll.insert_many(documents, ordered=False, session=session)
+        except pymongo.errors.BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                self.app.logger.exception(e)
+                abort(
+                    500,
+                    description=debug_error_message(
+                        "pymongo.errors.BulkWriteError: %s" % e
+                    ),
+                )
+            for error in e.details["writeErrors"]:
+                errors[error["index"]] = (error["code"], error["errmsg"])
+
+        if len(errors) < len(documents):
+            self._set_causal_token(session)
+            self._invalidate_materialized(resource)
+
+        # insert_many() sets the '_id' of the documents it is given.
+        ids = [
+            None if index in errors else document.get("_id")
+            for index, document in enumerate(documents)
+        ]
+        return ids, errors
+
+    def insert_target(self, resource):
+        """Returns the resource along with the mongo prefix of the current
+        request, since the database the documents are inserted into can
+        depend on the request (see :meth:`current_mongo_prefix`).
+
+        .. versionadded:: 2.2
+        """
+        return resource, self.current_mongo_prefix(resource)
+
     def _change_request(self, resource, id_, changes, original, replace=False):
         """Performs a change, be it a replace or update.
 
+        .. versionchanged:: 2.2
+           Causal consistency token support.
+           Invalidate the materialized aggregations depending on the resource.
+
         .. versionchanged:: 0.8.2
            Return 400 if update/replace with malformed DBRef field. See #1257.
 
@@ -511,12 +1019,15 @@ class Mongo(DataLayer):
         datasource, filter_, _, _ = self._datasource_ex(resource, query)
 
         coll = self.get_collection_with_write_concern(datasource, resource)
+        session = self._write_session(resource)
         try:
             result = (
-                coll.replace_one(filter_, changes)
+                coll.replace_one(filter_, changes, session=session)
                 if replace
-                else coll.update_one(filter_, changes)
+                else coll.update_one(filter_, changes, session=session)
             )
+            self._set_causal_token(session)
+            self._invalidate_materialized(resource)
             if (
                 config.ETAG in original
                 and result
@@ -524,44 +1035,151 @@ class Mongo(DataLayer):
                 and result.modified_count == 0
             ):
                 raise self.OriginalChangedError()
-        except pymongo.errors.DuplicateKeyError as e:
+        except (pymongo.errors.WriteError, pymongo.errors.OperationFailure) as e:
+            self._abort_change_failure(e, id_field)
+
+    def _abort_change_failure(self, e, id_field):
+        """Aborts a change request which failed with `e`.
+
+        .. versionadded:: 2.2
+           Factored out of :meth:`_change_request`.
+        """
+        if isinstance(e, pymongo.errors.DuplicateKeyError):
             abort(
                 400,
                 description=debug_error_message(
                     "pymongo.errors.DuplicateKeyError: %s" % e
                 ),
             )
+        # server error codes and messages changed between 2.4 and 2.6/3.0.
+        server_version = self.driver.db.client.server_info()["version"][:3]
+        if (server_version == "2.4" and e.code in (13596, 10148)) or e.code in (
+            66,
+            16837,
+        ):
+            # attempt to update an immutable field. this usually
+            # happens when a PATCH or PUT includes a mismatching ID_FIELD.
+            self.app.logger.warning(e)
+            description = (
+                debug_error_message("pymongo.errors.OperationFailure: %s" % e)
+                or "Attempt to update an immutable field. Usually happens "
+                "when PATCH or PUT include a '%s' field, "
+                "which is immutable (PUT can include it as long as "
+                "it is unchanged)." % id_field
+            )
+
+            abort(400, description=description)
+        else:
+            # see comment in :func:`insert()`.
+            self.app.logger.exception(e)
+            abort(
+                500,
+                description=debug_error_message(
+                    "pymongo.errors.OperationFailure: %s" % e
+                ),
+            )
+
+    def _write_if_match(self, resource, req, lookup, etag, write):
+        """Performs a single conditional write on the document matching
+        `lookup`, and returns the document returned by `write`. When the
+        write matches no document, a projection-only lookup tells apart
+        missing documents (None is returned) from documents whose etag does
+        not match (OriginalChangedError is raised).
+
+        :param write: a callable taking the collection, the filter, the
+                      projection and the session, which performs the write.
+
+        .. versionadded:: 2.2
+        """
+        id_field = config.DOMAIN[resource]["id_field"]
+        _, filter_, projection = self._find_one_query(resource, req, lookup)
+        datasource = self.datasource(resource)[0]
+        coll = self.get_collection_with_write_concern(datasource, resource)
+        session = self._write_session(resource)
+
+        query = filter_
+        if etag is not None:
+            query = self.combine_queries(filter_, {config.ETAG: etag})
+        try:
+            document = write(coll, query, projection or None, session)
         except (pymongo.errors.WriteError, pymongo.errors.OperationFailure) as e:
-            # server error codes and messages changed between 2.4 and 2.6/3.0.
-            server_version = self.driver.db.client.server_info()["version"][:3]
-            if (server_version == "2.4" and e.code in (13596, 10148)) or e.code in (
-                66,
-                16837,
-            ):
-                # attempt to update an immutable field. this usually
-                # happens when a PATCH or PUT includes a mismatching ID_FIELD.
-                self.app.logger.warning(e)
-                description = (
-                    debug_error_message("pymongo.errors.OperationFailure: %s" % e)
-                    or "Attempt to update an immutable field. Usually happens "
-                    "when PATCH or PUT include a '%s' field, "
-                    "which is immutable (PUT can include it as long as "
-                    "it is unchanged)." % id_field
-                )
+            self._abort_change_failure(e, id_field)
+
+        if document is not None:
+            self._set_causal_token(session)
+            self._invalidate_materialized(resource)
+            return document
+        if etag is not None and coll.find_one(
+            filter_, projection={id_field: 1}, session=session
+        ):
+            raise self.OriginalChangedError()
+        return None
 
-                abort(400, description=description)
-            else:
-                # see comment in :func:`insert()`.
-                self.app.logger.exception(e)
-                abort(
-                    500,
-                    description=debug_error_message(
-                        "pymongo.errors.OperationFailure: %s" % e
-                    ),
-                )
+    def update_if_match(self, resource, req, lookup, updates, etag=None):
+        """Updates a document with a single find_one_and_update.
+
+        .. versionadded:: 2.2
+        """
+
+        def write(coll, query, projection, session):
+            return coll.find_one_and_update(
+                query,
+                {"$set": updates},
+                projection=projection,
+                return_document=pymongo.ReturnDocument.AFTER,
+                session=session,
+            )
+
+        return self._write_if_match(resource, req, lookup, etag, write)
+
+    def replace_if_match(self, resource, req, lookup, document, etag=None):
+        """Replaces a document with a single find_one_and_update, performing
+        a pipeline which preserves the creation date of the document. The new
+        document is a literal, so its values are not taken for expressions.
 
-    def update(self, resource, id_, updates, original):
+        .. versionadded:: 2.2
+        """
+        pipeline = [
+            {
+                "$replaceWith": {
+                    "$mergeObjects": [
+                        {config.DATE_CREATED: "$" + config.DATE_CREATED},
+                        {"$literal": document},
+                    ]
+                }
+            }
+        ]
+
+        def write(coll, query, projection, session):
+            return coll.find_one_and_update(
+                query,
+                pipeline,
+                projection=projection,
+                return_document=pymongo.ReturnDocument.AFTER,
+                session=session,
+            )
+
+        return self._write_if_match(resource, req, lookup, etag, write)
+
+    def remove_if_match(self, resource, req, lookup, etag=None):
+        """Removes a document with a single find_one_and_delete.
+
+        .. versionadded:: 2.2
+        """
+
+        def write(coll, query, projection, session):
+            return coll.find_one_and_delete(
+                query, projection=projection, session=session
+            )
+
+        return self._write_if_match(resource, req, lookup, etag, write)
+
+    def update(self, resource, id_, updates, original, operators=None):
         """Updates a collection document.
+        .. versionchanged:: 2.2
+           Apply PATCH update 'operators' atomically.
+           Only set the values which changed, by their dotted paths.
+
         .. versionchanged:: 0.6
            Support for multiple databases.
 
@@ -592,7 +1210,67 @@ class Mongo(DataLayer):
            retrieves the target collection via the new config.SOURCES helper.
         """
 
-        return self._change_request(resource, id_, {"$set": updates}, original)
+        return self._change_request(
+            resource, id_, self._update_changes(updates, original, operators), original
+        )
+
+    def update_with_operators(self, resource, id_, updates, operators):
+        """Applies update operators with a single find_one_and_update, and
+        returns the updated document, with the datasource projection. The
+        document is only matched if the operators keep its fields within
+        their schema bounds (see :func:`operator_bounds`).
+
+        .. versionadded:: 2.2
+        """
+        resource_def = config.DOMAIN[resource]
+        id_field = resource_def["id_field"]
+        datasource, filter_, projection, _ = self._datasource_ex(
+            resource, {id_field: id_}
+        )
+        bounds = operator_bounds(resource_def["schema"], operators)
+
+        coll = self.get_collection_with_write_concern(datasource, resource)
+        session = self._write_session(resource)
+        try:
+            document = coll.find_one_and_update(
+                {"$and": [filter_] + bounds} if bounds else filter_,
+                self._update_changes(updates, {}, operators),
+                projection=projection or None,
+                return_document=pymongo.ReturnDocument.AFTER,
+                session=session,
+            )
+            if document is None and bounds:
+                if coll.count_documents(filter_, limit=1, session=session):
+                    raise self.OriginalChangedError()
+        except (pymongo.errors.WriteError, pymongo.errors.OperationFailure) as e:
+            self._abort_change_failure(e, id_field)
+        if document is not None:
+            self._set_causal_token(session)
+            self._invalidate_materialized(resource)
+        return document
+
+    def _update_changes(self, updates, original, operators=None):
+        """Returns the update document which applies `updates` to the
+        `original` document: only the values which actually changed are set,
+        by their dotted paths, instead of whole subdocuments and lists.
+
+        .. versionadded:: 2.2
+        """
+        if operators:
+            # fields changed by operators hold their expected values in
+            # updates, but these must not be set over concurrent changes.
+            updates = {
+                field: value
+                for field, value in updates.items()
+                if not any(field in fields for fields in operators.values())
+            }
+        set_, unset = document_diff(updates, original)
+        changes = dict(operators or {})
+        if set_ or not (unset or operators):
+            changes["$set"] = set_ or updates
+        if unset:
+            changes["$unset"] = dict.fromkeys(unset, "")
+        return changes
 
     def replace(self, resource, id_, document, original):
         """Replaces an existing document.
@@ -619,6 +1297,10 @@ class Mongo(DataLayer):
         """Removes a document or the entire set of documents from a
         collection.
 
+        .. versionchanged:: 2.2
+           Causal consistency token support.
+           Invalidate the materialized aggregations depending on the resource.
+
         .. versionchanged:: 0.6.1
            Support for PyMongo 3.0.
 
@@ -655,8 +1337,11 @@ class Mongo(DataLayer):
         datasource, filter_, _, _ = self._datasource_ex(resource, lookup)
 
         coll = self.get_collection_with_write_concern(datasource, resource)
+        session = self._write_session(resource)
         try:
-            coll.delete_many(filter_)
+            coll.delete_many(filter_, session=session)
+            self._set_causal_token(session)
+            self._invalidate_materialized(resource)
         except pymongo.errors.OperationFailure as e:
             # see comment in :func:`insert()`.
             self.app.logger.exception(e)
@@ -667,6 +1352,85 @@ class Mongo(DataLayer):
                 ),
             )
 
+    def bulk_write(self, resource, operations):
+        """Performs a batch of update, replace and remove operations with a
+        single unordered bulk write. Each operation is conditioned on the
+        etag of its original document, if any, so that documents which have
+        changed in the meantime are not written.
+
+        The bulk write result does not tell which operations matched no
+        document, so when some did not, the written documents are looked up
+        with a single query to find them out.
+
+        .. versionadded:: 2.2
+        """
+        id_field = config.DOMAIN[resource]["id_field"]
+        datasource, _, _, _ = self._datasource_ex(resource)
+
+        requests = []
+        for op, id_, changes, original in operations:
+            query = {id_field: id_}
+            if config.ETAG in original:
+                query[config.ETAG] = original[config.ETAG]
+            _, filter_, _, _ = self._datasource_ex(resource, query)
+            if op == "update":
+                requests.append(
+                    pymongo.UpdateOne(filter_, self._update_changes(changes, original))
+                )
+            elif op == "replace":
+                requests.append(pymongo.ReplaceOne(filter_, changes))
+            else:
+                requests.append(pymongo.DeleteOne(filter_))
+
+        coll = self.get_collection_with_write_concern(datasource, resource)
+        session = self._write_session(resource)
+        errors = {}
+        try:
+            result = coll.bulk_write(requests, ordered=False, session=session)
+            acknowledged = result.acknowledged
+            matched = result.matched_count + result.deleted_count if acknowledged else 0
+        except pymongo.errors.BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                self.app.logger.exception(e)
+                abort(
+                    500,
+                    description=debug_error_message(
+                        "pymongo.errors.BulkWriteError: %s" % e
+                    ),
+                )
+            for error in e.details["writeErrors"]:
+                errors[error["index"]] = (error["code"], error["errmsg"])
+            acknowledged = True
+            matched = e.details["nMatched"] + e.details["nRemoved"]
+
+        self._set_causal_token(session)
+        self._invalidate_materialized(resource)
+
+        changed = set()
+        if acknowledged and matched < len(operations) - len(errors):
+            pending = [
+                index for index in range(len(operations)) if index not in errors
+            ]
+            found = {
+                document[id_field]: document.get(config.ETAG)
+                for document in coll.find(
+                    {id_field: {"$in": [operations[i][1] for i in pending]}},
+                    projection={config.ETAG: 1},
+                    session=session,
+                )
+            }
+            for index in pending:
+                op, id_, changes, _ = operations[index]
+                if op == "remove":
+                    performed = id_ not in found
+                elif config.ETAG in changes:
+                    performed = found.get(id_) == changes[config.ETAG]
+                else:
+                    performed = id_ in found
+                if not performed:
+                    changed.add(index)
+        return changed, errors
+
     # TODO: The next three methods could be pulled out to form the basis
     # of a separate MonqoQuery class
 
@@ -783,10 +1547,236 @@ class Mongo(DataLayer):
                 ),
             )
 
+    def query_stats_report(self, resource=None):
+        """Returns the query shapes recorded when QUERY_STATS is enabled,
+        ranked by total time, along with the index which would serve each of
+        them. Suggested indexes which are not already covered by the
+        'mongo_indexes' of their resource are also returned, grouped by
+        resource, in a format which can be pasted in the resource settings.
+
+        :param resource: only report the shapes of this resource.
+
+        .. versionadded:: 2.2
+        """
+        shapes = self.query_stats.ranked(resource)
+        suggestions = {}
+        for entry in shapes:
+            keys = suggest_index(entry["filter"], entry["sort"])
+            entry["suggested_index"] = keys
+            if keys and not self._index_exists(entry["resource"], keys):
+                indexes = suggestions.setdefault(entry["resource"], {})
+                indexes.setdefault(index_name(keys), [tuple(k) for k in keys])
+        return {config.ITEMS: shapes, "_suggested_indexes": suggestions}
+
+    def _index_exists(self, resource, keys):
+        """Returns True if an index declared with 'mongo_indexes' (or the
+        default _id index) can already serve queries on `keys`.
+
+        .. versionadded:: 2.2
+        """
+        keys = [tuple(k) for k in keys]
+        existing = [[("_id", 1)]]
+        for value in config.DOMAIN.get(resource, {}).get("mongo_indexes", {}).values():
+            existing.append(value[0] if isinstance(value, tuple) else value)
+        return any(
+            [tuple(k) for k in index[: len(keys)]] == keys for index in existing
+        )
+
+    def _query_recorder(self, resource, method, query, sort=None):
+        """Returns a callable which records the duration of a query, in
+        seconds, with the query shape statistics. Returns None if QUERY_STATS
+        is disabled.
+
+        .. versionadded:: 2.2
+        """
+        if not config.QUERY_STATS:
+            return None
+        shape = query_shape(query or {})
+        sort = sort_shape(sort)
+
+        def record(elapsed):
+            self.query_stats.record(resource, method, shape, sort, elapsed * 1000)
+
+        return record
+
+    def _guard_query(self, resource, collection, spec, sort):
+        """Checks whether a query and its sort can be served by the indexes
+        of the target collection, and acts on unindexed ones according to
+        the resource 'mongo_query_guard' setting: 'reject' aborts with a 400,
+        'timeout' returns the 'mongo_guard_max_time_ms' the query should be
+        capped to, and 'log' only logs a warning.
+
+        :param resource: resource name.
+        :param collection: the target collection.
+        :param spec: the final query, as sent to the database.
+        :param sort: the final sort, as sent to the database.
+
+        .. versionadded:: 2.2
+        """
+        resource_def = config.DOMAIN[resource]
+        action = resource_def["mongo_query_guard"]
+        if not action:
+            return None
+
+        indexes = self._collection_indexes(collection)
+        if indexes is None:
+            return None
+
+        unindexed = []
+        if not filter_is_indexed(spec, indexes):
+            unindexed.append("filter")
+        if not sort_is_indexed(sort, spec, indexes):
+            unindexed.append("sort")
+        if not unindexed:
+            return None
+
+        message = "unindexed %s on resource '%s'" % (" and ".join(unindexed), resource)
+        if action == "reject":
+            abort(400, description="Query rejected: %s." % message)
+
+        self.app.logger.warning(
+            "%s (filter fields: %s, sort: %s)", message, sorted(spec), sort
+        )
+        if action == "timeout":
+            return resource_def["mongo_guard_max_time_ms"]
+        return None
+
+    def _max_time_ms(self, resource, operation, max_time_ms=None):
+        """Returns the maxTimeMS a read `operation` should be given: the
+        resource 'mongo_max_time_ms' budget for the operation, further limited
+        by `max_time_ms` and by the time left before the request deadline.
+        Returns None if no limit applies.
+
+        The request deadline is set by the first budgeted operation of the
+        request, to the resource request budget or to the (shorter) timeout
+        sent by the client in the REQUEST_TIMEOUT_HEADER header. Following
+        operations (count, embedded documents lookups, etc.) share what is
+        left of it. Aborts with a 503 once the deadline has passed. Only GET
+        and HEAD requests have a deadline: write requests would otherwise
+        fail after the write, which clients would then retry.
+
+        :param resource: resource name.
+        :param operation: 'find', 'count', 'find_one' or 'aggregate'.
+        :param max_time_ms: an additional limit, in milliseconds.
+
+        .. versionadded:: 2.2
+        """
+        budget = config.DOMAIN[resource]["mongo_max_time_ms"]
+        limits = [operation_max_time_ms(budget, operation), max_time_ms]
+
+        deadline = g.get("mongo_deadline")
+        if deadline is None and request and request.method in ("GET", "HEAD"):
+            request_budget = [request_max_time_ms(budget), self._request_timeout()]
+            request_budget = [limit for limit in request_budget if limit]
+            if request_budget:
+                deadline = time.monotonic() + min(request_budget) / 1000.0
+                g.mongo_deadline = deadline
+
+        if deadline is not None:
+            left = int((deadline - time.monotonic()) * 1000)
+            if left < 1:
+                abort(
+                    503,
+                    description="Request time budget exhausted.",
+                    retry_after=config.MONGO_RETRY_AFTER,
+                )
+            limits.append(left)
+
+        limits = [limit for limit in limits if limit]
+        return min(limits) if limits else None
+
+    def _request_timeout(self):
+        """Returns the timeout sent by the client with the
+        REQUEST_TIMEOUT_HEADER header, in milliseconds, or None.
+
+        .. versionadded:: 2.2
+        """
+        header = config.REQUEST_TIMEOUT_HEADER
+        if not header or not request:
+            return None
+        try:
+            timeout = int(request.headers.get(header, ""))
+        except ValueError:
+            return None
+        return timeout if timeout > 0 else None
+
+    def _execution_timeout(self, error):
+        """Error handler which turns queries exceeding their time budget into
+        '503 Service Unavailable' responses.
+
+        .. versionadded:: 2.2
+        """
+        self.app.logger.warning(error)
+        return self.app.handle_http_exception(
+            ServiceUnavailable(
+                description="Request time budget exhausted.",
+                retry_after=config.MONGO_RETRY_AFTER,
+            )
+        )
+
+    def _query_hint(self, resource, req, collection, spec, sort):
+        """Returns the name of the index the query planner should use for a
+        query: the '?hint=' query parameter of requests coming from API
+        administrators, or the first datasource 'hints' rule matching the
+        query fields and sort. Returns None if the planner is left to choose.
+
+        .. versionadded:: 2.2
+        """
+        if req and req.hint and admin_request():
+            try:
+                indexes = collection.index_information()
+            except pymongo.errors.PyMongoError:
+                return req.hint
+            if req.hint not in indexes:
+                abort(400, description="Unknown index '%s'." % req.hint)
+            return req.hint
+
+        hints = config.DOMAIN[resource]["datasource"].get("hints")
+        return query_hint(hints, spec, sort)
+
+    def _collection_indexes(self, collection):
+        """Returns the key lists of the indexes available on a collection.
+        Index metadata is cached and refreshed every MONGO_INDEX_CACHE_TTL
+        seconds. Returns None if index metadata could not be retrieved.
+
+        .. versionadded:: 2.2
+        """
+        key = (id(collection.database.client), collection.full_name)
+        now = time.time()
+        cached = self.index_cache.get(key)
+        if cached and now - cached[0] < config.MONGO_INDEX_CACHE_TTL:
+            return cached[1]
+
+        try:
+            indexes = index_keys(collection.index_information())
+        except pymongo.errors.PyMongoError as e:
+            self.app.logger.warning(
+                "unable to retrieve indexes for '%s': %s", collection.full_name, e
+            )
+            return None
+
+        if not indexes:
+            # the collection does not exist (yet); it will get an _id index.
+            indexes = [[("_id", 1)]]
+        self.index_cache[key] = (now, indexes)
+        return indexes
+
     def _mongotize(self, source, resource, parse_objectid=False):
         """Recursively iterates a JSON dictionary, turning RFC-1123 strings
         into datetime values and ObjectId-link strings into ObjectIds.
 
+        Field types are looked up in the resource '_schema_types' map, which
+        is compiled once at registration time. Values of fields known to be
+        of 'objectid' or 'datetime' type only go through the relevant cast,
+        while values of 'string' fields are never cast to datetime, and are
+        only cast to ObjectId when 'query_objectid_as_string' is disabled.
+        Fields which are not in the map retain the legacy behavior: a
+        datetime cast is attempted first, then an ObjectId cast.
+
+        .. versionchanged:: 2.2
+           Rely on the precompiled '_schema_types' map instead of walking the
+           schema for every key.
+
         .. versionchanged:: 0.3
            'query_objectid_as_string' allows to bypass casting string types
            to objectids.
@@ -804,79 +1794,64 @@ class Mongo(DataLayer):
         .. versionadded:: 0.0.4
         """
         resource_def = config.DOMAIN[resource]
-        schema = resource_def.get("schema")
+        schema_types = resource_def.get("_schema_types", {})
         id_field = resource_def["id_field"]
         id_field_versioned = versioned_id_field(resource_def)
+        id_fields = (id_field, id_field_versioned)
         query_objectid_as_string = resource_def.get("query_objectid_as_string", False)
         parse_objectid = parse_objectid or not query_objectid_as_string
+        date_format = config.DATE_FORMAT
 
-        def try_cast(k, v, should_parse_objectid):
+        def cast_date(v):
             try:
-                return datetime.strptime(v, config.DATE_FORMAT)
-            except Exception:
-                if k in (id_field, id_field_versioned) or should_parse_objectid:
-                    try:
-                        # Convert to unicode because ObjectId() interprets
-                        # 12-character strings (but not unicode) as binary
-                        # representations of ObjectId's.  See
-                        # https://github.com/pyeve/eve/issues/508
-                        try:
-                            r = ObjectId(unicode(v))
-                        except NameError:
-                            # We're on Python 3 so it's all unicode already.
-                            r = ObjectId(v)
-                        return r
-                    except Exception:
-                        return v
+                return datetime.strptime(v, date_format)
+            except ValueError:
+                return v
+
+        def cast_objectid(v):
+            return ObjectId(v) if ObjectId.is_valid(v) else v
+
+        def try_cast(k, v, field_type):
+            if field_type == "objectid":
+                return cast_objectid(v)
+            if field_type == "datetime":
+                return cast_date(v)
+            if field_type == "string":
+                return cast_objectid(v) if parse_objectid else v
+
+            # unknown field type, try both casts.
+            r = cast_date(v)
+            if r is v and (k in id_fields or parse_objectid):
+                r = cast_objectid(v)
+            return r
+
+        def field_type_of(path):
+            field_type = schema_types.get(path)
+            if field_type is None and path == id_field_versioned:
+                field_type = schema_types.get(id_field)
+            return field_type
+
+        def mongotize(source, path, field_type):
+            for k, v in source.items():
+                if k.startswith("$"):
+                    # operators apply to the field they are nested in.
+                    k_path, k_type = path, field_type
                 else:
-                    return v
-
-        def get_schema_type(keys, schema):
-            def dict_sub_schema(base):
-                if base.get("type") == "dict":
-                    return base.get("schema")
-                return base
-
-            if not isinstance(schema, dict):
-                return None
-            if not keys:
-                return schema.get("type")
-
-            k = keys[0]
-            keys = keys[1:]
-            schema_type = schema[k].get("type") if k in schema else None
-            if schema_type == "list":
-                if "items" in schema[k]:
-                    items = schema[k].get("items") or []
-                    possible_types = [get_schema_type(keys, item) for item in items]
-                    if "objectid" in possible_types:
-                        return "objectid"
-                    return next((t for t in possible_types if t), None)
-                if "schema" in schema[k]:
-                    # recursively check the schema
-                    return get_schema_type(keys, dict_sub_schema(schema[k]["schema"]))
-            elif schema_type == "dict":
-                if "schema" in schema[k]:
-                    return get_schema_type(keys, dict_sub_schema(schema[k]["schema"]))
-            else:
-                return schema_type
-
-        for k, v in source.items():
-            keys = k.split(".")
-            schema_type = get_schema_type(keys, schema)
-            is_objectid = (schema_type == "objectid") or parse_objectid
-            if isinstance(v, dict):
-                self._mongotize(v, resource, is_objectid)
-            elif isinstance(v, list):
-                for i, v1 in enumerate(v):
-                    if isinstance(v1, dict):
-                        source[k][i] = self._mongotize(v1, resource)
-                    else:
-                        source[k][i] = try_cast(k, v1, is_objectid)
-            elif isinstance(v, str_type):
-                source[k] = try_cast(k, v, is_objectid)
-
-        return source
+                    k_path = "%s.%s" % (path, k) if path else k
+                    k_type = field_type_of(k_path)
+                if isinstance(v, dict):
+                    mongotize(v, k_path, k_type)
+                elif isinstance(v, list):
+                    for i, v1 in enumerate(v):
+                        if isinstance(v1, dict):
+                            mongotize(v1, k_path, k_type)
+                        elif isinstance(v1, str_type):
+                            v[i] = try_cast(k, v1, k_type)
+                elif isinstance(v, str_type):
+                    source[k] = try_cast(k, v, k_type)
+            return source
+
+        return mongotize(source, "", None)
 
     def _sanitize(self, resource, spec):
         """Makes sure that only allowed operators are included in the query,
@@ -980,6 +1955,28 @@ class Mongo(DataLayer):
                     )
         return query
 
+    def _named_query(self, resource, req):
+        """Returns the query declared in the resource 'named_queries' under
+        the name requested by the client, filled with the request parameters.
+        Aborts with a 400 if the query is unknown, if it is combined with a
+        'where' clause, or if its parameters are missing or not valid.
+
+        .. versionadded:: 2.2
+        """
+        if req.where:
+            abort(
+                400,
+                description="Named queries cannot be combined with a `where` "
+                "clause.",
+            )
+        query = config.DOMAIN[resource]["_named_queries"].get(req.named_query)
+        if query is None:
+            abort(400, description="Unknown query '%s'." % req.named_query)
+        try:
+            return query.render(req.args)
+        except ValueError as e:
+            abort(400, description=str(e))
+
     def _wc(self, resource):
         """Syntactic sugar for the current collection write_concern setting.
 
@@ -1074,6 +2071,98 @@ class Mongo(DataLayer):
         wc = WriteConcern(config.DOMAIN[resource]["mongo_write_concern"]["w"])
         return self.pymongo(resource).db[datasource].with_options(write_concern=wc)
 
+    def _read_collection(self, resource, datasource, method):
+        """Returns the collection to read from, with the resource
+        'mongo_read_preference' applied when serving GET and HEAD requests.
+        Reads performed while serving write requests (such as the lookup of
+        the original document) always go to the client default, usually the
+        primary.
+
+        :param resource: resource name.
+        :param datasource: collection name.
+        :param method: data layer read method ('find', 'find_one' or
+                       'aggregate').
+
+        .. versionadded:: 2.2
+        """
+        target = self.pymongo(resource).db[datasource]
+        if request and request.method in ("GET", "HEAD"):
+            preference = method_read_preference(
+                config.DOMAIN[resource]["mongo_read_preference"], method
+            )
+            if preference:
+                target = target.with_options(read_preference=preference)
+        return target
+
+    def _causal_session(self, resource):
+        """Returns the causally consistent session used by the current
+        request on the resource database client, starting it if needed.
+        Sessions are ended when the application context is torn down.
+
+        .. versionadded:: 2.2
+        """
+        client = self.pymongo(resource).cx
+        sessions = g.setdefault("mongo_sessions", {})
+        if id(client) not in sessions:
+            sessions[id(client)] = client.start_session(causal_consistency=True)
+        return sessions[id(client)]
+
+    def _read_session(self, resource):
+        """Returns a causally consistent session advanced to the causal
+        consistency token sent by the client, so the read observes the writes
+        which returned that token. Returns None when causal consistency is
+        disabled for the resource, or no token was sent.
+
+        .. versionadded:: 2.2
+        """
+        if not config.DOMAIN[resource]["mongo_causal_consistency"]:
+            return None
+        token = request.headers.get(config.CAUSAL_TOKEN_HEADER) if request else None
+        if not token:
+            return None
+
+        session = self._causal_session(resource)
+        try:
+            times = bson.decode(base64.urlsafe_b64decode(token.encode("ascii")))
+            if times.get("clusterTime"):
+                session.advance_cluster_time(times["clusterTime"])
+            session.advance_operation_time(times["operationTime"])
+        except (ValueError, TypeError, KeyError, bson.errors.BSONError):
+            abort(400, description="Invalid causal consistency token.")
+        return session
+
+    def _write_session(self, resource):
+        """Returns the causally consistent session writes should be performed
+        with, or None if causal consistency is disabled for the resource.
+
+        .. versionadded:: 2.2
+        """
+        if not config.DOMAIN[resource]["mongo_causal_consistency"]:
+            return None
+        return self._causal_session(resource)
+
+    def _set_causal_token(self, session):
+        """Stores the causal consistency token of the last write performed
+        with `session`, so it can be returned to the client.
+
+        .. versionadded:: 2.2
+        """
+        if session is None or session.operation_time is None:
+            # no session, or standalone server (no cluster time).
+            return
+        times = {"operationTime": session.operation_time}
+        if session.cluster_time:
+            times["clusterTime"] = session.cluster_time
+        g.causal_token = base64.urlsafe_b64encode(bson.encode(times)).decode("ascii")
+
+    def _end_sessions(self, exception=None):
+        """Ends the sessions started while serving the request.
+
+        .. versionadded:: 2.2
+        """
+        for session in g.pop("mongo_sessions", {}).values():
+            session.end_session()
+
 
 class PyMongos(dict):
     """Cache for PyMongo instances. It is just a normal dict which exposes
@@ -1100,12 +2189,25 @@ def ensure_mongo_indexes(app, resource):
     """Make sure 'mongo_indexes' is respected and mongo indexes are created on
     the current database.
 
+    .. versionchanged:: 2.2
+       With 'mongo_indexed_soft_delete', declared indexes are created as
+       partial indexes covering non deleted documents only, and so are
+       unique indexes for 'unique' fields.
+
     .. versionaddded:: 0.8
     """
-    mongo_indexes = app.config["DOMAIN"][resource]["mongo_indexes"]
-    if not mongo_indexes:
+    settings = app.config["DOMAIN"][resource]
+    mongo_indexes = settings["mongo_indexes"]
+    indexed_soft_delete = (
+        settings["soft_delete"] and settings["mongo_indexed_soft_delete"]
+    )
+    if not mongo_indexes and not indexed_soft_delete:
         return
 
+    partial_filter = None
+    if indexed_soft_delete:
+        partial_filter = {app.config["DELETED"]: False}
+
     for name, value in mongo_indexes.items():
         if isinstance(value, tuple):
             list_of_keys, index_options = value
@@ -1113,10 +2215,83 @@ def ensure_mongo_indexes(app, resource):
             list_of_keys = value
             index_options = {}
 
-        _create_index(app, resource, name, list_of_keys, index_options)
+        _create_index(
+            app, resource, name, list_of_keys, index_options, partial_filter
+        )
+
+    if indexed_soft_delete:
+        declared = set(tuple(map(tuple, keys)) for keys in _index_keys(mongo_indexes))
+        for field, rules in settings["schema"].items():
+            if not rules.get("unique") or ((field, 1),) in declared:
+                continue
+            # documents missing the field are left out, as 'unique' does not
+            # apply to them.
+            unique_filter = dict(partial_filter, **{field: {"$exists": True}})
+            try:
+                _create_index(
+                    app,
+                    resource,
+                    "%s_unique" % field,
+                    [(field, 1)],
+                    {"unique": True},
+                    unique_filter,
+                    versions=False,
+                )
+            except pymongo.errors.OperationFailure as e:
+                # most likely, live documents with duplicate values. The
+                # 'unique' rule still applies on write.
+                app.logger.warning(
+                    "could not create unique index on '%s.%s': %s", resource, field, e
+                )
+
+
+def _index_keys(mongo_indexes):
+    for value in mongo_indexes.values():
+        yield value[0] if isinstance(value, tuple) else value
+
+
+def soft_delete_filter(resource):
+    """Returns the condition matching the documents of a soft delete
+    resource which have not been deleted: an equality on DELETED when
+    'mongo_indexed_soft_delete' is enabled, so the query can be served by
+    partial indexes, or the legacy `$ne` condition which also matches
+    documents missing the DELETED field.
+
+    .. versionadded:: 2.2
+    """
+    if config.DOMAIN[resource]["mongo_indexed_soft_delete"]:
+        return {config.DELETED: False}
+    return {config.DELETED: {"$ne": True}}
+
+
+def backfill_soft_delete(app, resource):
+    """Sets DELETED to False on the documents of a resource which are
+    missing the field, as it happens when soft delete is enabled on a
+    resource with existing documents. Only the documents matching the
+    datasource filter of the resource are updated. Returns the number of
+    updated documents.
 
+    This is a one-time migration, to be run (with write access to the
+    collection) before enabling 'mongo_indexed_soft_delete' on a resource
+    with existing documents, which would otherwise be hidden. It is not run
+    by Eve itself.
 
-def _create_index(app, resource, name, list_of_keys, index_options):
+    .. versionadded:: 2.2
+    """
+    source = app.config["SOURCES"][resource]
+    deleted = app.config["DELETED"]
+    query = {deleted: {"$exists": False}}
+    if source["filter"]:
+        query = {"$and": [source["filter"], query]}
+    with app.app_context():
+        db = app.data.pymongo(resource).db
+    result = db[source["source"]].update_many(query, {"$set": {deleted: False}})
+    return result.modified_count
+
+
+def _create_index(
+    app, resource, name, list_of_keys, index_options, partial_filter=None, versions=True
+):
     """Create a specific index composed of the `list_of_keys` for the
     mongo collection behind the `resource` using the `app.config`
     to retrieve all data needed to find out the mongodb configuration.
@@ -1137,6 +2312,11 @@ def _create_index(app, resource, name, list_of_keys, index_options):
     For example:
         {"sparse": True}
 
+    .. versionchanged:: 2.2
+       Add 'partial_filter' and 'versions' arguments. The partial filter is
+       merged into the 'partialFilterExpression' of the index, and is not
+       applied to the versions collection.
+
     .. versionchanged:: 0.8.1
        Add support for IndexKeySpecsConflict error. See #1180.
 
@@ -1161,11 +2341,16 @@ def _create_index(app, resource, name, list_of_keys, index_options):
     kw = copy(index_options)
     kw["name"] = name
 
-    colls = [db[collection]]
-    if app.config["DOMAIN"][resource]["versioning"]:
-        colls.append(db["%s_versions" % collection])
+    colls = [(db[collection], kw)]
+    if versions and app.config["DOMAIN"][resource]["versioning"]:
+        colls.append((db["%s_versions" % collection], kw))
+
+    if partial_filter:
+        expression = dict(kw.get("partialFilterExpression") or {})
+        expression.update(partial_filter)
+        colls[0] = (db[collection], dict(kw, partialFilterExpression=expression))
 
-    for coll in colls:
+    for coll, kw in colls:
         try:
             coll.create_index(list_of_keys, **kw)
         except pymongo.errors.OperationFailure as e:
@@ -1179,3 +2364,343 @@ def _create_index(app, resource, name, list_of_keys, index_options):
                 coll.create_index(list_of_keys, **kw)
             else:
                 raise
+
+
+def validate_hints(hints, mongo_indexes):
+    """Validates a datasource 'hints' setting: a list of rules, each one
+    with the 'index' to be hinted (which must be declared in
+    'mongo_indexes') and the optional 'fields' the query must have
+    conditions on and 'sort' field names the query must be sorted by. Raises
+    ValueError if the setting is not valid.
+
+    .. versionadded:: 2.2
+    """
+    if hints is None:
+        return
+    if not isinstance(hints, list):
+        raise ValueError("must be a list of rules (%r)" % (hints,))
+    for rule in hints:
+        if not isinstance(rule, dict) or "index" not in rule:
+            raise ValueError("rules must be dicts with an 'index' key (%r)" % (rule,))
+        unknown = set(rule) - set(["index", "fields", "sort"])
+        if unknown:
+            raise ValueError("unknown rule keys %s" % sorted(unknown))
+        if rule["index"] not in mongo_indexes:
+            raise ValueError(
+                "index '%s' is not declared in 'mongo_indexes'" % rule["index"]
+            )
+        for key in ("fields", "sort"):
+            fields = rule.get(key, [])
+            if not isinstance(fields, list) or not all(
+                isinstance(field, str) for field in fields
+            ):
+                raise ValueError("'%s' must be a list of field names" % key)
+
+
+def validate_materialize(materialize):
+    """Validates an aggregation 'materialize' setting: a dict with the
+    'pipeline' computing the materialized results, the backing 'collection',
+    the output 'mode' ('out' or 'merge'), the 'refresh' interval in seconds
+    and the 'refresh_on' list of resources whose writes trigger a refresh.
+    Raises ValueError if the setting is not valid.
+
+    .. versionadded:: 2.2
+    """
+    if materialize is None:
+        return
+    if not isinstance(materialize, dict) or not isinstance(
+        materialize.get("pipeline"), list
+    ):
+        raise ValueError("must be a dict with a 'pipeline' list")
+    unknown = set(materialize) - set(
+        ["pipeline", "collection", "mode", "refresh", "refresh_on"]
+    )
+    if unknown:
+        raise ValueError("unknown keys %s" % sorted(unknown))
+    for stage in materialize["pipeline"]:
+        if not isinstance(stage, dict) or "$out" in stage or "$merge" in stage:
+            raise ValueError("stages must be dicts, without '$out' or '$merge'")
+    if not isinstance(materialize["collection"], str):
+        raise ValueError("'collection' must be a collection name")
+    if materialize["mode"] not in ("out", "merge"):
+        raise ValueError("'mode' must be 'out' or 'merge'")
+    refresh = materialize["refresh"]
+    if refresh is not None and (
+        isinstance(refresh, bool) or not isinstance(refresh, (int, float))
+    ):
+        raise ValueError("'refresh' must be a number of seconds")
+    refresh_on = materialize["refresh_on"]
+    if refresh_on is not None and (
+        not isinstance(refresh_on, list)
+        or not all(isinstance(name, str) for name in refresh_on)
+    ):
+        raise ValueError("'refresh_on' must be a list of resource names")
+
+
+def _materialization_due(state, materialize, now):
+    refreshed = state.get("refreshed")
+    if refreshed is None:
+        return True
+    written = state.get("written")
+    if written is not None and written >= refreshed:
+        return True
+    refresh = materialize["refresh"]
+    return bool(refresh) and now - refreshed >= refresh
+
+
+def _materialization_meta(state, stale):
+    refreshed = state.get("refreshed")
+    if refreshed is not None:
+        refreshed = datetime.fromtimestamp(int(refreshed), timezone.utc)
+    return {"updated": refreshed, "stale": stale or refreshed is None}
+
+
+def query_hint(hints, spec, sort):
+    """Returns the index of the first rule of a datasource 'hints' setting
+    which matches a query, or None. A rule matches when the query has
+    conditions on all its 'fields' and, if the rule has a 'sort', when the
+    query is sorted by exactly those fields.
+
+    :param hints: the datasource 'hints' setting.
+    :param spec: the query.
+    :param sort: the sort, as a list of (field, direction) pairs.
+
+    .. versionadded:: 2.2
+    """
+    if not hints:
+        return None
+    fields = query_fields(spec or {})
+    sort_fields = [field for field, _ in sort or []]
+    for rule in hints:
+        if not set(rule.get("fields", [])) <= fields:
+            continue
+        if "sort" in rule and rule["sort"] != sort_fields:
+            continue
+        return rule["index"]
+    return None
+
+
+def _explain(collection, command):
+    # runs the 'executionStats' explain of a command on the collection
+    # members, leaving out the cluster gossip which can't be rendered.
+    result = collection.database.command(
+        "explain",
+        command,
+        verbosity="executionStats",
+        read_preference=collection.read_preference,
+    )
+    for key in ("$clusterTime", "operationTime"):
+        result.pop(key, None)
+    return result
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def _reference_key(values):
+    # MongoDB does not match booleans against numbers, while Python considers
+    # True == 1. Unhashable values (embedded documents) are never matched.
+    key = tuple((isinstance(value, bool), value) for value in values)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _pipeline_query(pipeline):
+    # the query and sort the planner sees in an aggregation pipeline: a
+    # leading $match stage, and the $sort stage which follows it.
+    stages = list(pipeline)
+    spec = sort = None
+    if stages and isinstance(stages[0].get("$match"), dict):
+        spec = stages.pop(0)["$match"]
+    if stages and isinstance(stages[0].get("$sort"), dict):
+        sort = list(stages[0]["$sort"].items())
+    return spec, sort
+
+
+def operator_bounds(schema, operators):
+    """Returns the conditions a stored document must meet for the update
+    `operators` to keep its fields within their schema bounds: 'max' and 'min'
+    for '$inc', 'maxlength' for '$push' and '$addToSet', and 'minlength' for
+    '$pull'. Used to match documents which are updated without checking their
+    etag, since their fields might have changed since they were validated.
+
+    :param schema: the resource schema.
+    :param operators: update operators, as in ``{"$inc": {"count": 1}}``.
+
+    .. versionadded:: 2.2
+    """
+    conditions = []
+    for field, amount in operators.get("$inc", {}).items():
+        rules = schema.get(field, {})
+        if amount > 0 and rules.get("max") is not None:
+            conditions.append({field: {"$not": {"$gt": rules["max"] - amount}}})
+        elif amount < 0 and rules.get("min") is not None:
+            conditions.append({field: {"$not": {"$lt": rules["min"] - amount}}})
+
+    for operator, fields in operators.items():
+        for field, operand in fields.items():
+            rules = schema.get(field, {})
+            current = {"$ifNull": ["$" + field, []]}
+            if operator == "$push" and rules.get("maxlength") is not None:
+                length = {"$add": [{"$size": current}, len(operand["$each"])]}
+                bound = {"$lte": [length, rules["maxlength"]]}
+            elif operator == "$addToSet" and rules.get("maxlength") is not None:
+                added = {"$setDifference": [{"$literal": operand["$each"]}, current]}
+                length = {"$add": [{"$size": current}, {"$size": added}]}
+                bound = {"$lte": [length, rules["maxlength"]]}
+            elif operator == "$pull" and rules.get("minlength") is not None:
+                kept = {
+                    "$filter": {
+                        "input": current,
+                        "cond": {"$not": [{"$in": ["$$this", operand["$in"]]}]},
+                    }
+                }
+                # pulling from a missing field is a no-op.
+                bound = {
+                    "$or": [
+                        {"$eq": [{"$type": "$" + field}, "missing"]},
+                        {"$gte": [{"$size": kept}, rules["minlength"]]},
+                    ]
+                }
+            else:
+                continue
+            conditions.append({"$expr": bound})
+    return conditions
+
+
+def compile_schema_types(schema):
+    """Compile a resource schema into a map of dotted field paths to the
+    type of their values, as far as query casting is concerned ('objectid',
+    'datetime' or 'string'). Fields of any other type, and fields whose type
+    cannot be told for sure, are left out of the map.
+
+    Lists are transparent, so the type of the list items is recorded under
+    the path of the list itself, as MongoDB does when matching arrays. When
+    fixed-length 'items' rules disagree on the type of a path, 'objectid'
+    wins, as it did with the former per-query schema lookup.
+
+    .. versionadded:: 2.2
+    """
+    types = {}
+
+    def add(path, field_type):
+        if path not in types:
+            types[path] = field_type
+        elif types[path] != field_type:
+            types[path] = (
+                "objectid" if "objectid" in (types[path], field_type) else None
+            )
+
+    def walk(rules, path):
+        if not isinstance(rules, dict):
+            return
+        field_type = rules.get("type")
+        if field_type == "list":
+            if "items" in rules:
+                for item in rules.get("items") or []:
+                    walk(item, path)
+            elif "schema" in rules:
+                walk(rules["schema"], path)
+        elif field_type == "dict":
+            walk_fields(rules.get("schema"), path)
+        elif field_type in ("objectid", "datetime", "string"):
+            add(path, field_type)
+        else:
+            add(path, None)
+
+    def walk_fields(schema, prefix):
+        if not isinstance(schema, dict):
+            return
+        for field, rules in schema.items():
+            walk(rules, "%s.%s" % (prefix, field) if prefix else field)
+
+    walk_fields(schema, "")
+    return dict((path, t) for path, t in types.items() if t is not None)
+
+
+def read_preference(value):
+    """Returns the PyMongo read preference described by `value`, which is
+    either a mode name ('secondaryPreferred') or a dict with a 'mode' key and
+    optional 'max_staleness_seconds' and 'tag_sets' keys. Raises ValueError
+    if the value is not valid.
+
+    .. versionadded:: 2.2
+    """
+    if isinstance(value, str):
+        value = {"mode": value}
+    if not isinstance(value, dict) or value.get("mode") not in READ_PREFERENCE_MODES:
+        raise ValueError(
+            "read preference mode must be one of %s (%r)"
+            % (", ".join(READ_PREFERENCE_MODES), value)
+        )
+    unknown = set(value) - set(["mode", "max_staleness_seconds", "tag_sets"])
+    if unknown:
+        raise ValueError("unknown read preference options %s" % sorted(unknown))
+
+    mode = READ_PREFERENCE_MODES[value["mode"]]
+    if mode is read_preferences.Primary:
+        if len(value) > 1:
+            raise ValueError("'primary' read preference takes no options")
+        return mode()
+    try:
+        return mode(
+            tag_sets=value.get("tag_sets"),
+            max_staleness=value.get("max_staleness_seconds", -1),
+        )
+    except (TypeError, pymongo.errors.ConfigurationError) as e:
+        raise ValueError(str(e))
+
+
+def method_read_preference(value, method):
+    """Returns the PyMongo read preference which applies to a data layer
+    read `method` ('find', 'find_one' or 'aggregate'), out of a
+    'mongo_read_preference' setting, or None if the client default applies.
+
+    The setting is either a single read preference (see
+    :func:`read_preference`) or a dict mapping read methods to their own read
+    preference.
+
+    .. versionadded:: 2.2
+    """
+    if isinstance(value, dict) and "mode" not in value:
+        unknown = set(value) - set(READ_METHODS)
+        if unknown:
+            raise ValueError("unknown read methods %s" % sorted(unknown))
+        value = value.get(method)
+    return read_preference(value) if value else None
+
+
+def operation_max_time_ms(value, operation):
+    """Returns the maxTimeMS budget of an `operation` ('find', 'count',
+    'find_one' or 'aggregate') out of a 'mongo_max_time_ms' setting, which is
+    either a number of milliseconds, or a dict mapping operations to their own
+    budget. Returns None if the operation has no budget. Raises ValueError if
+    the setting is not valid.
+
+    .. versionadded:: 2.2
+    """
+    if isinstance(value, dict):
+        unknown = set(value) - set(TIMED_OPERATIONS)
+        if unknown:
+            raise ValueError("unknown operations %s" % sorted(unknown))
+        value = value.get(operation)
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError("budget must be a positive integer (%r)" % (value,))
+    return value
+
+
+def request_max_time_ms(value):
+    """Returns the time budget of a whole request out of a 'mongo_max_time_ms'
+    setting: the setting itself, or the largest of the operation budgets.
+
+    .. versionadded:: 2.2
+    """
+    budgets = [operation_max_time_ms(value, op) for op in TIMED_OPERATIONS]
+    budgets = [budget for budget in budgets if budget]
+    return max(budgets) if budgets else None
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+    eve.io.mongo.normalizer
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Rewrites MongoDB queries into an equivalent, flatter form. Queries built
+    by repeated calls to `combine_queries` (sub-resource lookups, datasource
+    filters, soft delete, auth_field) end up as nested `$and` chains, which
+    are harder on the query planner and produce different shapes for the same
+    logical query. Likewise, `$or` chains of equalities on a single field are
+    rewritten to `$in`, which is served by a single index range scan.
+
+    :copyright: (c) 2017 by Nicola Iarocci.
+    :license: BSD, see LICENSE for more details.
+"""
+
+# operators which do not depend on sibling operators, so conditions on the
+# same field can be merged into a single operator document. Operators with
+# modifiers ($regex/$options, $near/$maxDistance, etc.) are left alone.
+MERGEABLE_OPERATORS = set(
+    ["$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin"]
+    + ["$exists", "$type", "$all", "$size", "$mod", "$elemMatch", "$not"]
+)
+
+LOGICAL_OPERATORS = set(["$or", "$nor"])
+
+
+def normalize_query(query):
+    """Returns a query equivalent to `query`, with nested `$and` clauses
+    collapsed and their predicates merged into the top level document when
+    they do not conflict. Predicates which cannot be merged (a second
+    equality on the same field, a second `$or`, etc.) are kept in a single
+    `$and` list. `$or` and `$nor` clauses are normalized as well, and `$or`
+    clauses which only test the same field for equality become `$in`.
+
+    Example::
+
+        normalize_query({'$and': [{'$and': [{'a': 1}, {'b': {'$gt': 1}}]},
+                                  {'b': {'$lt': 5}}]})
+        {'a': 1, 'b': {'$gt': 1, '$lt': 5}}
+
+        normalize_query({'$or': [{'a': 1}, {'a': {'$in': [2, 3]}}]})
+        {'a': {'$in': [1, 2, 3]}}
+
+    .. versionadded:: 2.2
+    """
+    if not isinstance(query, dict):
+        return query
+
+    clauses = _flatten([query])
+    if clauses is None:
+        # malformed $and, leave it to the database to complain.
+        return query
+
+    normalized = {}
+    remaining = []
+    for clause in clauses:
+        leftover = {}
+        for field, value in clause.items():
+            if field in LOGICAL_OPERATORS and isinstance(value, list):
+                value = [normalize_query(v) for v in value]
+                if field == "$or":
+                    field, value = _or_to_in(value) or (field, value)
+            if field not in normalized:
+                normalized[field] = value
+            elif normalized[field] == value:
+                continue
+            elif _mergeable(normalized[field], value):
+                normalized[field] = dict(normalized[field], **value)
+            else:
+                leftover[field] = value
+        if leftover:
+            remaining.append(leftover)
+
+    if remaining:
+        normalized["$and"] = remaining
+    return normalized
+
+
+def _flatten(clauses):
+    """Returns the list of the conditions of an implicit `$and` of
+    `clauses`, with nested `$and` lists expanded, or None if one of them is
+    not a valid `$and`.
+    """
+    flat = []
+    for clause in clauses:
+        if not isinstance(clause, dict):
+            return None
+        conditions = dict((k, v) for k, v in clause.items() if k != "$and")
+        if conditions:
+            flat.append(conditions)
+        if "$and" in clause:
+            nested = clause["$and"]
+            if not isinstance(nested, list) or not nested:
+                return None
+            nested = _flatten(nested)
+            if nested is None:
+                return None
+            flat.extend(nested)
+    return flat
+
+
+def _or_to_in(clauses):
+    """Returns a `(field, {'$in': values})` condition equivalent to the
+    `$or` of `clauses`, or None if they are not all equalities (plain values,
+    `$eq` or `$in`) on the same field.
+    """
+    if len(clauses) < 2:
+        return None
+    field = None
+    values = []
+    for clause in clauses:
+        if not isinstance(clause, dict) or len(clause) != 1:
+            return None
+        (name, value), = clause.items()
+        if name.startswith("$") or field not in (None, name):
+            return None
+        field = name
+        if not isinstance(value, dict):
+            values.append(value)
+        elif list(value) == ["$eq"]:
+            values.append(value["$eq"])
+        elif list(value) == ["$in"] and isinstance(value["$in"], list):
+            values.extend(value["$in"])
+        else:
+            return None
+
+    unique = []
+    for value in values:
+        # 1 == True in Python, not in MongoDB.
+        if not any(type(u) is type(value) and u == value for u in unique):
+            unique.append(value)
+    return field, {"$in": unique}
+
+
+def _is_operator_document(value):
+    return (
+        isinstance(value, dict)
+        and len(value) > 0
+        and all(k.startswith("$") for k in value)
+    )
+
+
+def _mergeable(a, b):
+    return (
+        _is_operator_document(a)
+        and _is_operator_document(b)
+        and set(a) <= MERGEABLE_OPERATORS
+        and set(b) <= MERGEABLE_OPERATORS
+        and not set(a) & set(b)
+    )
@@ -21,8 +21,11 @@ from bson import ObjectId  # noqa
 def parse(expression):
     """Given a python-like conditional statement, returns the equivalent
     mongo-like query expression. Conditional and boolean operators (==, <=, >=,
-    !=, >, <) along with a couple function calls (ObjectId(), datetime()) are
-    supported.
+    !=, >, <, in, not in, is None, is not None) along with a couple function
+    calls (ObjectId(), datetime()) are supported.
+
+    .. versionchanged:: 2.2
+       Support for 'in', 'not in', 'is None' and 'is not None'.
     """
     v = MongoVisitor()
     try:
@@ -43,8 +46,12 @@ class MongoVisitor(ast.NodeVisitor):
     statements are supported, however nested, combined with most common compare
     and boolean operators (And and Or).
 
-    Supported compare operators: ==, >, <, !=, >=, <=
+    Supported compare operators: ==, >, <, !=, >=, <=, in, not in, is, is not
     Supported boolean operators: And, Or
+
+    .. versionchanged:: 2.2
+       'in' and 'not in' (with list or tuple values) are mapped to '$in' and
+       '$nin'. 'is None' and 'is not None' are supported.
     """
 
     op_mapper = {
@@ -54,6 +61,10 @@ class MongoVisitor(ast.NodeVisitor):
         ast.Lt: "$lt",
         ast.LtE: "$lte",
         ast.NotEq: "$ne",
+        ast.In: "$in",
+        ast.NotIn: "$nin",
+        ast.Is: "",
+        ast.IsNot: "$ne",
         ast.Or: "$or",
         ast.And: "$and",
     }
@@ -95,6 +106,13 @@ class MongoVisitor(ast.NodeVisitor):
             comparator = node.comparators[0]
             self.visit(comparator)
 
+        if isinstance(node.ops[0], (ast.In, ast.NotIn)):
+            if not isinstance(comparator, (ast.List, ast.Tuple)):
+                raise ParseError("'in' and 'not in' only support lists of values")
+        elif isinstance(node.ops[0], (ast.Is, ast.IsNot)):
+            if self.current_value is not None:
+                raise ParseError("'is' and 'is not' only support None")
+
         if operator != "":
             value = {operator: self.current_value}
         else:
@@ -137,6 +155,16 @@ class MongoVisitor(ast.NodeVisitor):
                 except Exception:
                     pass
 
+    def visit_List(self, node):
+        """Lists (and tuples) handler, used by 'in' and 'not in'."""
+        values = []
+        for element in node.elts:
+            self.visit(element)
+            values.append(self.current_value)
+        self.current_value = values
+
+    visit_Tuple = visit_List
+
     def visit_Attribute(self, node):
         """Attribute handler ('Contact.Id')."""
         self.visit(node.value)
@@ -153,3 +181,7 @@ class MongoVisitor(ast.NodeVisitor):
     def visit_Str(self, node):
         """Strings handler."""
         self.current_value = node.s
+
+    def visit_NameConstant(self, node):
+        """None, True and False handler."""
+        self.current_value = node.value
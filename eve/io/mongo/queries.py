@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+"""
+    eve.io.mongo.queries
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Named queries: MongoDB queries declared in the resource settings, with
+    typed parameters, which clients invoke by name (?query=name&param=value)
+    instead of sending the whole `where` clause with every request.
+
+    :copyright: (c) 2017 by Nicola Iarocci.
+    :license: BSD, see LICENSE for more details.
+"""
+from copy import deepcopy
+
+from bson import ObjectId
+
+from eve.io.mongo.indexes import filter_is_indexed
+from eve.utils import str_to_date
+
+PARAMETER_RULES = set(["type", "items", "default", "allowed"])
+
+
+def _boolean(value):
+    if value.lower() in ("1", "true"):
+        return True
+    if value.lower() in ("0", "false"):
+        return False
+    raise ValueError(value)
+
+
+def _number(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+# converters from query string values to the supported parameter types.
+CONVERTERS = {
+    "string": str,
+    "integer": int,
+    "float": float,
+    "number": _number,
+    "boolean": _boolean,
+    "datetime": str_to_date,
+    "objectid": ObjectId,
+}
+
+
+class NamedQuery():
+    """A compiled named query. The query is validated and sanitized once,
+    and the positions of its '$parameter' placeholders are recorded, so that
+    serving a request only takes the conversion of the parameters and their
+    substitution in a copy of the query.
+
+    :param name: the query name.
+    :param definition: the query definition, a dict with the 'query' and
+                       the 'params' it accepts.
+    :param operators: the query operators which are allowed in the query.
+    :param blacklist: the query operators which are not allowed.
+    :param reserved: the names of the query arguments which parameters can't
+                     be named after, such as 'where' or 'sort'.
+
+    Raises ValueError if the definition is not valid.
+
+    .. versionadded:: 2.2
+    """
+
+    def __init__(self, name, definition, operators, blacklist=(), reserved=()):
+        if not isinstance(definition, dict) or not isinstance(
+            definition.get("query"), dict
+        ):
+            raise ValueError("'%s' must be a dict with a 'query' dict" % name)
+        unknown = set(definition) - set(["query", "params"])
+        if unknown:
+            raise ValueError("'%s': unknown keys %s" % (name, sorted(unknown)))
+
+        self.name = name
+        self.query = definition["query"]
+        self.params = definition.get("params") or {}
+        if not isinstance(self.params, dict):
+            raise ValueError("'%s': 'params' must be a dict" % name)
+        for param, rules in self.params.items():
+            if param in reserved:
+                raise ValueError(
+                    "'%s': parameter '%s' collides with a query argument"
+                    % (name, param)
+                )
+            self._check_parameter(param, rules)
+
+        self.placeholders = {}
+        used = set()
+        self._compile(self.query, self.placeholders, used, operators, blacklist)
+        unused = set(self.params) - used
+        if unused:
+            raise ValueError(
+                "'%s': parameters %s are not used in the query"
+                % (name, sorted(unused))
+            )
+
+    def render(self, args):
+        """Returns the query, with placeholders replaced by the parameter
+        values found in `args` (the request arguments). Raises ValueError if
+        a parameter is missing or not valid.
+        """
+        values = {}
+        for param, rules in self.params.items():
+            values[param] = self._value(param, rules, args)
+        return self._fill(self.query, self.placeholders, values)
+
+    def is_indexed(self, indexes):
+        """Returns True if the query can be served by one of `indexes`, a list
+        of index key lists.
+        """
+        return filter_is_indexed(self.query, indexes)
+
+    def _check_parameter(self, param, rules):
+        types = sorted(CONVERTERS) + ["list"]
+        if not isinstance(rules, dict) or rules.get("type") not in types:
+            raise ValueError(
+                "'%s': parameter '%s' must have a type among %s"
+                % (self.name, param, ", ".join(types))
+            )
+        unknown = set(rules) - PARAMETER_RULES
+        if unknown:
+            raise ValueError(
+                "'%s': parameter '%s' has unknown rules %s"
+                % (self.name, param, sorted(unknown))
+            )
+        if rules.get("items", "string") not in CONVERTERS:
+            raise ValueError(
+                "'%s': parameter '%s' has an unknown items type" % (self.name, param)
+            )
+
+    def _compile(self, node, placeholders, used, operators, blacklist):
+        items = node.items() if isinstance(node, dict) else enumerate(node)
+        for key, value in items:
+            if isinstance(key, str) and key.startswith("$"):
+                if key not in operators or key in blacklist:
+                    raise ValueError(
+                        "'%s': operator %s is not allowed" % (self.name, key)
+                    )
+            if isinstance(value, (dict, list)):
+                nested = {}
+                self._compile(value, nested, used, operators, blacklist)
+                if nested:
+                    placeholders[key] = nested
+            elif (
+                isinstance(value, str)
+                and value.startswith("$")
+                and value[1:] in self.params
+            ):
+                placeholders[key] = value[1:]
+                used.add(value[1:])
+
+    def _fill(self, node, placeholders, values):
+        # the query is copied as the data layer updates it in place.
+        if isinstance(node, dict):
+            filled, keys = dict(node), list(node)
+        else:
+            filled, keys = list(node), range(len(node))
+        for key in keys:
+            placeholder = placeholders.get(key)
+            if isinstance(placeholder, str):
+                filled[key] = values[placeholder]
+            elif isinstance(filled[key], (dict, list)):
+                filled[key] = self._fill(filled[key], placeholder or {}, values)
+        return filled
+
+    def _value(self, param, rules, args):
+        value = args.get(param) if args else None
+        if value is None:
+            if "default" in rules:
+                return deepcopy(rules["default"])
+            raise ValueError("Missing query parameter '%s'." % param)
+
+        try:
+            if rules["type"] == "list":
+                convert = CONVERTERS[rules.get("items", "string")]
+                value = [convert(v) for v in value.split(",")]
+            else:
+                value = CONVERTERS[rules["type"]](value)
+        except Exception:
+            raise ValueError(
+                "Query parameter '%s' must be of %s type." % (param, rules["type"])
+            )
+
+        allowed = rules.get("allowed")
+        if allowed is not None:
+            for v in value if isinstance(value, list) else [value]:
+                if v not in allowed:
+                    raise ValueError(
+                        "Unallowed value '%s' for query parameter '%s'." % (v, param)
+                    )
+        return value
+
+
+def compile_named_queries(definitions, operators, blacklist=(), reserved=()):
+    """Compiles the 'named_queries' resource setting into a dict of
+    :class:`NamedQuery` instances. Raises ValueError if the setting is not
+    valid.
+
+    .. versionadded:: 2.2
+    """
+    if not isinstance(definitions, dict):
+        raise ValueError("must be a dict of query definitions")
+    return dict(
+        (name, NamedQuery(name, definition, operators, blacklist, reserved))
+        for name, definition in definitions.items()
+    )
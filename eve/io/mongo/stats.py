@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""
+    eve.io.mongo.stats
+    ~~~~~~~~~~~~~~~~~~
+
+    Query shape statistics for the MongoDB data layer, and index suggestions
+    based on them.
+
+    :copyright: (c) 2017 by Nicola Iarocci.
+    :license: BSD, see LICENSE for more details.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import simplejson as json
+from pymongo.cursor import Cursor
+
+EQUALITY_OPERATORS = set(["$eq", "$in"])
+RANGE_OPERATORS = set(["$gt", "$gte", "$lt", "$lte", "$regex"])
+
+
+def query_shape(query):
+    """Returns the shape of a query: the same structure, with field names and
+    operators preserved and values stripped (replaced by 1). Arrays of values
+    are stripped as a whole, so `$in` queries of different length share the
+    same shape.
+
+    .. versionadded:: 2.2
+    """
+    if isinstance(query, dict):
+        return dict((k, query_shape(v)) for k, v in query.items())
+    if isinstance(query, (list, tuple)) and any(isinstance(v, dict) for v in query):
+        return [query_shape(v) for v in query]
+    return 1
+
+
+def sort_shape(sort):
+    """Returns the sort as a list of [field, direction] pairs.
+
+    .. versionadded:: 2.2
+    """
+    return [[field, direction] for field, direction in sort or []]
+
+
+def suggest_index(shape, sort=None):
+    """Suggests the keys of an index able to serve a query shape, following
+    the Equality, Sort, Range rule: fields matched by equality come first,
+    then the sort keys, then fields matched by range. Returns None when no
+    index can be suggested.
+
+    :param shape: a query shape, as returned by :func:`query_shape`. An
+                  aggregation pipeline shape is also accepted, in which case
+                  the leading `$match` (and `$sort`) stages are used.
+    :param sort: the sort shape, as returned by :func:`sort_shape`.
+
+    .. versionadded:: 2.2
+    """
+    if isinstance(shape, list):
+        stages = [s for s in shape if isinstance(s, dict)]
+        shape = stages[0].get("$match", {}) if stages else {}
+        if len(stages) > 1 and "$sort" in stages[1] and not sort:
+            sort = [[field, 1] for field in stages[1]["$sort"]]
+
+    equalities, ranges = [], []
+    _classify(shape, equalities, ranges)
+
+    sort_fields = [field for field, _ in sort or []]
+    keys = [[field, 1] for field in equalities if field not in sort_fields]
+    keys += [[field, direction] for field, direction in sort or []]
+    keys += [
+        [field, 1] for field in ranges if field not in sort_fields + equalities
+    ]
+    return keys or None
+
+
+def index_name(keys):
+    """Returns the default MongoDB name of an index.
+
+    .. versionadded:: 2.2
+    """
+    return "_".join("%s_%s" % (field, direction) for field, direction in keys)
+
+
+def _classify(shape, equalities, ranges):
+    for field, value in shape.items():
+        if field == "$and":
+            for clause in value:
+                _classify(clause, equalities, ranges)
+        elif field.startswith("$"):
+            continue
+        elif not isinstance(value, dict):
+            _add(equalities, field)
+        else:
+            operators = set(k for k in value if k.startswith("$"))
+            if not operators or operators <= EQUALITY_OPERATORS:
+                _add(equalities, field)
+            elif operators & RANGE_OPERATORS:
+                _add(ranges, field)
+
+
+def _add(fields, field):
+    if field not in fields:
+        fields.append(field)
+
+
+class QueryStats():
+    """Bounded, thread-safe, in-process store of query shape statistics.
+    Keeps count, total and max duration, and a latency histogram for each
+    shape. When `max_shapes` is reached, the least recently seen shape is
+    evicted.
+
+    .. versionadded:: 2.2
+    """
+
+    # upper bounds of the latency histogram buckets, in milliseconds. The
+    # last bucket collects all the slower queries.
+    buckets = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, max_shapes=1000):
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._shapes = OrderedDict()
+
+    def record(self, resource, method, shape, sort, elapsed_ms):
+        """Records the duration of a query.
+
+        :param resource: resource name.
+        :param method: data layer method ('find', 'find_one', 'aggregate').
+        :param shape: the query shape.
+        :param sort: the sort shape.
+        :param elapsed_ms: duration, in milliseconds.
+        """
+        key = (
+            resource,
+            method,
+            json.dumps(shape, sort_keys=True),
+            json.dumps(sort),
+        )
+        bucket = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if elapsed_ms <= bound:
+                bucket = i
+                break
+
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                if len(self._shapes) >= self.max_shapes:
+                    self._shapes.popitem(last=False)
+                entry = self._shapes[key] = {
+                    "resource": resource,
+                    "method": method,
+                    "filter": shape,
+                    "sort": sort,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "histogram": [0] * (len(self.buckets) + 1),
+                }
+            else:
+                self._shapes.move_to_end(key)
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["histogram"][bucket] += 1
+
+    def ranked(self, resource=None):
+        """Returns the statistics of all shapes, or of the shapes of a given
+        resource, ranked by total time.
+        """
+        with self._lock:
+            entries = [
+                dict(entry, histogram=list(entry["histogram"]))
+                for entry in self._shapes.values()
+                if resource is None or entry["resource"] == resource
+            ]
+        entries.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        labels = ["<=%s" % bound for bound in self.buckets]
+        labels.append(">%s" % self.buckets[-1])
+        for entry in entries:
+            entry["avg_ms"] = entry["total_ms"] / entry["count"]
+            entry["histogram"] = OrderedDict(zip(labels, entry["histogram"]))
+        return entries
+
+    def clear(self):
+        """Drops all the recorded statistics."""
+        with self._lock:
+            self._shapes.clear()
+
+
+class TimedCursor(Cursor):
+    """A :class:`pymongo.cursor.Cursor` which keeps track of the time spent
+    fetching documents, and hands it over to the `on_exhausted` callback once
+    all documents have been retrieved.
+
+    .. versionadded:: 2.2
+    """
+
+    def __init__(self, collection, *args, **kwargs):
+        self.on_exhausted = kwargs.pop("on_exhausted", None)
+        self.elapsed = 0.0
+        super().__init__(collection, *args, **kwargs)
+
+    def next(self):
+        started = time.perf_counter()
+        try:
+            document = super().next()
+        except StopIteration:
+            self.elapsed += time.perf_counter() - started
+            if self.on_exhausted:
+                self.on_exhausted(self.elapsed)
+                self.on_exhausted = None
+            raise
+        self.elapsed += time.perf_counter() - started
+        return document
+
+    __next__ = next
@@ -14,15 +14,18 @@
 from bson import ObjectId, decimal128
 from bson.dbref import DBRef
 from flask import current_app as app
+from flask import g
 from werkzeug.datastructures import FileStorage
 
 from eve.auth import auth_field_and_value
 from eve.io.mongo.geo import (Feature, FeatureCollection, GeometryCollection,
                               LineString, MultiLineString, MultiPoint,
                               MultiPolygon, Point, Polygon)
+from eve.io.mongo.mongo import soft_delete_filter
 from eve.utils import config
 from eve.validation import Validator
-from eve.versioning import get_data_version_relation_document
+from eve.versioning import (get_data_version_relation_document,
+                            versioned_id_field)
 
 
 class Validator(Validator):
@@ -52,6 +55,41 @@ class Validator(Validator):
        which allows for insertion of 'default' values in POST requests.
     """
 
+    def prepare_bulk(self, documents):
+        """Prepares the validation of the documents of a bulk payload, which
+        are then validated one at a time. Lookups are shared by the validation
+        of all the documents.
+
+        .. versionadded:: 2.2
+        """
+        self._config["bulk"] = BulkLookups(documents)
+        # forget the relations looked up for previous payloads, so that the
+        # cache does not grow while streamed payloads are ingested.
+        g.pop("data_relations", None)
+
+    @property
+    def bulk(self):
+        return self._config.get("bulk", None)
+
+    def validate(self, document, schema=None, update=False, normalize=True):
+        """Normalizes and validates `document`. See
+        :meth:`eve.validation.Validator.validate`.
+
+        When validating a bulk payload, the unique values of the document
+        are only taken into account for the following documents if the
+        document is valid.
+
+        .. versionadded:: 2.2
+        """
+        bulk = self.bulk if not self.is_child else None
+        valid = False
+        try:
+            valid = super().validate(document, schema, update, normalize)
+            return valid
+        finally:
+            if bulk is not None:
+                bulk.validated(valid)
+
     def _validate_versioned(self, unique, field, value):
         """{'type': 'boolean'}"""
         pass
@@ -80,6 +118,11 @@ class Validator(Validator):
     def _is_value_unique(self, unique, field, value, query):
         """Validates that a field value is unique.
 
+        .. versionchanged:: 2.2
+           Support for 'mongo_indexed_soft_delete'.
+           When validating a bulk payload, the values of top-level fields are
+           looked up at once, and duplicates within the payload are reported.
+
         .. versionchanged:: 0.6.2
            Exclude soft deleted documents from uniqueness check. Closes #831.
 
@@ -106,7 +149,7 @@ class Validator(Validator):
                     schema = schema[path]
                     field_schema_path.append(path)
 
-            query[".".join(field_schema_path)] = value
+            query = dict(query)
             resource_config = config.DOMAIN[self.resource]
 
             # exclude soft deleted documents if applicable
@@ -119,10 +162,12 @@ class Validator(Validator):
                 # been stored with the same field value while the original
                 # document was in 'deleted' state.
 
-                # we make sure to also include documents which are missing the
-                # DELETED field. This happens when soft deletes are enabled on
-                # an a resource with existing documents.
-                query[config.DELETED] = {"$ne": True}
+                # unless 'mongo_indexed_soft_delete' is enabled (in which
+                # case they have been backfilled), we make sure to also
+                # include documents which are missing the DELETED field. This
+                # happens when soft deletes are enabled on an a resource with
+                # existing documents.
+                query.update(soft_delete_filter(self.resource))
 
             # exclude current document
             if self.document_id:
@@ -135,7 +180,16 @@ class Validator(Validator):
             # are still operating within eve's mongo namespace anyway.
 
             datasource, _, _, _ = app.data.datasource(self.resource)
-            if app.data.driver.db[datasource].find_one(query):
+            collection = app.data.driver.db[datasource]
+            path = ".".join(field_schema_path)
+
+            duplicate = None
+            if self.bulk is not None and not self.document_path:
+                duplicate = self.bulk.unique_conflict(collection, path, query, value)
+            if duplicate is None:
+                query[path] = value
+                duplicate = collection.find_one(query)
+            if duplicate:
                 self._error(field, "value '%s' is not unique" % value)
 
     def _validate_data_relation(self, data_relation, field, value):
@@ -168,7 +222,20 @@ class Validator(Validator):
                         % data_relation["resource"],
                     )
                 else:
-                    search = get_data_version_relation_document(data_relation, value)
+                    search = None
+                    if value_field == resource_def["id_field"]:
+                        search = self._data_relation_exists(
+                            field,
+                            data_relation["resource"] + config.VERSIONS,
+                            (versioned_id_field(resource_def), version_field),
+                            (value_field, version_field),
+                            (value[value_field], value[version_field]),
+                        )
+                    if not search:
+                        # unversioned value fields and late versioning.
+                        search = get_data_version_relation_document(
+                            data_relation, value
+                        )
 
                     if not search:
                         self._error(
@@ -194,10 +261,10 @@ class Validator(Validator):
 
             data_resource = data_relation["resource"]
             for item in value:
-                query = {
-                    data_relation["field"]: item.id if isinstance(item, DBRef) else item
-                }
-                if not app.data.find_one(data_resource, None, **query):
+                reference = (item.id if isinstance(item, DBRef) else item,)
+                if not self._data_relation_exists(
+                    field, data_resource, (data_relation["field"],), None, reference
+                ):
                     self._error(
                         field,
                         "value '%s' must exist in resource"
@@ -209,6 +276,46 @@ class Validator(Validator):
                         ),
                     )
 
+    def _data_relation_exists(self, field, resource, fields, keys, reference):
+        """Returns True if `reference`, a tuple of values, matches the
+        `fields` of a document of `resource`. Results are cached for the
+        duration of the request. When a bulk payload is validated, the
+        references stored in `field` by all its documents are looked up with a
+        single query the first time one of them is checked.
+
+        :param field: the field holding the reference.
+        :param resource: the resource the reference must exist in.
+        :param fields: the fields of `resource` matched by the reference.
+        :param keys: the keys of the reference values in a versioned
+                     reference, None for plain (or lists of) references.
+        :param reference: the tuple of values to be looked up.
+
+        .. versionadded:: 2.2
+        """
+        if _reference_key(reference) is None:
+            return bool(app.data.find_existing(resource, fields, [reference]))
+
+        cache = g.setdefault("data_relations", {})
+        context = (resource, fields)
+        if (context, _reference_key(reference)) not in cache:
+            references = [reference]
+            if self.bulk is not None and not self.document_path:
+                references.extend(self.bulk.references(field, keys))
+            references = {
+                _reference_key(r): r
+                for r in references
+                if _reference_key(r) is not None
+                and (context, _reference_key(r)) not in cache
+            }
+            for key in references:
+                cache[(context, key)] = False
+            existing = app.data.find_existing(
+                resource, fields, list(references.values())
+            )
+            for r in existing:
+                cache[(context, _reference_key(r))] = True
+        return cache[(context, _reference_key(reference))]
+
     def _validate_type_objectid(self, value):
         if ObjectId.is_valid(value):
             return True
@@ -295,3 +402,119 @@ class Validator(Validator):
             return True
         except TypeError:
             pass
+
+
+class BulkLookups():
+    """Database lookups shared by the validation of the documents of a bulk
+    payload. Rather than checking the values of a document at a time, the
+    values of all the documents are looked up with a single `$in` query the
+    first time one of them is validated.
+
+    :param documents: the (parsed) documents of the payload.
+
+    .. versionadded:: 2.2
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.unique_values = {}
+        self.seen = {}
+        self.pending = []
+
+    def unique_conflict(self, collection, field, query, value):
+        """Returns True if `value` is already stored in `collection` or has
+        been used by a previous valid document of the payload, False if it is
+        not.
+        Returns None if the value has not been looked up (for example
+        because it has been changed by normalization), in which case it must
+        be checked on its own.
+
+        :param collection: the collection the value must be unique in.
+        :param field: the (top-level) field name.
+        :param query: the query restricting the documents to be considered.
+        :param value: the value of the field in the validated document.
+        """
+        if value is None or not _is_hashable(value):
+            return None
+        context = (field, repr(sorted(query.items())))
+
+        if _value_key(value) in self.seen.get(context, ()):
+            return True
+        # only used by the following documents once this one is valid.
+        self.pending.append((context, _value_key(value)))
+
+        if context not in self.unique_values:
+            candidates = {}
+            for document in self.documents:
+                candidate = document.get(field) if isinstance(document, dict) else None
+                if candidate is not None and _is_hashable(candidate):
+                    candidates[_value_key(candidate)] = candidate
+            stored = set()
+            if candidates:
+                lookup = dict(query, **{field: {"$in": list(candidates.values())}})
+                for document in collection.find(lookup, projection={field: 1}):
+                    values = document.get(field)
+                    if not isinstance(values, list):
+                        values = [values]
+                    for stored_value in values:
+                        if _is_hashable(stored_value):
+                            stored.add(_value_key(stored_value))
+            self.unique_values[context] = (set(candidates), stored)
+
+        candidates, stored = self.unique_values[context]
+        if _value_key(value) not in candidates:
+            return None
+        return _value_key(value) in stored
+
+    def validated(self, valid):
+        """Invoked once a document of the payload has been validated. The
+        unique values of a valid document conflict with those of the
+        following documents, while the values of an invalid document,
+        which is not going to be inserted, are forgotten.
+
+        :param valid: whether the document is valid.
+        """
+        if valid:
+            for context, key in self.pending:
+                self.seen.setdefault(context, set()).add(key)
+        self.pending = []
+
+    def references(self, field, keys=None):
+        """Returns the data relation references stored in `field` by the
+        documents of the payload, as tuples of values.
+
+        :param field: the (top-level) field name.
+        :param keys: the keys of the values of versioned references, which
+                     are dicts. None for plain (or lists of) references.
+        """
+        references = []
+        for document in self.documents:
+            value = document.get(field) if isinstance(document, dict) else None
+            if keys:
+                if isinstance(value, dict) and all(key in value for key in keys):
+                    references.append(tuple(value[key] for key in keys))
+                continue
+            for item in value if isinstance(value, list) else [value]:
+                if item is not None:
+                    references.append((item.id if isinstance(item, DBRef) else item,))
+        return references
+
+
+def _is_hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _reference_key(reference):
+    if not _is_hashable(reference):
+        return None
+    return tuple(_value_key(value) for value in reference)
+
+
+def _value_key(value):
+    # MongoDB does not match booleans against numbers, while Python considers
+    # True == 1.
+    return (isinstance(value, bool), value)
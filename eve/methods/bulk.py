@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+
+"""
+    eve.methods.bulk
+    ~~~~~~~~~~~~~~~~
+
+    This module implements the bulk PATCH, PUT and DELETE methods, supported
+    by the bulk write endpoints of resources.
+
+    :copyright: (c) 2017 by Nicola Iarocci.
+    :license: BSD, see LICENSE for more details.
+"""
+import copy
+
+from cerberus.validator import DocumentError
+from flask import abort
+from flask import current_app as app
+from flask import request
+from werkzeug import exceptions
+
+from eve.auth import requires_auth
+from eve.methods.common import (date_created, last_updated, oplog_push, parse,
+                                payload, pre_event, ratelimit,
+                                resolve_document_etag,
+                                resolve_sub_resource_path,
+                                resolve_user_restricted_access,
+                                store_media_files, utcnow)
+from eve.methods.patch import resolve_nested_documents
+from eve.utils import config, debug_error_message, document_etag
+from eve.versioning import (insert_versioning_documents, late_versioning_catch,
+                            resolve_document_version, versioned_id_field)
+
+# the key of the changes of the PATCH and PUT operations.
+CHANGES = "changes"
+
+
+@ratelimit()
+@requires_auth("item")
+@pre_event
+def bulk_write(resource, payl=None):
+    """Performs a batch of PATCH, PUT or DELETE operations, depending on the
+    request method, on the documents of a resource. The payload is a list of
+    operations, each one holding the id of a document, its etag and, unless
+    documents are being deleted, the changes to be applied. Operations are
+    validated and prepared like single item requests would, then written
+    with a single bulk write, each one conditioned on the etag of its
+    document. Versions and oplog entries are inserted in batches as well.
+
+    Operations are independent: the response reports the status of each one
+    of them, and a failed operation does not prevent the others from being
+    performed.
+
+    :param resource: name of the resource involved.
+    :param payl: alternative payload.
+
+    .. versionadded:: 2.2
+    """
+    method = request.method
+    resource_def = config.DOMAIN[resource]
+    id_field = resource_def["id_field"]
+
+    if payl is None:
+        payl = payload()
+
+    if isinstance(payl, dict):
+        payl = [payl]
+
+    if not payl or not isinstance(payl, list):
+        abort(400, description=debug_error_message("Empty bulk operation"))
+
+    results = [None] * len(payl)
+    ids = {}
+    seen = set()
+    for index, operation in enumerate(payl):
+        try:
+            id_ = parse({id_field: operation[id_field]}, resource)[id_field]
+        except (KeyError, TypeError):
+            results[index] = _failure(400, "Missing '%s'" % id_field)
+            continue
+        if id_ in seen:
+            results[index] = _failure(400, "Duplicate operation on a document")
+            continue
+        seen.add(id_)
+        ids[index] = id_
+
+    originals = {}
+    if ids:
+        for document in app.data.find_list_of_ids(resource, list(ids.values())):
+            originals[document[id_field]] = document
+
+    validator = app.validator(
+        resource_def["schema"],
+        resource=resource,
+        allow_unknown=resource_def["allow_unknown"],
+    )
+
+    date_utc = utcnow()
+    prepared = []
+    for index, id_ in ids.items():
+        original = originals.get(id_)
+        if original is not None:
+            if resource_def["soft_delete"] and original.get(config.DELETED) is True:
+                # soft deleted documents are not found.
+                original = None
+            else:
+                original[config.LAST_UPDATED] = last_updated(original)
+                original[config.DATE_CREATED] = date_created(original)
+        try:
+            failure = _precondition_failure(
+                resource, payl[index].get(config.ETAG), original
+            )
+            if failure:
+                results[index] = failure
+                continue
+
+            operation, document, issues = _PREPARE[method](
+                resource, payl[index].get(CHANGES, {}), original, validator, date_utc
+            )
+        except DocumentError as e:
+            issues = {"validator exception": str(e)}
+        except exceptions.HTTPException as e:
+            # callbacks can abort single operations.
+            results[index] = _failure(e.code, e.description)
+            continue
+        except Exception as e:
+            # consider all other exceptions as Bad Requests
+            app.logger.exception(e)
+            results[index] = _failure(
+                400, debug_error_message("An exception occurred: %s" % e)
+            )
+            continue
+
+        if issues:
+            results[index] = {config.STATUS: config.STATUS_ERR, config.ISSUES: issues}
+        else:
+            prepared.append((index, operation, document))
+
+    changed, errors = (
+        app.data.bulk_write(resource, [operation for _, operation, _ in prepared])
+        if prepared
+        else (set(), {})
+    )
+
+    performed = []
+    for position, (index, operation, document) in enumerate(prepared):
+        if position in changed:
+            results[index] = _failure(412, "Client and server etags don't match")
+        elif position in errors:
+            results[index] = _write_failure(*errors[position])
+        else:
+            results[index] = result = {config.STATUS: config.STATUS_OK}
+            result[id_field] = operation[1]
+            if operation[0] != "remove":
+                result[config.LAST_UPDATED] = document[config.LAST_UPDATED]
+                if config.ETAG in document:
+                    result[config.ETAG] = document[config.ETAG]
+            performed.append((operation, document))
+
+    if performed:
+        _COMPLETE[method](resource, performed)
+
+    response = {config.STATUS: config.STATUS_OK, config.ITEMS: results}
+    status = 200
+    failures = [r for r in results if r[config.STATUS] != config.STATUS_OK]
+    if failures:
+        codes = set(
+            r[config.ERROR]["code"]
+            if config.ERROR in r
+            else config.VALIDATION_ERROR_STATUS
+            for r in failures
+        )
+        code = codes.pop() if len(codes) == 1 else config.VALIDATION_ERROR_STATUS
+        if len(failures) == len(results):
+            status = code
+        response[config.STATUS] = config.STATUS_ERR
+        response[config.ERROR] = {
+            "code": code,
+            "message": "Bulk %s failure: %d operation(s) failed"
+            % (method, len(failures)),
+        }
+
+    return response, None, None, status
+
+
+def _precondition_failure(resource, etag, original):
+    """Returns the failure of an operation whose preconditions are not met,
+    None otherwise. Mirrors the checks performed by
+    :func:`eve.methods.common.get_document` for single items.
+
+    .. versionadded:: 2.2
+    """
+    if original is None:
+        return _failure(404, "Document not found")
+    if not config.IF_MATCH:
+        return None
+    if etag is None:
+        if config.ENFORCE_IF_MATCH:
+            return _failure(
+                428, "To edit a document its etag must be provided with the operation"
+            )
+        return None
+    ignore_fields = config.DOMAIN[resource]["etag_ignore_fields"]
+    if etag != original.get(
+        config.ETAG, document_etag(original, ignore_fields=ignore_fields)
+    ):
+        return _failure(412, "Client and server etags don't match")
+    return None
+
+
+def _prepare_patch(resource, changes, original, validator, date_utc):
+    """Validates the changes of a PATCH operation. Returns the operation to be
+    written, the updated document and the validation issues, if any. See
+    :func:`eve.methods.patch.patch_internal`. Update operators enabled with
+    'patch_operators' are rejected.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = config.DOMAIN[resource]
+    operators = [key for key in changes if key in resource_def["patch_operators"]]
+    if operators:
+        # operators are applied by single PATCH requests only.
+        issue = "update operators are not supported by bulk writes"
+        return None, None, dict((operator, issue) for operator in operators)
+
+    object_id = original[resource_def["id_field"]]
+    updates = parse(changes, resource)
+    if not validator.validate_update(
+        updates, object_id, original, resource_def.get("normalize_on_patch")
+    ):
+        return None, None, validator.errors
+    updates = validator.document
+
+    late_versioning_catch(original, resource)
+    store_media_files(updates, resource, original)
+    resolve_document_version(updates, resource, "PATCH", original)
+    updates[config.LAST_UPDATED] = date_utc
+    if resource_def["soft_delete"] is True:
+        updates[config.DELETED] = False
+
+    updated = copy.deepcopy(original)
+
+    getattr(app, "on_update")(resource, updates, original)
+    getattr(app, "on_update_%s" % resource)(updates, original)
+
+    if resource_def["merge_nested_documents"]:
+        updates = resolve_nested_documents(updates, updated)
+    updated.update(updates)
+    if config.IF_MATCH:
+        resolve_document_etag(updated, resource)
+        updates[config.ETAG] = updated[config.ETAG]
+
+    return ("update", object_id, updates, original), updated, None
+
+
+def _prepare_put(resource, changes, original, validator, date_utc):
+    """Validates the replacement document of a PUT operation. Returns the
+    operation to be written, the new document and the validation issues, if
+    any. See :func:`eve.methods.put.put_internal`.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = config.DOMAIN[resource]
+    id_field = resource_def["id_field"]
+    object_id = original[id_field]
+    document = parse(changes, resource)
+    resolve_sub_resource_path(document, resource)
+    if not validator.validate_replace(document, object_id, original):
+        return None, None, validator.errors
+    document = validator.document
+
+    late_versioning_catch(original, resource)
+    document[config.LAST_UPDATED] = date_utc
+    document[config.DATE_CREATED] = original[config.DATE_CREATED]
+    if resource_def["soft_delete"] is True:
+        document[config.DELETED] = False
+    if id_field not in document:
+        document[id_field] = object_id
+    resolve_user_restricted_access(document, resource)
+    store_media_files(document, resource, original)
+    resolve_document_version(document, resource, "PUT", original)
+
+    getattr(app, "on_replace")(resource, document, original)
+    getattr(app, "on_replace_%s" % resource)(document, original)
+
+    resolve_document_etag(document, resource)
+
+    return ("replace", object_id, document, original), document, None
+
+
+def _prepare_delete(resource, changes, original, validator, date_utc):
+    """Prepares a DELETE operation. Returns the operation to be written and,
+    with soft delete enabled, the document marked as deleted. See
+    :func:`eve.methods.delete.deleteitem_internal`.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = config.DOMAIN[resource]
+    object_id = original[resource_def["id_field"]]
+
+    getattr(app, "on_delete_item")(resource, original)
+    getattr(app, "on_delete_item_%s" % resource)(original)
+
+    if not resource_def["soft_delete"]:
+        return ("remove", object_id, None, original), original, None
+
+    marked_document = copy.deepcopy(original)
+    marked_document[config.DELETED] = True
+    marked_document[config.LAST_UPDATED] = date_utc
+    if config.IF_MATCH:
+        resolve_document_etag(marked_document, resource)
+    resolve_document_version(marked_document, resource, "DELETE", original)
+
+    return ("replace", object_id, marked_document, original), marked_document, None
+
+
+def _complete_patch(resource, performed):
+    """Inserts the oplog entries and versions of the performed PATCH
+    operations, then notifies the callbacks.
+
+    .. versionadded:: 2.2
+    """
+    oplog_push(
+        resource,
+        [updates for (_, _, updates, _), _ in performed],
+        "PATCH",
+        [id_ for (_, id_, _, _), _ in performed],
+    )
+    insert_versioning_documents(resource, [updated for _, updated in performed])
+    for (_, _, updates, original), _ in performed:
+        getattr(app, "on_updated")(resource, updates, original)
+        getattr(app, "on_updated_%s" % resource)(updates, original)
+
+
+def _complete_put(resource, performed):
+    """Inserts the oplog entries and versions of the performed PUT
+    operations, then notifies the callbacks.
+
+    .. versionadded:: 2.2
+    """
+    documents = [document for _, document in performed]
+    oplog_push(resource, documents, "PUT")
+    insert_versioning_documents(resource, documents)
+    for (_, _, document, original), _ in performed:
+        getattr(app, "on_replaced")(resource, document, original)
+        getattr(app, "on_replaced_%s" % resource)(document, original)
+
+
+def _complete_delete(resource, performed):
+    """Cleans up after the performed DELETE operations: versions and media
+    files of removed documents are deleted, soft deleted documents are
+    versioned. Oplog entries are inserted and callbacks notified.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = config.DOMAIN[resource]
+    id_field = resource_def["id_field"]
+    ids = [id_ for (_, id_, _, _), _ in performed]
+    originals = [original for (_, _, _, original), _ in performed]
+
+    if resource_def["soft_delete"]:
+        for original in originals:
+            late_versioning_catch(original, resource)
+        documents = [document for _, document in performed]
+        insert_versioning_documents(resource, documents)
+    else:
+        documents = originals
+        media_fields = resource_def["_media"]
+        for original in originals:
+            if any(field not in original for field in media_fields):
+                # retrieve the whole document so we have all media fields.
+                original = app.data.find_one_raw(
+                    resource, **{id_field: original[id_field]}
+                )
+            for field in media_fields:
+                if field in original:
+                    media_field = original[field]
+                    for file_id in (
+                        media_field if isinstance(media_field, list) else [media_field]
+                    ):
+                        app.media.delete(file_id, resource)
+        if resource_def["versioning"] is True:
+            app.data.remove(
+                resource + config.VERSIONS,
+                {versioned_id_field(resource_def): {"$in": ids}},
+            )
+
+    oplog_push(resource, documents, "DELETE", ids)
+
+    for original in originals:
+        getattr(app, "on_deleted_item")(resource, original)
+        getattr(app, "on_deleted_item_%s" % resource)(original)
+
+
+def _failure(code, message):
+    """Returns the status of a failed operation.
+
+    .. versionadded:: 2.2
+    """
+    return {
+        config.STATUS: config.STATUS_ERR,
+        config.ERROR: {"code": code, "message": message},
+    }
+
+
+def _write_failure(code, message):
+    """Returns the status of an operation which the data layer failed to
+    perform, given the error code and message it reported.
+
+    .. versionadded:: 2.2
+    """
+    app.logger.warning("bulk write error %s: %s", code, message)
+    if code == 11000:
+        return _failure(409, debug_error_message(message) or "Duplicate key error")
+    if code in (66, 16837):
+        # attempt to update an immutable field, see Mongo._change_request().
+        return _failure(
+            400,
+            debug_error_message(message)
+            or "Attempt to update an immutable field",
+        )
+    return _failure(500, debug_error_message(message) or "Write failure")
+
+
+_PREPARE = {"PATCH": _prepare_patch, "PUT": _prepare_put, "DELETE": _prepare_delete}
+_COMPLETE = {
+    "PATCH": _complete_patch,
+    "PUT": _complete_put,
+    "DELETE": _complete_delete,
+}
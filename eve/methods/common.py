@@ -130,6 +130,86 @@ def get_document(
     return document
 
 
+# events whose handlers receive the original document of an item write.
+DIRECT_WRITE_EVENTS = {
+    "PATCH": ("on_update", "on_updated"),
+    "PUT": ("on_replace", "on_replaced"),
+    "DELETE": ("on_delete_item",),
+}
+
+
+def direct_write(
+    resource, method, req, lookup, concurrency_check, changes=None, events=True
+):
+    """Tells whether an item PATCH, PUT or DELETE can be performed with a
+    single conditional write, without retrieving the document first. This
+    requires 'direct_writes' to be enabled on a resource which does not need
+    the original document for `method`, a lookup by 'id_field' and no
+    handlers for the events which receive the original document. When the
+    etag is required, it must be provided: otherwise the document must be
+    retrieved to tell 428 from 404. PATCH also requires the etag to be
+    checked, as the new etag is computed from the previous one.
+
+    :param resource: the name of the resource to which the document belongs.
+    :param method: the request method.
+    :param req: a :class:`ParsedRequest` instance.
+    :param lookup: document lookup query.
+    :param concurrency_check: concurrency check switch (bool)
+    :param changes: PATCH changes. With 'merge_nested_documents', nested
+                    documents are merged with the stored ones, which need to
+                    be retrieved, and so do 'patch_operators'.
+    :param events: whether the event handlers are going to be notified.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = config.DOMAIN[resource]
+    if (
+        method not in resource_def["_direct_writes"]
+        or resource_def["id_field"] not in lookup
+    ):
+        return False
+    if (
+        concurrency_check
+        and config.IF_MATCH
+        and config.ENFORCE_IF_MATCH
+        and not req.if_match
+    ):
+        return False
+    if (
+        method == "PATCH"
+        and config.IF_MATCH
+        and not (concurrency_check and req.if_match)
+    ):
+        return False
+    if (
+        resource_def["merge_nested_documents"]
+        and isinstance(changes, dict)
+        and any(isinstance(value, dict) for value in changes.values())
+    ):
+        return False
+    if isinstance(changes, dict) and any(
+        key in resource_def["patch_operators"] for key in changes
+    ):
+        return False
+    return not events or not any(
+        len(getattr(app, event)) or len(getattr(app, "%s_%s" % (event, resource)))
+        for event in DIRECT_WRITE_EVENTS[method]
+    )
+
+
+def direct_write_etag(changes, etag):
+    """Returns the etag of a document updated with a single conditional
+    write. As the whole document is not known, the etag is computed from the
+    changes and the previous etag of the document.
+
+    :param changes: the changes written to the document.
+    :param etag: the previous etag of the document.
+
+    .. versionadded:: 2.2
+    """
+    return document_etag({"changes": changes, config.ETAG: etag})
+
+
 def parse(value, resource):
     """Safely evaluates a string containing a Python expression. We are
     receiving json and returning a dict.
@@ -1456,7 +1536,11 @@ def oplog_push(resource, document, op, id=None):
     :param resource: name of the resource involved.
     :param document: updates performed with the edit operation.
     :param op: operation performed. Can be 'POST', 'PUT', 'PATCH', 'DELETE'.
-    :param id: unique id of the document.
+    :param id: unique id of the document, or list of the unique ids of the
+               documents, when `document` is a list.
+
+    .. versionchanged:: 2.2
+       `id` can be a list of ids, one for each document.
 
     .. versionchanged:: 0.7
        Add user information to the audit. Closes #846.
@@ -1487,15 +1571,17 @@ def oplog_push(resource, document, op, id=None):
     if not isinstance(updates, list):
         updates = [updates]
 
+    ids = id if isinstance(id, list) else [id] * len(updates)
+
     entries = []
-    for update in updates:
+    for update, id_ in zip(updates, ids):
         entry = {
             "r": config.URLS[resource],
             "o": op,
             "i": (
                 update[resource_def["id_field"]]
                 if resource_def["id_field"] in update
-                else id
+                else id_
             ),
         }
         if config.LAST_UPDATED in update:
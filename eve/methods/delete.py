@@ -16,9 +16,10 @@ from flask import abort
 from flask import current_app as app
 
 from eve.auth import requires_auth
-from eve.methods.common import (get_document, oplog_push, pre_event, ratelimit,
-                                resolve_document_etag, utcnow)
-from eve.utils import ParsedRequest, config
+from eve.methods.common import (direct_write, get_document, oplog_push,
+                                pre_event, ratelimit, resolve_document_etag,
+                                utcnow)
+from eve.utils import ParsedRequest, config, parse_request
 from eve.versioning import (insert_versioning_documents, late_versioning_catch,
                             resolve_document_version, versioned_id_field)
 
@@ -55,6 +56,9 @@ def deleteitem_internal(
     :param original: original document if already fetched from the database
     :param **lookup: item lookup query.
 
+    .. versionchanged:: 2.2
+       Support for 'direct_writes'.
+
     .. versionchanged:: 0.6
        Support for soft delete.
 
@@ -90,6 +94,20 @@ def deleteitem_internal(
        Added the ``requires_auth`` decorator.
     """
     resource_def = config.DOMAIN[resource]
+    if original is None:
+        req = parse_request(resource)
+        if direct_write(
+            resource,
+            "DELETE",
+            req,
+            lookup,
+            concurrency_check,
+            events=not suppress_callbacks,
+        ):
+            return _deleteitem_direct(
+                resource, req, concurrency_check, suppress_callbacks, lookup
+            )
+
     soft_delete_enabled = resource_def["soft_delete"]
     original = get_document(
         resource,
@@ -182,6 +200,31 @@ def deleteitem_internal(
     return all_done()
 
 
+def _deleteitem_direct(resource, req, concurrency_check, suppress_callbacks, lookup):
+    """Deletes a resource item with a single conditional write, without
+    retrieving it first. See :func:`eve.methods.common.direct_write`.
+
+    .. versionadded:: 2.2
+    """
+    if_match = req.if_match if concurrency_check and config.IF_MATCH else None
+    try:
+        original = app.data.remove_if_match(resource, req, lookup, if_match)
+    except app.data.OriginalChangedError:
+        abort(412, description="Client and server etags don't match")
+    if original is None:
+        return all_done()
+
+    # update oplog if needed
+    id = original[config.DOMAIN[resource]["id_field"]]
+    oplog_push(resource, original, "DELETE", id)
+
+    if not suppress_callbacks:
+        getattr(app, "on_deleted_item")(resource, original)
+        getattr(app, "on_deleted_item_%s" % resource)(original)
+
+    return all_done()
+
+
 @requires_auth("resource")
 @pre_event
 def delete(resource, **lookup):
@@ -12,7 +12,6 @@
 """
 from __future__ import division
 
-import copy
 import math
 
 import simplejson as json
@@ -21,8 +20,9 @@ from flask import current_app as app
 from flask import request
 from werkzeug.datastructures import MultiDict
 
-from eve.auth import requires_auth
-from eve.utils import config, home_link, parse_request, querydef
+from eve.auth import admin_request, requires_auth
+from eve.utils import (aggregation_template, config, home_link, parse_request,
+                       querydef)
 from eve.versioning import (diff_document, get_old_document,
                             synthesize_versioned_document, versioned_id_field)
 
@@ -120,74 +120,77 @@ def get_internal(resource, **lookup):
 
 def _perform_aggregation(resource, pipeline, options):
     """
+    .. versionchanged:: 2.2
+       The pipeline is compiled once into a template, whose placeholders are
+       filled with the client values on every request.
+       Support for 'cursor' pagination.
+       Support for materialized aggregations.
+
     .. versionadded:: 0.7
     """
 
     # TODO move most of this down to the Mongo layer?
 
-    # TODO experiment with cursor.batch_size as alternative pagination
-    # implementation
-
-    def parse_aggregation_stage(st_item, key, value):
-        def parse_again(st_value, key, value):
-            """
-            If stage value is list or dict then parse recursively
-            """
-            if isinstance(st_value, (list, dict)):
-                parse_aggregation_stage(st_value, key, value)
-
-        if isinstance(st_item, dict):
-            for st_key, st_value in st_item.items():
-                if key == st_value:
-                    st_item[st_key] = value
-                else:
-                    parse_again(st_value, key, value)
-
-        elif isinstance(st_item, list):
-            for st_i, st_value in enumerate(st_item):
-                if key == st_value:
-                    st_item[st_i] = value
-                else:
-                    parse_again(st_value, key, value)
-
-    def prune_aggregation_stage(d):
-        """
-        Remove the stages whose parameters are not set.
-
-        For example, we have endpoint with a stage like {'$lookup': {'$userId': '$a', '$name': '$b'}}, $a is provided
-        but $b is provided as {}. Then the stage will be pruned as {'$lookup': {'$userId': '$a'}}
-        """
-        for st_key, st_value in list(d.items()):
-            if isinstance(st_value, dict):
-                prune_aggregation_stage(st_value)
-                if not st_value:
-                    # value is an empty dict, remove the key
-                    del d[st_key]
-
     response = {}
     documents = []
     req = parse_request(resource)
 
-    req_pipeline = copy.deepcopy(pipeline)
+    query = {}
     if req.aggregation:
         try:
             query = json.loads(req.aggregation)
         except ValueError:
             abort(400, description="Aggregation query could not be parsed.")
 
-        for key, value in query.items():
-            if key.startswith("$"):
-                pass
-            for stage in req_pipeline:
-                parse_aggregation_stage(stage, key, value)
+    # placeholders are replaced with the client values, and the stages whose
+    # conditions are not yet set are removed.
+    template = aggregation_template(config.DOMAIN[resource])
+    req_pipeline_pruned = template.render(query)
+
+    aggregation = config.DOMAIN[resource]["datasource"]["aggregation"]
+    materialized = None
+    if aggregation["materialize"]:
+        # the request pipeline runs against the materialized results.
+        materialized = app.data.materialize(resource)
+
+    getattr(app, "before_aggregation")(resource, req_pipeline_pruned)
+
+    has_next = False
+    if aggregation["pagination"] == "cursor":
+        documents, count, has_next = _cursor_aggregation(
+            resource, req, req_pipeline_pruned, options, aggregation["count"]
+        )
+    else:
+        documents, count = _facet_aggregation(
+            resource, req, req_pipeline_pruned, options
+        )
+
+    getattr(app, "after_aggregation")(resource, documents)
+
+    response[config.ITEMS] = documents
+
+    # add pagination info
+    if config.DOMAIN[resource]["pagination"]:
+        response[config.META] = _meta_links(req, count)
+
+    if config.DOMAIN[resource]["hateoas"]:
+        response[config.LINKS] = _pagination_links(
+            resource, req, count, has_next=has_next
+        )
 
-    # remove the stages whose conditions are not yet set
-    req_pipeline_pruned = []
-    for stage in req_pipeline:
-        prune_aggregation_stage(stage)
-        if stage:
-            req_pipeline_pruned.append(stage)
+    if materialized:
+        response.setdefault(config.META, {})["materialized"] = materialized
+
+    return response, None, None, 200, []
 
+
+def _facet_aggregation(resource, req, pipeline, options):
+    """Performs a paginated aggregation with a single query, by appending a
+    '$facet' stage which returns both the page and the total count. Returns
+    the documents and the count.
+
+    .. versionadded:: 2.2
+    """
     paginated_results = []
 
     if req.max_results > 0:
@@ -206,21 +209,12 @@ def _perform_aggregation(resource, pipeline, options):
 
     facet = {"$facet": facet_pipelines}
 
-    getattr(app, "before_aggregation")(resource, req_pipeline_pruned)
-
     # Appending $facet afer the before_aggregation hook allows for
     # easy modification of the orginal pipline, however, pagination
     # (skip, limit) cannot be accessed.
-    req_pipeline_pruned.append(facet)
-
-    cursor = app.data.aggregate(resource, req_pipeline_pruned, options).next()
-
-    for document in cursor["paginated_results"]:
-        documents.append(document)
-
-    getattr(app, "after_aggregation")(resource, documents)
+    cursor = app.data.aggregate(resource, pipeline + [facet], options).next()
 
-    response[config.ITEMS] = documents
+    documents = list(cursor["paginated_results"])
 
     if cursor["total_count"]:
         # IndexError: list index out of range
@@ -228,18 +222,50 @@ def _perform_aggregation(resource, pipeline, options):
     else:
         count = 0
 
-    # add pagination info
-    if config.DOMAIN[resource]["pagination"]:
-        response[config.META] = _meta_links(req, count)
+    return documents, count
 
-    if config.DOMAIN[resource]["hateoas"]:
-        response[config.LINKS] = _pagination_links(resource, req, count)
 
-    return response, None, None, 200, []
+def _cursor_aggregation(resource, req, pipeline, options, perform_count):
+    """Performs a paginated aggregation by streaming the page from a regular
+    cursor, which is not subject to the size limit of a single '$facet'
+    document. The total count is performed by a separate '$count' pipeline
+    only when it can't be inferred from the page, or skipped altogether if
+    `perform_count` is False, in which case one more document is fetched to
+    tell whether a next page exists. Returns the documents, the count (None
+    when unknown) and whether a next page exists.
+
+    .. versionadded:: 2.2
+    """
+    page_pipeline = list(pipeline)
+    page_options = options
+    skip = (req.page - 1) * req.max_results
+    if req.max_results > 0:
+        if skip:
+            page_pipeline.append({"$skip": skip})
+        page_pipeline.append({"$limit": req.max_results + 1})
+        if "batchSize" not in options:
+            # a single batch is enough to fill the page.
+            page_options = dict(options, batchSize=req.max_results + 1)
+
+    documents = list(app.data.aggregate(resource, page_pipeline, page_options))
+    has_next = req.max_results > 0 and len(documents) > req.max_results
+    if has_next:
+        del documents[req.max_results :]
+
+    count = None
+    if not has_next and (documents or skip == 0):
+        # this is the last page.
+        count = skip + len(documents)
+    elif perform_count:
+        count = app.data.aggregate_count(resource, pipeline, options)
+    return documents, count, has_next
 
 
 def _perform_find(resource, lookup):
     """
+    .. versionchanged:: 2.2
+       Return the query explain output to administrators ('?explain=1').
+
     .. versionadded:: 0.7
     """
     documents = []
@@ -254,9 +280,12 @@ def _perform_find(resource, lookup):
     # If-Modified-Since disabled on collections (#334)
     req.if_modified_since = None
 
-    cursor, count = app.data.find(
-        resource, req, lookup, perform_count=not config.OPTIMIZE_PAGINATION_FOR_SPEED
-    )
+    perform_count = not config.OPTIMIZE_PAGINATION_FOR_SPEED
+    if _explain_requested(req):
+        explain = app.data.explain(resource, req, lookup, perform_count)
+        return explain, None, None, 200, []
+
+    cursor, count = app.data.find(resource, req, lookup, perform_count=perform_count)
     # If soft delete is enabled, data.find will not include items marked
     # deleted unless req.show_deleted is True
     for document in cursor:
@@ -299,6 +328,17 @@ def _perform_find(resource, lookup):
     return response, last_modified, etag, status, headers
 
 
+def _explain_requested(req):
+    """Returns True if the query explain output should be returned instead of
+    the documents: explain mode has been requested by an administrator, and is
+    supported by the data layer. No document is retrieved or rendered, and no
+    'on_fetched' event is raised.
+
+    .. versionadded:: 2.2
+    """
+    return req.explain and hasattr(app.data, "explain") and admin_request()
+
+
 @ratelimit()
 @requires_auth("item")
 @pre_event
@@ -319,6 +359,9 @@ def getitem_internal(resource, **lookup):
     :param resource: the name of the resource to which the document belongs.
     :param **lookup: the lookup query.
 
+    .. versionchanged:: 2.2
+       Return the query explain output to administrators ('?explain=1').
+
     .. versionchanged:: 0.8.2
        Prevent extra hateoas links from overwriting
        already existed data relation hateoas links.
@@ -384,6 +427,9 @@ def getitem_internal(resource, **lookup):
         # They are handled and included in 404 responses below.
         req.show_deleted = True
 
+    if _explain_requested(req):
+        return app.data.explain_one(resource, req, **lookup), None, None, 200, []
+
     document = app.data.find_one(resource, req, **lookup)
     if not document:
         abort(404)
@@ -539,7 +585,9 @@ def getitem_internal(resource, **lookup):
     return response, last_modified, etag, 200
 
 
-def _pagination_links(resource, req, document_count, document_id=None):
+def _pagination_links(
+    resource, req, document_count, document_id=None, has_next=False
+):
     """Returns the appropriate set of resource links depending on the
     current page and the total number of documents returned by the query.
 
@@ -547,6 +595,11 @@ def _pagination_links(resource, req, document_count, document_id=None):
     :param req: and instace of :class:`eve.utils.ParsedRequest`.
     :param document_count: the number of documents returned by the query.
     :param document_id: the document id (used for versions). Defaults to None.
+    :param has_next: True if a next page is known to exist, even though the
+                     document count is not. Defaults to False.
+
+    .. versionchanged:: 2.2
+       'has_next' argument.
 
     .. versionchanged:: 0.5
        Create pagination links given a document ID to allow paginated versions
@@ -615,6 +668,7 @@ def _pagination_links(resource, req, document_count, document_id=None):
 
         if (
             req.page * req.max_results < (document_count or 0)
+            or has_next
             or config.OPTIMIZE_PAGINATION_FOR_SPEED
         ):
             q = querydef(
@@ -688,11 +742,14 @@ def _meta_links(req, count):
     """Reterns the meta links for a paginated query.
 
     :param req: parsed request object.
-    :param count: total number of documents in a query.
+    :param count: total number of documents in a query, None if unknown.
+
+    .. versionchanged:: 2.2
+       Omit the total when the count is unknown.
 
     .. versionadded:: 0.5
     """
     meta = {config.QUERY_PAGE: req.page, config.QUERY_MAX_RESULTS: req.max_results}
-    if config.OPTIMIZE_PAGINATION_FOR_SPEED is False:
+    if config.OPTIMIZE_PAGINATION_FOR_SPEED is False and count is not None:
         meta["total"] = count
     return meta
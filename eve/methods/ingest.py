@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+"""
+    eve.methods.ingest
+    ~~~~~~~~~~~~~~~~~~
+
+    This module implements the streaming bulk ingest, supported by the
+    ingest endpoints of resources.
+
+    :copyright: (c) 2017 by Nicola Iarocci.
+    :license: BSD, see LICENSE for more details.
+"""
+import codecs
+import re
+import simplejson as json
+from flask import Response, abort
+from flask import current_app as app
+from flask import g, request, stream_with_context
+from werkzeug.exceptions import HTTPException
+
+from eve.auth import requires_auth
+from eve.methods.common import (oplog_push, pre_event, ratelimit,
+                                resolve_document_etag, utcnow)
+from eve.methods.post import _insertion_issues, _validate_documents
+from eve.utils import config, debug_error_message
+from eve.versioning import insert_versioning_documents
+
+NDJSON = "application/x-ndjson"
+
+# size of the blocks read from streamed json arrays.
+BLOCK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class StreamError(ValueError):
+    """Raised when a streamed payload can't be read any further."""
+
+    pass
+
+
+@ratelimit()
+@requires_auth("resource")
+@pre_event
+def ingest(resource):
+    """Adds the documents of a streamed payload to a resource. The payload is
+    either newline delimited json, one document per line, or a json array.
+    Documents are read, validated and inserted in chunks of
+    'bulk_ingest_chunk_size' documents, so memory usage does not depend on
+    the size of the payload. Documents which fail validation or insertion do
+    not prevent the insertion of the others.
+
+    The response is streamed as newline delimited json too: a line reporting
+    the status of each document of a chunk is sent as soon as the chunk has
+    been processed, and a last line sums up the whole ingest. Since the
+    response headers are sent before any document is written, the causal
+    consistency token, if any, is returned with the summary line rather than
+    with the CAUSAL_TOKEN_HEADER header.
+
+    .. versionadded:: 2.2
+    """
+    content_type = request.headers.get("Content-Type", "").split(";")[0]
+    if content_type == NDJSON:
+        values = _ndjson_values(request.stream)
+    elif content_type in config.JSON_REQUEST_CONTENT_TYPES:
+        values = _json_array_values(request.stream)
+    else:
+        abort(400, description="Unknown or no Content-Type header supplied")
+
+    return Response(stream_with_context(_ingest(resource, values)), mimetype=NDJSON)
+
+
+def _ingest(resource, values):
+    """Processes the values of a streamed payload one chunk at a time,
+    yielding the lines of the response.
+
+    .. versionadded:: 2.2
+    """
+    chunk_size = config.DOMAIN[resource]["bulk_ingest_chunk_size"]
+    received = inserted = chunk = 0
+    error = None
+    done = False
+    while not done:
+        values_chunk = []
+        try:
+            while len(values_chunk) < chunk_size:
+                values_chunk.append(next(values))
+        except StopIteration:
+            done = True
+        except StreamError as e:
+            # values read before the error are still processed.
+            done = True
+            error = {"code": 400, "message": str(e)}
+
+        if values_chunk:
+            try:
+                items = _ingest_chunk(resource, values_chunk)
+            except Exception as e:
+                # the response status has already been sent: report the
+                # failure of the chunk, whose documents might have been
+                # inserted or not, and stop the ingest.
+                error = _chunk_error(e)
+                yield _line(
+                    {
+                        config.STATUS: config.STATUS_ERR,
+                        "chunk": chunk,
+                        "offset": received,
+                        config.ERROR: error,
+                    }
+                )
+                break
+            failed = sum(item[config.STATUS] != config.STATUS_OK for item in items)
+            yield _line(
+                {
+                    config.STATUS: config.STATUS_ERR if failed else config.STATUS_OK,
+                    "chunk": chunk,
+                    "offset": received,
+                    config.ITEMS: items,
+                }
+            )
+            received += len(items)
+            inserted += len(items) - failed
+            chunk += 1
+
+    summary = {
+        config.STATUS: config.STATUS_ERR
+        if error or inserted < received
+        else config.STATUS_OK,
+        "received": received,
+        "inserted": inserted,
+        "failed": received - inserted,
+    }
+    if error:
+        summary[config.ERROR] = error
+    if g.get("causal_token"):
+        summary["causal_token"] = g.causal_token
+    yield _line(summary)
+
+
+def _chunk_error(e):
+    """Returns the error reported when the processing of a chunk raised `e`.
+
+    .. versionadded:: 2.2
+    """
+    if isinstance(e, HTTPException):
+        return {"code": e.code, "message": e.description}
+    app.logger.exception(e)
+    return {
+        "code": 500,
+        "message": debug_error_message(str(e)) or "Internal Server Error",
+    }
+
+
+def _ingest_chunk(resource, values):
+    """Validates and inserts a chunk of documents. Returns the status of each
+    document, in the same order as `values`.
+
+    :param resource: name of the resource involved.
+    :param values: list of (value, issues) tuples. Values with issues could
+                   not be read from the payload.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = config.DOMAIN[resource]
+    id_field = resource_def["id_field"]
+    validator = app.validator(
+        resource_def["schema"],
+        resource=resource,
+        allow_unknown=resource_def["allow_unknown"],
+    )
+
+    issues = [value_issues for _, value_issues in values]
+    readable = [index for index in range(len(values)) if not issues[index]]
+    documents = {}
+    validated = _validate_documents(
+        resource, [values[index][0] for index in readable], validator, utcnow()
+    )
+    for index, (document, doc_issues) in zip(readable, validated):
+        if doc_issues:
+            issues[index] = doc_issues
+        else:
+            documents[index] = document
+
+    ids = {}
+    if documents:
+        valid = list(documents.values())
+
+        # notify callbacks
+        getattr(app, "on_insert")(resource, valid)
+        getattr(app, "on_insert_%s" % resource)(valid)
+
+        # compute etags here as documents might have been updated by callbacks.
+        resolve_document_etag(valid, resource)
+
+        inserted_ids, errors = app.data.insert_unordered(resource, valid)
+        for position, (index, id_) in enumerate(zip(list(documents), inserted_ids)):
+            if position in errors:
+                issues[index] = _insertion_issues(*errors[position])
+                del documents[index]
+            else:
+                ids[index] = documents[index].get(id_field, id_)
+
+        inserted = list(documents.values())
+        if inserted:
+            oplog_push(resource, inserted, "POST")
+            insert_versioning_documents(resource, inserted)
+
+            # notify callbacks
+            getattr(app, "on_inserted")(resource, inserted)
+            getattr(app, "on_inserted_%s" % resource)(inserted)
+
+    items = []
+    for index, value_issues in enumerate(issues):
+        if index in ids:
+            items.append({config.STATUS: config.STATUS_OK, id_field: ids[index]})
+        else:
+            items.append(
+                {config.STATUS: config.STATUS_ERR, config.ISSUES: value_issues}
+            )
+    return items
+
+
+def _ndjson_values(stream):
+    """Yields (value, issues) tuples for the lines of a newline delimited json
+    stream. Blank lines are skipped, and lines which are not valid json are
+    reported as issues.
+
+    .. versionadded:: 2.2
+    """
+    for line in stream:
+        try:
+            line = line.decode("utf-8").strip()
+            if line:
+                yield json.loads(line), None
+        except ValueError as e:
+            yield None, {"exception": "Invalid JSON: %s" % e}
+
+
+def _json_array_values(stream):
+    """Yields (value, issues) tuples for the items of a json array, read from
+    `stream` in blocks. A syntax error stops the stream, as the following
+    items can't be told apart: StreamError is raised.
+
+    .. versionadded:: 2.2
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    eof = False
+    # what may come next: "[", "value or ]", "value", ", or ]" or None, once
+    # the array has been closed.
+    expected = "["
+
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        char = buffer[position] if position < len(buffer) else None
+        decoding = char is not None and (
+            expected == "value" or (expected == "value or ]" and char != "]")
+        )
+        value = end = error = None
+        if decoding:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                error = e
+
+        # values are only accepted when followed by some more data, or by the
+        # end of the stream, as they might be incomplete otherwise.
+        if not eof and (char is None or decoding and (error or end == len(buffer))):
+            # release the data already read, then read a block as large as
+            # the buffer, so that large values are not decoded over and over.
+            buffer = buffer[position:]
+            position = 0
+            block = stream.read(max(BLOCK_SIZE, len(buffer)))
+            eof = not block
+            try:
+                buffer += utf8.decode(block, final=eof)
+            except UnicodeDecodeError as e:
+                raise StreamError("Invalid JSON array: %s" % e)
+            continue
+
+        if char is None:
+            if expected is not None:
+                raise StreamError("Invalid JSON array: unexpected end of stream")
+            return
+        if expected is None:
+            raise StreamError("Invalid JSON array: unexpected data after the array")
+
+        if decoding:
+            if error:
+                raise StreamError("Invalid JSON array: %s" % error.msg)
+            position = end
+            expected = ", or ]"
+            yield value, None
+        elif expected == "[":
+            if char != "[":
+                raise StreamError("Invalid JSON array: the payload is not an array")
+            position += 1
+            expected = "value or ]"
+        elif char == "]":
+            position += 1
+            expected = None
+        else:
+            if char != ",":
+                raise StreamError("Invalid JSON array: expected ',' or ']'")
+            position += 1
+            expected = "value"
+
+
+def _line(data):
+    """Renders a line of a newline delimited json response.
+
+    .. versionadded:: 2.2
+    """
+    return (
+        json.dumps(
+            data, cls=app.data.json_encoder_class, sort_keys=config.JSON_SORT_KEYS
+        )
+        + "\n"
+    )
@@ -10,6 +10,7 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import uuid
 from copy import deepcopy
 
 from cerberus.validator import DocumentError
@@ -18,7 +19,8 @@ from flask import current_app as app
 from werkzeug import exceptions
 
 from eve.auth import requires_auth
-from eve.methods.common import (build_response_document, get_document,
+from eve.methods.common import (build_response_document, direct_write,
+                                direct_write_etag, get_document,
                                 marshal_write_response, oplog_push, parse)
 from eve.methods.common import payload as payload_
 from eve.methods.common import (pre_event, ratelimit, resolve_document_etag,
@@ -28,6 +30,15 @@ from eve.utils import config, debug_error_message, parse_request
 from eve.versioning import (insert_versioning_documents, late_versioning_catch,
                             resolve_document_version)
 
+#: update operators which can be enabled in PATCH payloads, along with the
+#: schema types of the fields they can be applied to.
+UPDATE_OPERATORS = {
+    "$inc": ("integer", "float", "number"),
+    "$push": ("list",),
+    "$addToSet": ("list",),
+    "$pull": ("list",),
+}
+
 
 @ratelimit()
 @requires_auth("item")
@@ -75,6 +86,10 @@ def patch_internal(
     :param mongo_options: options to pass to PyMongo. e.g. read_preferences of the initial get.
     :param **lookup: document lookup query.
 
+    .. versionchanged:: 2.2
+       Support for 'direct_writes'.
+       Support for 'patch_operators'.
+
     .. versionchanged:: 0.6.2
        Fix: validator is not set when skip_validation is true.
 
@@ -143,6 +158,12 @@ def patch_internal(
     if payload is None:
         payload = payload_()
 
+    req = parse_request(resource)
+    if direct_write(resource, "PATCH", req, lookup, concurrency_check, payload):
+        return _patch_direct(
+            resource, req, payload, concurrency_check, skip_validation, lookup
+        )
+
     original = get_document(
         resource, concurrency_check, mongo_options=mongo_options, **lookup
     )
@@ -167,12 +188,14 @@ def patch_internal(
     if config.BANDWIDTH_SAVER is True:
         embedded_fields = []
     else:
-        req = parse_request(resource)
         embedded_fields = resolve_embedded_fields(resource, req)
 
     try:
         updates = parse(payload, resource)
-        if skip_validation:
+        operators, issues = resolve_update_operators(updates, original, resource)
+        if issues:
+            validation = False
+        elif skip_validation:
             validation = True
         else:
             validation = validator.validate_update(
@@ -184,6 +207,7 @@ def patch_internal(
             # Apply coerced values
 
             # sneak in a shadow copy if it wasn't already there
+            versioned = config.VERSION in original
             late_versioning_catch(original, resource)
 
             store_media_files(updates, resource, original)
@@ -215,15 +239,27 @@ def patch_internal(
 
             updated.update(updates)
 
-            if config.IF_MATCH:
-                resolve_document_etag(updated, resource)
-                # now storing the (updated) ETAG with every document (#453)
-                updates[config.ETAG] = updated[config.ETAG]
-            try:
-                app.data.update(resource, object_id, updates, original)
-            except app.data.OriginalChangedError:
-                if concurrency_check:
-                    abort(412, description="Client and server etags don't match")
+            if operators and not (
+                concurrency_check and config.IF_MATCH and req.if_match
+            ):
+                updated = _update_with_operators(
+                    resource, req, object_id, updates, operators, versioned
+                )
+            else:
+                if config.IF_MATCH:
+                    resolve_document_etag(updated, resource)
+                    # now storing the (updated) ETAG with every document (#453)
+                    updates[config.ETAG] = updated[config.ETAG]
+                try:
+                    if operators:
+                        app.data.update(
+                            resource, object_id, updates, original, operators=operators
+                        )
+                    else:
+                        app.data.update(resource, object_id, updates, original)
+                except app.data.OriginalChangedError:
+                    if concurrency_check:
+                        abort(412, description="Client and server etags don't match")
 
             # update oplog if needed
             oplog_push(resource, updates, "PATCH", object_id)
@@ -242,7 +278,7 @@ def patch_internal(
             if config.IF_MATCH:
                 etag = response[config.ETAG]
         else:
-            issues = validator.errors
+            issues = issues or validator.errors
     except DocumentError as e:
         # TODO should probably log the error and abort 400 instead (when we
         # got logging)
@@ -268,6 +304,250 @@ def patch_internal(
     return response, last_modified, etag, status
 
 
+def _patch_direct(resource, req, payload, concurrency_check, skip_validation, lookup):
+    """Performs a PATCH with a single conditional write, without retrieving
+    the document first. See :func:`eve.methods.common.direct_write`.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = app.config["DOMAIN"][resource]
+    id_field = resource_def["id_field"]
+    object_id = parse({id_field: lookup[id_field]}, resource)[id_field]
+    if_match = req.if_match if concurrency_check and config.IF_MATCH else None
+    etag = None
+
+    issues = {}
+    response = {}
+
+    if config.BANDWIDTH_SAVER is True:
+        embedded_fields = []
+    else:
+        embedded_fields = resolve_embedded_fields(resource, req)
+
+    try:
+        updates = parse(payload, resource)
+        if not skip_validation:
+            validator = app.validator(
+                resource_def["schema"],
+                resource=resource,
+                allow_unknown=resource_def["allow_unknown"],
+            )
+            if not validator.validate_update(
+                updates, object_id, None, resource_def.get("normalize_on_patch")
+            ):
+                issues = validator.errors
+            updates = validator.document
+
+        if not issues:
+            updates[config.LAST_UPDATED] = utcnow()
+            if config.IF_MATCH:
+                updates[config.ETAG] = direct_write_etag(updates, if_match)
+
+            try:
+                updated = app.data.update_if_match(
+                    resource, req, lookup, updates, if_match
+                )
+            except app.data.OriginalChangedError:
+                abort(412, description="Client and server etags don't match")
+            if updated is None:
+                # not found
+                abort(404)
+
+            # update oplog if needed
+            oplog_push(resource, updates, "PATCH", object_id)
+
+            # build the full response document
+            build_response_document(updated, resource, embedded_fields, updated)
+            response = updated
+            if config.IF_MATCH:
+                etag = response[config.ETAG]
+    except DocumentError as e:
+        issues["validator exception"] = str(e)
+    except exceptions.HTTPException as e:
+        raise e
+    except Exception as e:
+        # consider all other exceptions as Bad Requests
+        app.logger.exception(e)
+        abort(400, description=debug_error_message("An exception occurred: %s" % e))
+
+    if issues:
+        response[config.ISSUES] = issues
+        response[config.STATUS] = config.STATUS_ERR
+        status = config.VALIDATION_ERROR_STATUS
+    else:
+        response[config.STATUS] = config.STATUS_OK
+        status = 200
+
+    # limit what actually gets sent to minimize bandwidth usage
+    response = marshal_write_response(response, resource)
+
+    return response, None, etag, status
+
+
+def _update_with_operators(resource, req, object_id, updates, operators, versioned):
+    """Applies the update operators of a PATCH which does not check the etag
+    to the document as it is stored, rather than to the original one, so that
+    concurrent updates are not lost. The values the operators produced, the
+    version, the response and the etag are taken from the updated document
+    returned by the database. The etag is then stored, unless the document
+    has been changed again in the meantime, in which case the latest change
+    stores its own. The request fails with a 409 if concurrent updates left
+    no room for the operators within the schema bounds of their fields.
+
+    :param versioned: whether the stored document has a version number,
+                      which is then incremented by the database.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = config.DOMAIN[resource]
+    id_field = resource_def["id_field"]
+    if resource_def["versioning"] is True and versioned:
+        increments = dict(operators.get("$inc", {}), **{config.VERSION: 1})
+        operators = dict(operators, **{"$inc": increments})
+    if config.IF_MATCH:
+        # a provisional etag tells whether the document changed before its
+        # actual etag is stored.
+        updates[config.ETAG] = uuid.uuid4().hex
+    try:
+        updated = app.data.update_with_operators(
+            resource, object_id, updates, operators
+        )
+    except app.data.OriginalChangedError:
+        abort(
+            409,
+            description="The update operators conflict with a concurrent "
+            "update of the document",
+        )
+    if updated is None:
+        # not found
+        abort(404)
+
+    for fields in operators.values():
+        for field in fields:
+            if field in updated:
+                updates[field] = updated[field]
+
+    if config.IF_MATCH:
+        provisional_etag = updated[config.ETAG]
+        resolve_document_etag(updated, resource)
+        updates[config.ETAG] = updated[config.ETAG]
+        try:
+            app.data.update_if_match(
+                resource,
+                req,
+                {id_field: object_id},
+                {config.ETAG: updated[config.ETAG]},
+                provisional_etag,
+            )
+        except app.data.OriginalChangedError:
+            # a later change stores its own etag.
+            pass
+    return updated
+
+
+def resolve_update_operators(updates, original, resource):
+    """Pops the update operators enabled with 'patch_operators' out of the
+    PATCH `updates`, and replaces them with the values they produce on the
+    `original` document, so that these can be validated, stored in versions
+    and returned like any other update. The operators are returned along with
+    the issues found while applying them: the database layer applies them
+    atomically, instead of setting the computed values.
+
+    :param updates: the PATCH updates.
+    :param original: the original document.
+    :param resource: the name of the resource to which the document belongs.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = app.config["DOMAIN"][resource]
+    schema = resource_def["schema"]
+    operators = {}
+    issues = {}
+    for operator in [key for key in updates if key in resource_def["patch_operators"]]:
+        operands = updates.pop(operator)
+        if not isinstance(operands, dict) or not operands:
+            issues[operator] = "must be a non-empty dict of fields"
+            continue
+        for field, operand in operands.items():
+            types = schema.get(field, {}).get("type")
+            if isinstance(types, str):
+                types = [types]
+            if not types or any(t not in UPDATE_OPERATORS[operator] for t in types):
+                issues[field] = "%s is not allowed on this field" % operator
+                continue
+            if field in updates or any(field in f for f in operators.values()):
+                issues[field] = "conflicting updates"
+                continue
+            try:
+                operand = parse({field: _operand(operator, operand)}, resource)[field]
+                value = _apply_update_operator(operator, original, field, operand)
+            except ValueError as e:
+                issues[field] = str(e)
+                continue
+            if operator == "$push" or operator == "$addToSet":
+                operand = {"$each": operand}
+            elif operator == "$pull":
+                operand = {"$in": operand}
+            operators.setdefault(operator, {})[field] = operand
+            if field in original or operator != "$pull":
+                # pulling from a missing field is a no-op.
+                updates[field] = value
+    return operators, issues
+
+
+def _operand(operator, operand):
+    """Returns the operand of an update operator, with the values of array
+    operators unwrapped into a list.
+
+    .. versionadded:: 2.2
+    """
+    if operator == "$inc":
+        return operand
+    modifier = "$in" if operator == "$pull" else "$each"
+    if not isinstance(operand, dict):
+        return [operand]
+    if set(operand) != {modifier} or not isinstance(operand[modifier], list):
+        raise ValueError(
+            "%s requires a value or a %s list of values" % (operator, modifier)
+        )
+    return operand[modifier]
+
+
+def _apply_update_operator(operator, original, field, operand):
+    """Returns the value of `field` once the update operator is applied to
+    the `original` document, the way MongoDB does.
+
+    .. versionadded:: 2.2
+    """
+    if operator == "$inc":
+        if not _is_number(operand):
+            raise ValueError("%s requires a numeric value" % operator)
+        if field not in original:
+            return operand
+        if not _is_number(original[field]):
+            raise ValueError("cannot apply %s to a non-numeric value" % operator)
+        return original[field] + operand
+
+    value = original.get(field, [])
+    if not isinstance(value, list):
+        raise ValueError("cannot apply %s to a non-array value" % operator)
+    if operator == "$pull":
+        if any(isinstance(v, dict) for v in operand):
+            raise ValueError("%s cannot match documents" % operator)
+        return [v for v in value if v not in operand]
+    if operator == "$addToSet":
+        value = list(value)
+        for v in operand:
+            if v not in value:
+                value.append(v)
+        return value
+    return value + operand
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
 def resolve_nested_documents(updates, original):
     """Nested document updates are merged with the original contents
     we don't overwrite the whole thing. See #519 for details.
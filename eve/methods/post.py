@@ -67,6 +67,15 @@ def post_internal(resource, payl=None, skip_validation=False):
                  discussion, and a typical use case.
     :param skip_validation: skip payload validation before write (bool)
 
+    .. versionchanged:: 2.2
+       Documents are parsed before they are validated, so that validators
+       can look up the whole payload at once. Values of 'unique' fields
+       which are duplicated within the payload are reported.
+       Support for unordered bulk inserts ('bulk_ordered'): documents which
+       can't be inserted are reported, and don't prevent the insertion of
+       the others.
+       Support for 'group_commit'.
+
     .. versionchanged:: 0.7
        Add support for Location header. Closes #795.
 
@@ -187,42 +196,9 @@ def post_internal(resource, payl=None, skip_validation=False):
     if len(payl) > 1 and not config.DOMAIN[resource]["bulk_enabled"]:
         abort(400, description=debug_error_message("Bulk insert not allowed"))
 
-    for value in payl:
-        document = []
-        doc_issues = {}
-        try:
-            document = parse(value, resource)
-            resolve_sub_resource_path(document, resource)
-            if skip_validation:
-                validation = True
-            else:
-                validation = validator.validate(document)
-            if validation:  # validation is successful
-                # validator might be not available if skip_validation. #726.
-                if validator:
-                    # Apply coerced values
-                    document = validator.document
-
-                # Populate meta and default fields
-                document[config.LAST_UPDATED] = document[config.DATE_CREATED] = date_utc
-
-                if config.DOMAIN[resource]["soft_delete"] is True:
-                    document[config.DELETED] = False
-
-                resolve_user_restricted_access(document, resource)
-                store_media_files(document, resource)
-                resolve_document_version(document, resource, "POST")
-            else:
-                # validation errors added to list of document issues
-                doc_issues = validator.errors
-        except DocumentError as e:
-            doc_issues["validation exception"] = str(e)
-        except Exception as e:
-            # most likely a problem with the incoming payload, report back to
-            # the client as if it was a validation issue
-            app.logger.exception(e)
-            doc_issues["exception"] = str(e)
-
+    for document, doc_issues in _validate_documents(
+        resource, payl, validator, date_utc
+    ):
         if doc_issues:
             document = {config.STATUS: config.STATUS_ERR, config.ISSUES: doc_issues}
             failures += 1
@@ -241,7 +217,7 @@ def post_internal(resource, payl=None, skip_validation=False):
             else:
                 results.append({config.STATUS: config.STATUS_OK})
 
-        return_code = config.VALIDATION_ERROR_STATUS
+        return_code = error_code = config.VALIDATION_ERROR_STATUS
     else:
         # notify callbacks
         getattr(app, "on_insert")(resource, documents)
@@ -251,16 +227,43 @@ def post_internal(resource, payl=None, skip_validation=False):
         resolve_document_etag(documents, resource)
 
         # bulk insert
-        ids = app.data.insert(resource, documents)
+        if resource_def["group_commit"] and (
+            len(documents) == 1 or not resource_def["bulk_ordered"]
+        ):
+            ids, errors = app.group_commit.insert(
+                resource,
+                documents,
+                app.data.insert_unordered,
+                resource_def["group_commit_window_ms"],
+                resource_def["group_commit_max_size"],
+                target=app.data.insert_target(resource),
+            )
+        elif resource_def["bulk_ordered"]:
+            ids = app.data.insert(resource, documents)
+            errors = {}
+        else:
+            ids, errors = app.data.insert_unordered(resource, documents)
+        inserted = [
+            document for index, document in enumerate(documents) if index not in errors
+        ]
 
         # update oplog if needed
-        oplog_push(resource, documents, "POST")
+        oplog_push(resource, inserted, "POST")
 
         # assign document ids
-        for document in documents:
+        for index, document in enumerate(documents):
+            if index in errors:
+                results.append(
+                    {
+                        config.STATUS: config.STATUS_ERR,
+                        config.ISSUES: _insertion_issues(*errors[index]),
+                    }
+                )
+                continue
+
             # either return the custom ID_FIELD or the id returned by
             # data.insert().
-            id_ = document.get(id_field, ids.pop(0))
+            id_ = document.get(id_field, ids[index])
             document[id_field] = id_
 
             # build the full response document
@@ -274,16 +277,21 @@ def post_internal(resource, payl=None, skip_validation=False):
             result = marshal_write_response(result, resource)
             results.append(result)
 
-        # insert versioning docs
-        insert_versioning_documents(resource, documents)
+        if inserted:
+            # insert versioning docs
+            insert_versioning_documents(resource, inserted)
 
-        # notify callbacks
-        getattr(app, "on_inserted")(resource, documents)
-        getattr(app, "on_inserted_%s" % resource)(documents)
-        # request was received and accepted; at least one document passed
-        # validation and was accepted for insertion.
+            # notify callbacks
+            getattr(app, "on_inserted")(resource, inserted)
+            getattr(app, "on_inserted_%s" % resource)(inserted)
 
-        return_code = 201
+        # request was received and accepted; at least one document passed
+        # validation and was accepted for insertion. With unordered bulk
+        # inserts, documents which could not be inserted are reported.
+        failures = len(errors)
+        documents = inserted
+        error_code = 409
+        return_code = 201 if inserted else error_code
 
     if len(results) == 1:
         response = results.pop(0)
@@ -295,7 +303,7 @@ def post_internal(resource, payl=None, skip_validation=False):
 
     if failures:
         response[config.ERROR] = {
-            "code": return_code,
+            "code": error_code,
             "message": "Insertion failure: %d document(s) contain(s) error(s)"
             % failures,
         }
@@ -307,3 +315,92 @@ def post_internal(resource, payl=None, skip_validation=False):
     )
 
     return response, None, None, return_code, location_header
+
+
+def _validate_documents(resource, values, validator, date_utc):
+    """Parses and validates the documents of a payload, and populates the meta
+    fields of those which are valid. Returns a list of (document, issues)
+    tuples, one for each value; a document is valid if it has no issues.
+
+    :param resource: name of the resource involved.
+    :param values: the documents of the payload.
+    :param validator: the validator, or None if validation is skipped.
+    :param date_utc: the date of creation of the documents.
+
+    .. versionadded:: 2.2
+    """
+    parsed = []
+    for value in values:
+        document = []
+        doc_issues = {}
+        try:
+            document = parse(value, resource)
+            resolve_sub_resource_path(document, resource)
+        except Exception as e:
+            doc_issues = _document_issues(e)
+        parsed.append((document, doc_issues))
+
+    if validator and len(parsed) > 1:
+        # let the validator look up the whole payload at once.
+        validator.prepare_bulk(
+            [document for document, doc_issues in parsed if not doc_issues]
+        )
+
+    results = []
+    for document, doc_issues in parsed:
+        if not doc_issues:
+            try:
+                if validator is None:
+                    validation = True
+                else:
+                    validation = validator.validate(document)
+                if validation:  # validation is successful
+                    # validator might be not available if skip_validation. #726.
+                    if validator:
+                        # Apply coerced values
+                        document = validator.document
+
+                    # Populate meta and default fields
+                    document[config.LAST_UPDATED] = date_utc
+                    document[config.DATE_CREATED] = date_utc
+
+                    if config.DOMAIN[resource]["soft_delete"] is True:
+                        document[config.DELETED] = False
+
+                    resolve_user_restricted_access(document, resource)
+                    store_media_files(document, resource)
+                    resolve_document_version(document, resource, "POST")
+                else:
+                    # validation errors added to list of document issues
+                    doc_issues = validator.errors
+            except Exception as e:
+                doc_issues = _document_issues(e)
+        results.append((document, doc_issues))
+    return results
+
+
+def _insertion_issues(code, message):
+    """Returns the issues of a document which could not be inserted, given the
+    error code and message reported by the data layer.
+
+    .. versionadded:: 2.2
+    """
+    if code == 11000:
+        description = "Duplicate key error"
+    else:
+        description = "Insertion failure"
+    detail = debug_error_message(message)
+    return {"exception": "%s: %s" % (description, detail) if detail else description}
+
+
+def _document_issues(e):
+    """Returns the issues of a document whose processing raised `e`.
+
+    .. versionadded:: 2.2
+    """
+    if isinstance(e, DocumentError):
+        return {"validation exception": str(e)}
+    # most likely a problem with the incoming payload, report back to the
+    # client as if it was a validation issue
+    app.logger.exception(e)
+    return {"exception": str(e)}
@@ -10,14 +10,17 @@
     :license: BSD, see LICENSE for more details.
 """
 
+from copy import copy
+
 from cerberus.validator import DocumentError
 from flask import abort
 from flask import current_app as app
 from werkzeug import exceptions
 
 from eve.auth import auth_field_and_value, requires_auth
-from eve.methods.common import (build_response_document, get_document,
-                                marshal_write_response, oplog_push, parse)
+from eve.methods.common import (build_response_document, direct_write,
+                                get_document, marshal_write_response,
+                                oplog_push, parse)
 from eve.methods.common import payload as payload_
 from eve.methods.common import (pre_event, ratelimit, resolve_document_etag,
                                 resolve_embedded_fields,
@@ -70,6 +73,9 @@ def put_internal(
     :param skip_validation: skip payload validation before write (bool)
     :param **lookup: document lookup query.
 
+    .. versionchanged:: 2.2
+       Support for 'direct_writes'.
+
     .. versionchanged:: 0.6
        Create document if it does not exist. Closes #634.
        Allow restoring soft deleted documents via PUT
@@ -121,6 +127,18 @@ def put_internal(
     if payload is None:
         payload = payload_()
 
+    req = parse_request(resource)
+    if direct_write(resource, "PUT", req, lookup, concurrency_check):
+        return _put_direct(
+            resource,
+            req,
+            payload,
+            validator,
+            concurrency_check,
+            skip_validation,
+            lookup,
+        )
+
     # Retrieve the original document without checking user-restricted access,
     # but returning the document owner in the projection. This allows us to
     # prevent PUT if the document exists, but is owned by a different user
@@ -134,13 +152,7 @@ def put_internal(
     )
     if not original:
         if config.UPSERT_ON_PUT:
-            id = lookup[resource_def["id_field"]]
-            # this guard avoids a bson dependency, which would be needed if we
-            # wanted to use 'isinstance'. Should also be slightly faster.
-            if schema[resource_def["id_field"]].get("type", "") == "objectid":
-                id = str(id)
-            payload[resource_def["id_field"]] = id
-            return post_internal(resource, payl=payload)
+            return _upsert(resource, payload, lookup)
         abort(404)
 
     # If the document exists, but is owned by someone else, return
@@ -159,7 +171,6 @@ def put_internal(
     if config.BANDWIDTH_SAVER is True:
         embedded_fields = []
     else:
-        req = parse_request(resource)
         embedded_fields = resolve_embedded_fields(resource, req)
 
     try:
@@ -248,3 +259,102 @@ def put_internal(
     response = marshal_write_response(response, resource)
 
     return response, last_modified, etag, status
+
+
+def _put_direct(
+    resource, req, payload, validator, concurrency_check, skip_validation, lookup
+):
+    """Performs a PUT with a single conditional write, without retrieving
+    the document first. See :func:`eve.methods.common.direct_write`.
+
+    .. versionadded:: 2.2
+    """
+    resource_def = app.config["DOMAIN"][resource]
+    id_field = resource_def["id_field"]
+    object_id = parse({id_field: lookup[id_field]}, resource)[id_field]
+    if_match = req.if_match if concurrency_check and config.IF_MATCH else None
+    last_modified = None
+    etag = None
+
+    issues = {}
+    response = {}
+
+    if config.BANDWIDTH_SAVER is True:
+        embedded_fields = []
+    else:
+        embedded_fields = resolve_embedded_fields(resource, req)
+
+    try:
+        # the payload is left untouched, should the document be upserted.
+        document = parse(copy(payload), resource)
+        resolve_sub_resource_path(document, resource)
+        if not skip_validation:
+            if not validator.validate_replace(document, object_id):
+                issues = validator.errors
+            document = validator.document
+
+        if not issues:
+            last_modified = utcnow()
+            document[config.LAST_UPDATED] = last_modified
+            if id_field not in document:
+                document[id_field] = object_id
+            resolve_document_etag(document, resource)
+
+            try:
+                replaced = app.data.replace_if_match(
+                    resource, req, lookup, document, if_match
+                )
+            except app.data.OriginalChangedError:
+                abort(412, description="Client and server etags don't match")
+            if replaced is None:
+                # not found
+                if config.UPSERT_ON_PUT:
+                    return _upsert(resource, payload, lookup)
+                abort(404)
+
+            # update oplog if needed
+            oplog_push(resource, document, "PUT")
+
+            # build the full response document
+            build_response_document(replaced, resource, embedded_fields, replaced)
+            response = replaced
+            if config.IF_MATCH:
+                etag = response[config.ETAG]
+    except DocumentError as e:
+        issues["validator exception"] = str(e)
+    except exceptions.HTTPException as e:
+        raise e
+    except Exception as e:
+        # consider all other exceptions as Bad Requests
+        app.logger.exception(e)
+        abort(400, description=debug_error_message("An exception occurred: %s" % e))
+
+    if issues:
+        response[config.ISSUES] = issues
+        response[config.STATUS] = config.STATUS_ERR
+        status = config.VALIDATION_ERROR_STATUS
+    else:
+        response[config.STATUS] = config.STATUS_OK
+        status = 200
+
+    # limit what actually gets sent to minimize bandwidth usage
+    response = marshal_write_response(response, resource)
+
+    return response, last_modified, etag, status
+
+
+def _upsert(resource, payload, lookup):
+    """Inserts the document which a PUT request did not find, with the id
+    given by the request url.
+
+    .. versionadded:: 2.2
+       Factored out of :func:`put_internal`.
+    """
+    resource_def = app.config["DOMAIN"][resource]
+    id = lookup[resource_def["id_field"]]
+    # this guard avoids a bson dependency, which would be needed if we
+    # wanted to use 'isinstance'. Should also be slightly faster.
+    if resource_def["schema"][resource_def["id_field"]].get("type", "") == "objectid":
+        id = str(id)
+    payload[resource_def["id_field"]] = id
+    return post_internal(resource, payl=payload)
@@ -19,7 +19,7 @@ from functools import wraps
 import simplejson as json
 from flask import Response, abort
 from flask import current_app as app
-from flask import make_response, request
+from flask import g, make_response, request
 from markupsafe import escape
 from werkzeug import utils
 
@@ -104,6 +104,9 @@ def _prepare_response(
     :param etag: ETag header value.
     :param status: response status.
 
+    .. versionchanged:: 2.2
+       Support for causal consistency tokens.
+
     .. versionchanged:: 0.7
        Add support for regexes in X_DOMAINS_RE. Closes #660, #974.
        ETag value now surrounded by double quotes. Closes #794.
@@ -252,6 +255,11 @@ def _prepare_response(
         resp.headers.add("X-RateLimit-Limit", str(limit.limit))
         resp.headers.add("X-RateLimit-Reset", str(limit.reset))
 
+    # Causal consistency token of the last write performed by the request
+    causal_token = g.get("causal_token")
+    if causal_token:
+        resp.headers.add(config.CAUSAL_TOKEN_HEADER, causal_token)
+
     return resp
 
 
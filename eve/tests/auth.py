@@ -6,7 +6,8 @@ from bson import ObjectId
 
 import eve
 from eve import Eve
-from eve.auth import BasicAuth, HMACAuth, TokenAuth
+from eve.auth import BasicAuth, HMACAuth, TokenAuth, admin_request
+from eve.exceptions import ConfigException
 from eve.tests import TestBase
 from eve.tests.test_settings import MONGO_DBNAME
 
@@ -169,6 +170,70 @@ class TestBasicAuth(TestBase):
         r = self.test_client.get("/", headers=self.invalid_auth)
         self.assert401(r.status_code)
 
+    def test_query_stats_access(self):
+        self.app.config["QUERY_STATS_ENDPOINT"] = "stats"
+        self.assertRaises(ConfigException, self.app._init_query_stats_endpoint)
+
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        self.app._init_query_stats_endpoint()
+
+        r = self.test_client.get("/stats", headers=self.invalid_auth)
+        self.assert401(r.status_code)
+        r = self.test_client.get("/stats", headers=self.valid_auth)
+        self.assert200(r.status_code)
+
+        # users without ADMIN_ROLES are refused.
+        self.app.config["ADMIN_ROLES"] = ["superuser"]
+        r = self.test_client.get("/stats", headers=self.valid_auth)
+        self.assert401(r.status_code)
+        r = self.test_client.delete("/stats", headers=self.valid_auth)
+        self.assert401(r.status_code)
+
+        # nobody is an administrator without ADMIN_ROLES or authentication.
+        self.app.config["ADMIN_ROLES"] = []
+        r = self.test_client.get("/stats", headers=self.valid_auth)
+        self.assert403(r.status_code)
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        self.app.auth = None
+        r = self.test_client.delete("/stats")
+        self.assert403(r.status_code)
+
+    def test_group_commit_stats_access(self):
+        self.app.config["GROUP_COMMIT_STATS_ENDPOINT"] = "flushes"
+        self.assertRaises(ConfigException, self.app._init_group_commit_stats_endpoint)
+
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        self.app._init_group_commit_stats_endpoint()
+        r = self.test_client.get("/flushes", headers=self.valid_auth)
+        self.assert200(r.status_code)
+
+        self.app.config["ADMIN_ROLES"] = ["superuser"]
+        r = self.test_client.get("/flushes", headers=self.valid_auth)
+        self.assert401(r.status_code)
+        r = self.test_client.delete("/flushes", headers=self.valid_auth)
+        self.assert401(r.status_code)
+
+    def test_admin_request(self):
+        # nobody is an administrator while ADMIN_ROLES is empty.
+        with self.app.test_request_context(headers=self.valid_auth):
+            self.assertFalse(admin_request())
+
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        with self.app.test_request_context(headers=self.valid_auth):
+            self.assertTrue(admin_request())
+        with self.app.test_request_context(headers=self.invalid_auth):
+            self.assertFalse(admin_request())
+
+        self.app.config["ADMIN_ROLES"] = ["superuser"]
+        with self.app.test_request_context(headers=self.valid_auth):
+            self.assertFalse(admin_request())
+
+        # administrative features are never exposed to anonymous clients.
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        self.app.auth = None
+        with self.app.test_request_context():
+            self.assertFalse(admin_request())
+
     def test_unauthorized_resource_access(self):
         r = self.test_client.get(self.known_resource_url, headers=self.invalid_auth)
         self.assert401(r.status_code)
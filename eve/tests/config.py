@@ -60,6 +60,33 @@ class TestConfig(TestBase):
         self.assertEqual(self.app.config["MONGO_QUERY_BLACKLIST"], ["$where", "$regex"])
         self.assertEqual(self.app.config["MONGO_QUERY_WHITELIST"], [])
         self.assertEqual(self.app.config["MONGO_WRITE_CONCERN"], {"w": 1})
+        self.assertEqual(self.app.config["MONGO_QUERY_GUARD"], None)
+        self.assertEqual(self.app.config["MONGO_GUARD_MAX_TIME_MS"], 1000)
+        self.assertEqual(self.app.config["MONGO_INDEX_CACHE_TTL"], 300)
+        self.assertEqual(self.app.config["MONGO_ALLOW_DISK_USE"], False)
+        self.assertEqual(
+            self.app.config["MATERIALIZATIONS_COLLECTION"], "materializations"
+        )
+        self.assertEqual(self.app.config["VALIDATION_ENGINE"], "cerberus")
+        self.assertEqual(self.app.config["BULK_ORDERED"], True)
+        self.assertEqual(self.app.config["BULK_INGEST"], False)
+        self.assertEqual(self.app.config["BULK_INGEST_URL"], "ingest")
+        self.assertEqual(self.app.config["BULK_INGEST_CHUNK_SIZE"], 1000)
+        self.assertEqual(self.app.config["BULK_WRITE"], False)
+        self.assertEqual(self.app.config["BULK_WRITE_URL"], "bulk")
+        self.assertEqual(self.app.config["DIRECT_WRITES"], False)
+        self.assertEqual(self.app.config["PATCH_OPERATORS"], [])
+        self.assertEqual(self.app.config["GROUP_COMMIT"], False)
+        self.assertEqual(self.app.config["GROUP_COMMIT_WINDOW_MS"], 5)
+        self.assertEqual(self.app.config["GROUP_COMMIT_MAX_SIZE"], 100)
+        self.assertEqual(self.app.config["GROUP_COMMIT_STATS_ENDPOINT"], None)
+        self.assertEqual(self.app.config["MONGO_READ_PREFERENCE"], None)
+        self.assertEqual(self.app.config["MONGO_CAUSAL_CONSISTENCY"], False)
+        self.assertEqual(self.app.config["CAUSAL_TOKEN_HEADER"], "X-Causal-Token")
+        self.assertEqual(self.app.config["MONGO_MAX_TIME_MS"], None)
+        self.assertEqual(self.app.config["REQUEST_TIMEOUT_HEADER"], "Request-Timeout")
+        self.assertEqual(self.app.config["MONGO_RETRY_AFTER"], 1)
+        self.assertEqual(self.app.config["MONGO_INDEXED_SOFT_DELETE"], False)
         self.assertEqual(self.app.config["ISSUES"], "_issues")
 
         self.assertEqual(self.app.config["OPLOG"], False)
@@ -79,6 +106,9 @@ class TestConfig(TestBase):
         self.assertEqual(self.app.config["QUERY_MAX_RESULTS"], "max_results")
         self.assertEqual(self.app.config["QUERY_EMBEDDED"], "embedded")
         self.assertEqual(self.app.config["QUERY_AGGREGATION"], "aggregate")
+        self.assertEqual(self.app.config["QUERY_HINT"], "hint")
+        self.assertEqual(self.app.config["QUERY_EXPLAIN"], "explain")
+        self.assertEqual(self.app.config["QUERY_NAMED"], "query")
 
         self.assertEqual(self.app.config["JSON_SORT_KEYS"], False)
         self.assertEqual(self.app.config["SOFT_DELETE"], False)
@@ -86,7 +116,7 @@ class TestConfig(TestBase):
         self.assertEqual(self.app.config["SHOW_DELETED_PARAM"], "show_deleted")
         self.assertEqual(
             self.app.config["STANDARD_ERRORS"],
-            [400, 401, 403, 404, 405, 406, 409, 410, 412, 422, 428, 429],
+            [400, 401, 403, 404, 405, 406, 409, 410, 412, 422, 428, 429, 503],
         )
         self.assertEqual(self.app.config["UPSERT_ON_PUT"], True)
         self.assertEqual(
@@ -276,6 +306,52 @@ class TestConfig(TestBase):
         self.assertEqual(
             settings["mongo_write_concern"], self.app.config["MONGO_WRITE_CONCERN"]
         )
+        self.assertEqual(
+            settings["mongo_query_guard"], self.app.config["MONGO_QUERY_GUARD"]
+        )
+        self.assertEqual(
+            settings["mongo_guard_max_time_ms"],
+            self.app.config["MONGO_GUARD_MAX_TIME_MS"],
+        )
+        self.assertEqual(
+            settings["mongo_allow_disk_use"], self.app.config["MONGO_ALLOW_DISK_USE"]
+        )
+        self.assertEqual(
+            settings["mongo_read_preference"], self.app.config["MONGO_READ_PREFERENCE"]
+        )
+        self.assertEqual(
+            settings["mongo_causal_consistency"],
+            self.app.config["MONGO_CAUSAL_CONSISTENCY"],
+        )
+        self.assertEqual(
+            settings["mongo_max_time_ms"], self.app.config["MONGO_MAX_TIME_MS"]
+        )
+        self.assertEqual(
+            settings["mongo_indexed_soft_delete"],
+            self.app.config["MONGO_INDEXED_SOFT_DELETE"],
+        )
+        self.assertEqual(
+            settings["validation_engine"], self.app.config["VALIDATION_ENGINE"]
+        )
+        self.assertEqual(settings["bulk_ordered"], self.app.config["BULK_ORDERED"])
+        self.assertEqual(settings["bulk_ingest"], self.app.config["BULK_INGEST"])
+        self.assertEqual(
+            settings["bulk_ingest_chunk_size"],
+            self.app.config["BULK_INGEST_CHUNK_SIZE"],
+        )
+        self.assertEqual(settings["bulk_write"], self.app.config["BULK_WRITE"])
+        self.assertEqual(settings["direct_writes"], self.app.config["DIRECT_WRITES"])
+        self.assertEqual(
+            settings["patch_operators"], self.app.config["PATCH_OPERATORS"]
+        )
+        self.assertEqual(settings["group_commit"], self.app.config["GROUP_COMMIT"])
+        self.assertEqual(
+            settings["group_commit_window_ms"],
+            self.app.config["GROUP_COMMIT_WINDOW_MS"],
+        )
+        self.assertEqual(
+            settings["group_commit_max_size"], self.app.config["GROUP_COMMIT_MAX_SIZE"]
+        )
         self.assertEqual(settings["resource_title"], settings["url"])
 
         self.assertNotEqual(settings["schema"], None)
@@ -422,6 +498,253 @@ class TestConfig(TestBase):
             ConfigException, self.app.register_resource, resource, settings
         )
 
+    def test_mongo_query_guard(self):
+        resource = "resource"
+        settings = {"mongo_query_guard": "fail"}
+        self.assertRaises(
+            ConfigException, self.app.register_resource, resource, settings
+        )
+
+        settings = {"mongo_query_guard": "reject"}
+        self.app.register_resource(resource, settings)
+        self.assertEqual(self.domain[resource]["mongo_query_guard"], "reject")
+
+    def test_mongo_read_preference(self):
+        resource = "resource"
+        for preference in (
+            "secondaryFirst",
+            {"mode": "primary", "max_staleness_seconds": 90},
+            {"mode": "secondary", "max_staleness": 90},
+            {"find": "secondary", "insert": "secondary"},
+        ):
+            settings = {"mongo_read_preference": preference}
+            self.assertRaises(
+                ConfigException, self.app.register_resource, resource, settings
+            )
+
+        preference = {
+            "find": {"mode": "secondaryPreferred", "max_staleness_seconds": 90},
+            "find_one": "primary",
+        }
+        settings = {"mongo_read_preference": preference}
+        self.app.register_resource(resource, settings)
+        self.assertEqual(self.domain[resource]["mongo_read_preference"], preference)
+
+    def test_mongo_max_time_ms(self):
+        resource = "resource"
+        for budget in (0, "1000", {"find": -1}, {"insert": 1000}):
+            settings = {"mongo_max_time_ms": budget}
+            self.assertRaises(
+                ConfigException, self.app.register_resource, resource, settings
+            )
+
+        settings = {"mongo_max_time_ms": {"find": 500, "count": 1000}}
+        self.app.register_resource(resource, settings)
+        self.assertEqual(
+            self.domain[resource]["mongo_max_time_ms"], {"find": 500, "count": 1000}
+        )
+
+    def test_datasource_hints(self):
+        resource = "resource"
+        indexes = {"name": [("name", 1)]}
+        for hints in (
+            "name",
+            [{"fields": ["name"]}],
+            [{"index": "missing"}],
+            [{"index": "name", "sort": "name"}],
+            [{"index": "name", "limit": 1}],
+        ):
+            settings = {"datasource": {"hints": hints}, "mongo_indexes": indexes}
+            self.assertRaises(
+                ConfigException, self.app.register_resource, resource, settings
+            )
+
+        hints = [{"index": "name", "fields": ["name"], "sort": ["name"]}]
+        settings = {"datasource": {"hints": hints}, "mongo_indexes": indexes}
+        self.app.register_resource(resource, settings)
+        self.assertEqual(self.domain[resource]["datasource"]["hints"], hints)
+
+    def test_aggregation_pagination(self):
+        resource = "resource"
+        aggregation = {"pipeline": [{"$match": {"x": "$x"}}], "pagination": "page"}
+        settings = {"datasource": {"aggregation": aggregation}}
+        self.assertRaises(
+            ConfigException, self.app.register_resource, resource, settings
+        )
+
+        aggregation = {"pipeline": [{"$match": {"x": "$x"}}]}
+        settings = {"datasource": {"aggregation": aggregation}}
+        self.app.register_resource(resource, settings)
+        aggregation = self.domain[resource]["datasource"]["aggregation"]
+        self.assertEqual(aggregation["pagination"], "facet")
+        self.assertEqual(aggregation["count"], True)
+        self.assertEqual(aggregation["count_cache_ttl"], 0)
+        self.assertEqual(self.domain[resource]["_aggregation"].placeholders, {"$x"})
+
+    def test_aggregation_materialize(self):
+        resource = "resource"
+        pipeline = [{"$group": {"_id": "$x"}}]
+        for materialize in (
+            {"pipeline": pipeline, "mode": "replace"},
+            {"pipeline": pipeline + [{"$out": "other"}]},
+            {"pipeline": pipeline, "refresh_on": "contacts"},
+        ):
+            aggregation = {"pipeline": [], "materialize": materialize}
+            settings = {"datasource": {"aggregation": aggregation}}
+            self.assertRaises(
+                ConfigException, self.app.register_resource, resource, settings
+            )
+
+        aggregation = {"pipeline": [], "materialize": {"pipeline": pipeline}}
+        settings = {"datasource": {"aggregation": aggregation}}
+        self.app.register_resource(resource, settings)
+        materialize = self.domain[resource]["datasource"]["aggregation"]["materialize"]
+        self.assertEqual(materialize["collection"], "resource_materialized")
+        self.assertEqual(materialize["mode"], "out")
+        self.assertEqual(materialize["refresh"], None)
+        self.assertEqual(materialize["refresh_on"], None)
+        self.assertEqual(self.app.config["MATERIALIZED"]["resource"], ["resource"])
+
+        # writes on the 'refresh_on' resources invalidate the results.
+        materialize = {"pipeline": pipeline, "refresh_on": ["contacts"]}
+        aggregation = {"pipeline": [], "materialize": materialize}
+        settings = {"datasource": {"aggregation": aggregation}}
+        self.app.register_resource(resource, settings)
+        self.assertNotIn("resource", self.app.config["MATERIALIZED"])
+        self.assertEqual(self.app.config["MATERIALIZED"]["contacts"], ["resource"])
+
+    def test_validation_engine(self):
+        resource = "resource"
+        schema = {"name": {"type": "string"}, "tags": {"type": "list"}}
+        settings = {"schema": schema, "validation_engine": "fast"}
+        self.assertRaises(
+            ConfigException, self.app.register_resource, resource, settings
+        )
+
+        settings = {"schema": schema, "validation_engine": "compiled"}
+        self.app.register_resource(resource, settings)
+        compiled = self.domain[resource]["_compiled_schema"]
+        self.assertTrue(compiled.schema is self.domain[resource]["schema"])
+        self.assertEqual(set(compiled.compiled), set(["name", "tags", "_id"]))
+        self.assertEqual(compiled.delegated, {})
+
+    def test_bulk_ingest(self):
+        resource = "resource"
+        for chunk_size in (0, -1, "10", True):
+            settings = {"bulk_ingest": True, "bulk_ingest_chunk_size": chunk_size}
+            self.assertRaises(
+                ConfigException, self.app.register_resource, resource, settings
+            )
+
+        settings = {
+            "resource_methods": ["GET", "POST"],
+            "bulk_ingest": True,
+            "bulk_ingest_chunk_size": 10,
+        }
+        self.app.register_resource(resource, settings)
+        map_adapter = self.app.url_map.bind("")
+        url = "/%s/%s" % (resource, self.app.config["BULK_INGEST_URL"])
+        self.assertTrue(map_adapter.test(url, "POST"))
+        self.assertFalse(map_adapter.test(url, "GET"))
+
+    def test_group_commit(self):
+        resource = "resource"
+        for settings in (
+            {"group_commit_window_ms": -1},
+            {"group_commit_window_ms": "5"},
+            {"group_commit_max_size": 0},
+            {"group_commit_max_size": True},
+        ):
+            settings.update(group_commit=True)
+            self.assertRaises(
+                ConfigException, self.app.register_resource, resource, settings
+            )
+
+        settings = {
+            "group_commit": True,
+            "group_commit_window_ms": 0.5,
+            "group_commit_max_size": 10,
+        }
+        self.app.register_resource(resource, settings)
+        self.assertEqual(self.domain[resource]["group_commit_window_ms"], 0.5)
+
+    def test_bulk_write(self):
+        resource = "resource"
+        settings = {"item_methods": ["GET", "PATCH", "DELETE"], "bulk_write": True}
+        self.app.register_resource(resource, settings)
+        map_adapter = self.app.url_map.bind("")
+        url = "/%s/%s" % (resource, self.app.config["BULK_WRITE_URL"])
+        self.assertTrue(map_adapter.test(url, "PATCH"))
+        self.assertTrue(map_adapter.test(url, "DELETE"))
+        self.assertFalse(map_adapter.test(url, "PUT"))
+
+        resource = "readonly"
+        settings = {"item_methods": ["GET"], "bulk_write": True}
+        self.app.register_resource(resource, settings)
+        map_adapter = self.app.url_map.bind("")
+        url = "/%s/%s" % (resource, self.app.config["BULK_WRITE_URL"])
+        self.assertFalse(map_adapter.test(url, "PATCH"))
+
+    def test_direct_writes(self):
+        schema = {"name": {"type": "string"}}
+        self.app.register_resource("resource", {"schema": schema})
+        self.assertEqual(self.domain["resource"]["_direct_writes"], ())
+
+        settings = {"direct_writes": True, "schema": schema}
+        self.app.register_resource("resource", settings)
+        self.assertEqual(
+            set(self.domain["resource"]["_direct_writes"]), {"PATCH", "PUT", "DELETE"}
+        )
+
+        for settings in (
+            {"versioning": True},
+            {"soft_delete": True},
+            {"schema": {"name": {"type": "string", "readonly": True}}},
+        ):
+            settings.update(direct_writes=True)
+            settings.setdefault("schema", schema)
+            self.app.register_resource("resource", settings)
+            self.assertEqual(self.domain["resource"]["_direct_writes"], ())
+
+        settings = {
+            "direct_writes": True,
+            "auth_field": "owner",
+            "schema": {"name": {"type": "string", "default": "a"}},
+        }
+        self.app.register_resource("resource", settings)
+        self.assertEqual(self.domain["resource"]["_direct_writes"], ("DELETE",))
+
+    def test_patch_operators(self):
+        schema = {"qty": {"type": "integer"}}
+        settings = {"patch_operators": ["$inc", "$push"], "schema": schema}
+        self.app.register_resource("resource", settings)
+        self.assertEqual(self.domain["resource"]["patch_operators"], ["$inc", "$push"])
+
+        settings = {"patch_operators": ["$set"], "schema": schema}
+        self.assertRaises(
+            ConfigException, self.app.register_resource, "resource", settings
+        )
+
+    def test_named_queries(self):
+        resource = "resource"
+        for queries in (
+            {"q": {"query": {"$where": "this.a > 1"}}},
+            {"q": {"query": {"a": "$a"}, "params": {"a": {"type": "set"}}}},
+            {"q": {"query": {"a": "$page"}, "params": {"page": {"type": "integer"}}}},
+        ):
+            settings = {"named_queries": queries}
+            self.assertRaises(
+                ConfigException, self.app.register_resource, resource, settings
+            )
+
+        queries = {"q": {"query": {"a": "$a"}, "params": {"a": {"type": "string"}}}}
+        with self.assertLogs(self.app.logger, "WARNING"):
+            self.app.register_resource(resource, {"named_queries": queries})
+        self.assertEqual(
+            self.domain[resource]["_named_queries"]["q"].render({"a": "x"}),
+            {"a": "x"},
+        )
+
     def test_oplog_config(self):
 
         # if OPLOG_ENDPOINT is enabled the endoint is included with the domain
@@ -11,6 +11,7 @@ from eve import Eve
 from eve.io.base import BaseJSONEncoder
 from eve.io.mongo import Validator
 from eve.tests import TestBase, TestMinimal
+from eve.tests.auth import ValidBasicAuth
 from eve.tests.test_settings import (MONGO_DBNAME, MONGO_PASSWORD,
                                      MONGO_USERNAME)
 from eve.utils import config
@@ -352,6 +353,89 @@ class TestEndPoints(TestBase):
         _, status_code = self.delete(known_schema_path)
         self.assert405(status_code)
 
+    def test_query_stats_endpoint(self):
+        r = self.test_client.get("/stats")
+        self.assert404(r.status_code)
+
+        self.app.config["QUERY_STATS"] = True
+        self.app.config["QUERY_STATS_ENDPOINT"] = "stats"
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        self.app._init_query_stats_endpoint()
+
+        for _ in range(2):
+            self.get(self.known_resource, '?where={"prog": 1}&sort=[("ref", 1)]')
+        self.get(self.known_resource, item=self.item_id)
+
+        self.app.auth = ValidBasicAuth()
+        admin = [("Authorization", "Basic YWRtaW46c2VjcmV0")]
+        r = self.test_client.get("/stats", headers=admin)
+        self.assert200(r.status_code)
+        report = json.loads(r.data)
+        shapes = report["_items"]
+        finds = [s for s in shapes if s["method"] == "find"]
+        self.assertTrue(finds)
+        find = finds[0]
+        self.assertEqual(find["resource"], self.known_resource)
+        self.assertEqual(find["filter"], {"prog": 1})
+        self.assertEqual(find["sort"], [["ref", 1]])
+        self.assertEqual(find["count"], 2)
+        self.assertEqual(sum(find["histogram"].values()), 2)
+        self.assertEqual(find["suggested_index"], [["prog", 1], ["ref", 1]])
+        self.assertTrue(
+            "prog_1_ref_1" in report["_suggested_indexes"][self.known_resource]
+        )
+        self.assertTrue([s for s in shapes if s["method"] == "find_one"])
+
+        # ranked by total time
+        totals = [s["total_ms"] for s in shapes]
+        self.assertEqual(totals, sorted(totals, reverse=True))
+
+        r = self.test_client.get(
+            "/stats?resource=%s" % self.different_resource, headers=admin
+        )
+        self.assertEqual(json.loads(r.data)["_items"], [])
+
+        r = self.test_client.delete("/stats", headers=admin)
+        self.assert204(r.status_code)
+        r = self.test_client.get("/stats", headers=admin)
+        self.assertEqual(json.loads(r.data)["_items"], [])
+
+    def test_group_commit_stats_endpoint(self):
+        r = self.test_client.get("/flushes")
+        self.assert404(r.status_code)
+
+        self.app.config["GROUP_COMMIT_STATS_ENDPOINT"] = "flushes"
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        self.app._init_group_commit_stats_endpoint()
+        self.app.register_resource(
+            "grouped",
+            {
+                "resource_methods": ["GET", "POST"],
+                "group_commit": True,
+                "group_commit_window_ms": 0,
+                "schema": {"code": {"type": "string"}},
+            },
+        )
+        for code in "ab":
+            _, status = self.post("grouped", data={"code": code})
+            self.assert201(status)
+
+        self.app.auth = ValidBasicAuth()
+        admin = [("Authorization", "Basic YWRtaW46c2VjcmV0")]
+        r = self.test_client.get("/flushes?resource=grouped", headers=admin)
+        self.assert200(r.status_code)
+        report = json.loads(r.data)["_items"]
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]["resource"], "grouped")
+        self.assertEqual(report[0]["flushes"], 2)
+        self.assertEqual(report[0]["documents"], 2)
+        self.assertEqual(sum(report[0]["histogram"].values()), 2)
+
+        r = self.test_client.delete("/flushes", headers=admin)
+        self.assert204(r.status_code)
+        r = self.test_client.get("/flushes", headers=admin)
+        self.assertEqual(json.loads(r.data)["_items"], [])
+
     def test_schema_endpoint_does_not_attempt_callable_serialization(self):
         self.domain[self.known_resource]["schema"]["lambda"] = {
             "type": "boolean",
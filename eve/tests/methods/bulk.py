@@ -0,0 +1,158 @@
+import simplejson as json
+from bson import ObjectId
+
+from eve import ETAG, STATUS, STATUS_ERR, STATUS_OK
+from eve.tests import TestBase
+from eve.tests.utils import DummyEvent
+
+
+class TestBulkWrite(TestBase):
+    def setUp(self):
+        super().setUp()
+        self.app.register_resource(
+            "bulky",
+            {
+                "resource_methods": ["GET", "POST"],
+                "item_methods": ["GET", "PATCH", "PUT", "DELETE"],
+                "bulk_write": True,
+                "versioning": True,
+                "schema": {
+                    "code": {"type": "string", "required": True},
+                    "qty": {"type": "integer"},
+                },
+            },
+        )
+        self.bulk_url = "bulky/%s" % self.app.config["BULK_WRITE_URL"]
+        r = self.test_client.post(
+            "bulky",
+            data=json.dumps([{"code": code, "qty": 1} for code in "abc"]),
+            content_type="application/json",
+        )
+        self.assert201(r.status_code)
+        self.documents = json.loads(r.get_data())["_items"]
+
+    def bulk(self, method, data):
+        r = self.test_client.open(
+            self.bulk_url,
+            method=method,
+            data=json.dumps(data),
+            content_type="application/json",
+        )
+        return json.loads(r.get_data()), r.status_code
+
+    def operation(self, index, changes=None, etag=None):
+        document = self.documents[index]
+        operation = {"_id": document["_id"], ETAG: etag or document[ETAG]}
+        if changes is not None:
+            operation["changes"] = changes
+        return operation
+
+    def stored(self, index):
+        return self.app.data.driver.db["bulky"].find_one(
+            {"_id": ObjectId(self.documents[index]["_id"])}
+        )
+
+    def test_bulk_write_disabled(self):
+        r = self.test_client.patch(
+            "%s/%s" % (self.known_resource_url, self.app.config["BULK_WRITE_URL"]),
+            data="[]",
+            content_type="application/json",
+        )
+        self.assert404(r.status_code)
+
+    def test_bulk_patch(self):
+        response, status = self.bulk(
+            "PATCH",
+            [
+                self.operation(0, {"qty": 10}),
+                self.operation(1, {"qty": 10}, etag="stale"),
+                self.operation(2, {"qty": "x"}),
+            ],
+        )
+        self.assert200(status)
+        items = response["_items"]
+        self.assertEqual(
+            [item[STATUS] for item in items], [STATUS_OK, STATUS_ERR, STATUS_ERR]
+        )
+        self.assertEqual(items[1]["_error"]["code"], 412)
+        self.assertValidationError(items[2], {"qty": "must be of integer type"})
+
+        document = self.stored(0)
+        self.assertEqual(document["qty"], 10)
+        self.assertEqual(document[ETAG], items[0][ETAG])
+        self.assertEqual(self.stored(1)["qty"], 1)
+        self.assertEqual(self.stored(2)["qty"], 1)
+        self.assertEqual(
+            self.app.data.driver.db["bulky_versions"].count_documents(
+                {"_id_document": document["_id"]}
+            ),
+            2,
+        )
+
+    def test_bulk_patch_operators(self):
+        self.domain["bulky"]["patch_operators"] = ["$inc"]
+        response, status = self.bulk(
+            "PATCH",
+            [self.operation(0, {"qty": 10}), self.operation(1, {"$inc": {"qty": 1}})],
+        )
+        self.assert200(status)
+        items = response["_items"]
+        self.assertEqual(items[0][STATUS], STATUS_OK)
+        self.assertValidationError(
+            items[1], {"$inc": "update operators are not supported by bulk writes"}
+        )
+        self.assertEqual(self.stored(1)["qty"], 1)
+
+    def test_bulk_put(self):
+        response, status = self.bulk(
+            "PUT", [self.operation(0, {"code": "z"}), self.operation(1, {"qty": 2})]
+        )
+        self.assert200(status)
+        items = response["_items"]
+        self.assertEqual(items[0][STATUS], STATUS_OK)
+        self.assertValidationError(items[1], {"code": "required field"})
+        document = self.stored(0)
+        self.assertEqual(document["code"], "z")
+        self.assertTrue("qty" not in document)
+
+    def test_bulk_delete(self):
+        response, status = self.bulk(
+            "DELETE", [self.operation(0), self.operation(1, etag="stale")]
+        )
+        self.assert200(status)
+        self.assertEqual(
+            [item[STATUS] for item in response["_items"]], [STATUS_OK, STATUS_ERR]
+        )
+        self.assertEqual(self.stored(0), None)
+        self.assertNotEqual(self.stored(1), None)
+        self.assertEqual(
+            self.app.data.driver.db["bulky_versions"].count_documents(
+                {"_id_document": ObjectId(self.documents[0]["_id"])}
+            ),
+            0,
+        )
+
+    def test_bulk_write_failure(self):
+        response, status = self.bulk(
+            "PATCH",
+            [
+                self.operation(0, {"qty": 10}, etag="stale"),
+                {"_id": str(ObjectId()), ETAG: "etag", "changes": {}},
+            ],
+        )
+        self.assertEqual(status, 422)
+        self.assertEqual(response[STATUS], STATUS_ERR)
+        self.assertEqual(
+            [item["_error"]["code"] for item in response["_items"]], [412, 404]
+        )
+
+    def test_bulk_write_etag_required(self):
+        response, status = self.bulk("DELETE", [{"_id": self.documents[0]["_id"]}])
+        self.assertEqual(status, 428)
+        self.assertNotEqual(self.stored(0), None)
+
+    def test_bulk_write_callbacks(self):
+        updated = DummyEvent(lambda: True)
+        self.app.on_updated_bulky += updated
+        self.bulk("PATCH", [self.operation(0, {"qty": 10})])
+        self.assertEqual(updated.called[0]["qty"], 10)
@@ -4,6 +4,7 @@ import simplejson as json
 from bson import ObjectId
 
 from eve import ETAG
+from eve.io.mongo import backfill_soft_delete, soft_delete_filter
 from eve.methods.delete import deleteitem_internal
 from eve.tests import TestBase
 from eve.tests.test_settings import MONGO_DBNAME
@@ -250,6 +251,24 @@ class TestDelete(TestBase):
         r = self.test_client.get(self.item_id_url)
         self.assert404(r.status_code)
 
+    def test_delete_direct_write(self):
+        schema = {"name": {"type": "string"}}
+        self.app.register_resource("direct", {"direct_writes": True, "schema": schema})
+        deleted = DummyEvent(lambda: True)
+        self.app.on_deleted_item_direct += deleted
+        r, status = self.post("direct", data={"name": "a"})
+        url = "direct/%s" % r["_id"]
+        etag = r[ETAG]
+
+        r, status = self.delete(url, headers=[("If-Match", "stale")])
+        self.assert412(status)
+
+        r, status = self.delete(url, headers=[("If-Match", etag)])
+        self.assert204(status)
+        self.assertEqual(deleted.called[0]["name"], "a")
+        r = self.test_client.get(url)
+        self.assert404(r.status_code)
+
     def delete(self, url, headers=None):
         r = self.test_client.delete(url, headers=headers)
         return self.parse_response(r)
@@ -666,6 +685,78 @@ class TestSoftDelete(TestDelete):
         self.assert201(status)
 
 
+class TestIndexedSoftDelete(TestSoftDelete):
+    """Soft delete tests, with 'mongo_indexed_soft_delete' enabled."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.app.config["MONGO_INDEXED_SOFT_DELETE"] = True
+        domain = copy.copy(self.domain)
+        for resource, settings in domain.items():
+            del settings["mongo_indexed_soft_delete"]
+            self.app.register_resource(resource, settings)
+            # the fixtures predate soft delete.
+            backfill_soft_delete(self.app, resource)
+
+    def test_soft_delete_filter(self):
+        with self.app.test_request_context():
+            self.assertEqual(
+                soft_delete_filter(self.known_resource), {self.deleted_field: False}
+            )
+
+    def test_backfill(self):
+        db = self.connection[MONGO_DBNAME]
+        missing = {self.deleted_field: {"$exists": False}}
+        self.assertEqual(db.contacts.count_documents(missing), 0)
+
+        # documents missing the field are hidden until they are backfilled.
+        _id = db.contacts.insert_one({"ref": "1234567890123456789012345"}).inserted_id
+        _, status = self.get(self.known_resource, item=str(_id))
+        self.assert404(status)
+        self.assertEqual(backfill_soft_delete(self.app, self.known_resource), 1)
+        self.assertEqual(db.contacts.find_one({"_id": _id})[self.deleted_field], False)
+
+        _, status = self.get(self.known_resource, item=str(_id))
+        self.assert200(status)
+
+        # documents of other resources sharing the collection are left alone.
+        self.app.register_resource(
+            "filtered",
+            {
+                "soft_delete": True,
+                "datasource": {"source": "contacts", "filter": {"prog": 1}},
+                "schema": {"ref": {"type": "string"}},
+            },
+        )
+        _id = db.contacts.insert_one({"prog": 2}).inserted_id
+        self.assertEqual(backfill_soft_delete(self.app, "filtered"), 0)
+        self.assertTrue(self.deleted_field not in db.contacts.find_one({"_id": _id}))
+
+    def test_partial_indexes(self):
+        self.app.register_resource(
+            "partial",
+            {
+                "schema": {
+                    "name": {"type": "string"},
+                    "code": {"type": "string", "unique": True},
+                },
+                "mongo_indexes": {"name": [("name", 1)]},
+            },
+        )
+
+        db = self.connection[MONGO_DBNAME]
+        indexes = db.partial.index_information()
+        self.assertEqual(
+            indexes["name"]["partialFilterExpression"], {self.deleted_field: False}
+        )
+        self.assertEqual(indexes["code_unique"]["unique"], True)
+        self.assertEqual(
+            indexes["code_unique"]["partialFilterExpression"],
+            {self.deleted_field: False, "code": {"$exists": True}},
+        )
+
+
 class TestResourceSpecificSoftDelete(TestBase):
     def setUp(self):
         super().setUp()
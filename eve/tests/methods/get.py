@@ -9,8 +9,10 @@ from bson.dbref import DBRef
 from bson.son import SON
 from werkzeug.datastructures import ImmutableMultiDict, MultiDict
 
+from eve.io.mongo import compile_named_queries
 from eve.methods.get import get_internal, getitem_internal
 from eve.tests import TestBase
+from eve.tests.auth import ValidBasicAuth
 from eve.tests.test_settings import MONGO_DBNAME
 from eve.tests.utils import DummyEvent
 from eve.utils import date_to_rfc1123, str_to_date
@@ -1778,6 +1780,68 @@ class TestGet(TestBase):
         items = response["_items"]
         self.assertEqual(len(items), num)
 
+    def test_get_aggregation_cursor_pagination(self):
+        _db = self.connection[MONGO_DBNAME]
+
+        num = 60
+        _db.aggregate_test.insert_many([{"x": x} for x in range(num)])
+
+        self.app.register_resource(
+            "aggregate_test",
+            {
+                "datasource": {
+                    "aggregation": {
+                        "pipeline": [{"$sort": SON([("x", -1)])}],
+                        "pagination": "cursor",
+                        "count_cache_ttl": 60,
+                    }
+                }
+            },
+        )
+
+        response, status = self.get("aggregate_test")
+        self.assert200(status)
+        self.assertNextLink(response["_links"], 2)
+        self.assertLastLink(response["_links"], 3)
+        self.assertPagination(response, 1, num, 25)
+        items = response["_items"]
+        self.assertEqual(len(items), 25)
+        self.assertEqual(items[0]["x"], num - 1)
+
+        # the count is cached.
+        _db.aggregate_test.insert_one({"x": num})
+        response, status = self.get("aggregate_test?page=2")
+        self.assert200(status)
+        self.assertPagination(response, 2, num, 25)
+        self.assertEqual(response["_items"][0]["x"], num - 25)
+
+        # the count of the last page is inferred from its documents.
+        response, status = self.get("aggregate_test?page=3")
+        self.assert200(status)
+        self.assertLastLink(response["_links"], None)
+        self.assertPagination(response, 3, num + 1, 25)
+        self.assertEqual(len(response["_items"]), num + 1 - 50)
+
+        # counts are cached along with the options which can change them.
+        pipeline = self.domain["aggregate_test"]["datasource"]["aggregation"][
+            "pipeline"
+        ]
+        count = self.app.data.aggregate_count
+        with self.app.test_request_context():
+            self.assertEqual(count("aggregate_test", pipeline, {}), num)
+            self.assertEqual(count("aggregate_test", pipeline, {"maxTimeMS": 500}), num)
+            collation = {"collation": {"locale": "en"}}
+            self.assertEqual(count("aggregate_test", pipeline, collation), num + 1)
+
+        # the count can be skipped.
+        self.domain["aggregate_test"]["datasource"]["aggregation"]["count"] = False
+        response, status = self.get("aggregate_test?page=2")
+        self.assert200(status)
+        self.assertNotIn("total", response["_meta"])
+        self.assertNextLink(response["_links"], 3)
+        self.assertLastLink(response["_links"], None)
+        self.assertEqual(len(response["_items"]), 25)
+
     def test_get_query_bitwise_query_operators(self):
         del self.domain["contacts"]["schema"]["ref"]["required"]
         response, status = self.delete(self.known_resource_url)
@@ -1799,6 +1863,68 @@ class TestGet(TestBase):
         items = response["_items"]
         self.assertEqual(0, len(items))
 
+    def test_get_named_query(self):
+        queries = {
+            "by_prog": {
+                "query": {"prog": {"$lt": "$max"}},
+                "params": {"max": {"type": "integer"}},
+            }
+        }
+        resource_def = self.domain[self.known_resource]
+        resource_def["named_queries"] = queries
+        resource_def["_named_queries"] = compile_named_queries(queries, ["$lt"])
+
+        response, status = self.get(self.known_resource, "?query=by_prog&max=5")
+        self.assert200(status)
+        self.assertEqual(response["_meta"]["total"], 5)
+        self.assertTrue("query=by_prog" in response["_links"]["self"]["href"])
+
+        for query in (
+            "?query=unknown",
+            "?query=by_prog",
+            "?query=by_prog&max=x",
+            '?query=by_prog&max=5&where={"prog": 1}',
+        ):
+            _, status = self.get(self.known_resource, query)
+            self.assert400(status)
+
+    def test_get_explain(self):
+        query = '?explain=1&where={"prog": {"$lt": 5}}&sort=-prog&max_results=2'
+
+        # ignored without administrative access.
+        response, status = self.get(self.known_resource, query)
+        self.assert200(status)
+        self.assertEqual(len(response["_items"]), 2)
+
+        # ignored for authenticated users while ADMIN_ROLES is empty.
+        self.app.auth = ValidBasicAuth()
+        auth = [("Authorization", "Basic YWRtaW46c2VjcmV0")]
+        r = self.test_client.get(self.known_resource_url + query, headers=auth)
+        response, status = self.parse_response(r)
+        self.assert200(status)
+        self.assertEqual(len(response["_items"]), 2)
+        self.assertTrue("find" not in response)
+
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        r = self.test_client.get(self.known_resource_url + query, headers=auth)
+        response, status = self.parse_response(r)
+        self.assert200(status)
+        self.assertTrue(self.app.config["ITEMS"] not in response)
+
+        find = response["find"]
+        self.assertEqual(find["find"], "contacts")
+        self.assertEqual(find["filter"]["prog"], {"$lt": 5})
+        self.assertEqual(find["sort"], {"prog": -1})
+        self.assertEqual(find["limit"], 2)
+        self.assertEqual(find["explain"]["executionStats"]["nReturned"], 2)
+
+        count = response["count"]
+        self.assertEqual(count["pipeline"][0]["$match"], find["filter"])
+        self.assertEqual(count["explain"]["ok"], 1)
+
+        for phase in ("query", "find", "count"):
+            self.assertTrue(response["timings"][phase] >= 0)
+
     def assertGet(self, response, status, resource=None):
         self.assert200(status)
 
@@ -2196,6 +2322,27 @@ class TestGetItem(TestBase):
         response, status = self.get("products", item=sku)
         self.assertItemResponse(response, status, "products")
 
+    def test_getitem_explain(self):
+        response, status = self.get(self.known_resource, "?explain=1", self.item_id)
+        self.assertItemResponse(response, status)
+
+        # ignored for authenticated users while ADMIN_ROLES is empty.
+        self.app.auth = ValidBasicAuth()
+        auth = [("Authorization", "Basic YWRtaW46c2VjcmV0")]
+        r = self.test_client.get(self.item_id_url + "?explain=1", headers=auth)
+        response, status = self.parse_response(r)
+        self.assertItemResponse(response, status)
+        self.assertTrue("find" not in response)
+
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        r = self.test_client.get(self.item_id_url + "?explain=1", headers=auth)
+        response, status = self.parse_response(r)
+        self.assert200(status)
+        self.assertEqual(response["find"]["filter"]["_id"], self.item_id)
+        self.assertEqual(response["find"]["limit"], 1)
+        self.assertEqual(response["find"]["explain"]["executionStats"]["nReturned"], 1)
+        self.assertTrue("count" not in response)
+
 
 class TestHead(TestBase):
     def test_head_home(self):
@@ -0,0 +1,138 @@
+import simplejson as json
+from bson import ObjectId
+from flask import abort
+
+from eve import ISSUES, STATUS, STATUS_ERR, STATUS_OK
+from eve.tests import TestBase
+from eve.tests.utils import DummyEvent
+
+
+class TestIngest(TestBase):
+    def setUp(self):
+        super().setUp()
+        self.app.register_resource(
+            "ingested",
+            {
+                "resource_methods": ["GET", "POST"],
+                "bulk_ingest": True,
+                "bulk_ingest_chunk_size": 2,
+                "versioning": True,
+                "schema": {
+                    "code": {"type": "string", "required": True},
+                    "qty": {"type": "integer"},
+                },
+                "mongo_indexes": {"code": ([("code", 1)], {"unique": True})},
+            },
+        )
+        self.ingest_url = "ingested/%s" % self.app.config["BULK_INGEST_URL"]
+
+    def ingest(self, data, content_type="application/x-ndjson"):
+        r = self.test_client.post(
+            self.ingest_url, data=data, headers=[("Content-Type", content_type)]
+        )
+        lines = [json.loads(line) for line in r.get_data().splitlines()]
+        return lines, r.status_code, r.mimetype
+
+    def test_ingest_disabled(self):
+        r = self.test_client.post(
+            "%s/%s" % (self.known_resource_url, self.app.config["BULK_INGEST_URL"]),
+            data="{}",
+            headers=[("Content-Type", "application/x-ndjson")],
+        )
+        self.assert404(r.status_code)
+
+    def test_ingest_ndjson(self):
+        data = "\n".join(
+            [
+                json.dumps({"code": "a", "qty": 1}),
+                "",
+                json.dumps({"code": "b", "qty": "x"}),
+                "not json",
+                json.dumps({"code": "c"}),
+                json.dumps({"code": "a"}),
+            ]
+        )
+        lines, status, mimetype = self.ingest(data)
+        self.assert200(status)
+        self.assertEqual(mimetype, "application/x-ndjson")
+
+        chunks, summary = lines[:-1], lines[-1]
+        self.assertEqual([chunk["chunk"] for chunk in chunks], [0, 1, 2])
+        self.assertEqual([chunk["offset"] for chunk in chunks], [0, 2, 4])
+        items = [item for chunk in chunks for item in chunk["_items"]]
+        self.assertEqual(
+            [item[STATUS] for item in items],
+            [STATUS_OK, STATUS_ERR, STATUS_ERR, STATUS_OK, STATUS_ERR],
+        )
+        self.assertValidationError(items[1], {"qty": "must be of integer type"})
+        self.assertTrue("Invalid JSON" in items[2][ISSUES]["exception"])
+        self.assertEqual(items[4][ISSUES], {"exception": "Duplicate key error"})
+        self.assertEqual(
+            summary,
+            {STATUS: STATUS_ERR, "received": 5, "inserted": 2, "failed": 3},
+        )
+
+        collection = self.app.data.driver.db["ingested"]
+        self.assertEqual(collection.count_documents({}), 2)
+        document = collection.find_one({"_id": ObjectId(items[0]["_id"])})
+        self.assertEqual(document["code"], "a")
+        self.assertTrue(self.app.config["ETAG"] in document)
+        self.assertEqual(
+            self.app.data.driver.db["ingested_versions"].count_documents({}), 2
+        )
+
+    def test_ingest_json_array(self):
+        data = json.dumps([{"code": "a"}, {"code": "b"}, {"code": "c"}])
+        lines, status, _ = self.ingest(data, "application/json")
+        self.assert200(status)
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(
+            lines[-1], {STATUS: STATUS_OK, "received": 3, "inserted": 3, "failed": 0}
+        )
+
+    def test_ingest_invalid_json_array(self):
+        data = '[{"code": "a"}, {"code": "b"}, {"code": "c"} {"code": "d"}]'
+        lines, status, _ = self.ingest(data, "application/json")
+        self.assert200(status)
+        summary = lines[-1]
+        self.assertEqual(summary["inserted"], 3)
+        self.assertEqual(summary[STATUS], STATUS_ERR)
+        self.assertEqual(summary["_error"]["code"], 400)
+
+    def test_ingest_unsupported_content_type(self):
+        r = self.test_client.post(
+            self.ingest_url, data="code=a", content_type="text/plain"
+        )
+        self.assert400(r.status_code)
+
+    def test_ingest_callbacks(self):
+        insert = DummyEvent(lambda: True)
+        inserted = DummyEvent(lambda: True)
+        self.app.on_insert_ingested += insert
+        self.app.on_inserted_ingested += inserted
+        data = "\n".join(json.dumps({"code": code}) for code in "abc")
+        self.ingest(data)
+        # callbacks are notified once for each chunk.
+        self.assertEqual([d["code"] for d in insert.called[0]], ["c"])
+        self.assertEqual([d["code"] for d in inserted.called[0]], ["c"])
+
+    def test_ingest_chunk_failure(self):
+        def insert(documents):
+            if any(document["code"] == "c" for document in documents):
+                abort(403)
+
+        self.app.on_insert_ingested += insert
+        data = "\n".join(json.dumps({"code": code}) for code in "abcde")
+        lines, status, _ = self.ingest(data)
+        self.assert200(status)
+        # the failed chunk is reported, and the ingest stops.
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0][STATUS], STATUS_OK)
+        self.assertEqual(lines[1][STATUS], STATUS_ERR)
+        self.assertEqual(lines[1]["offset"], 2)
+        self.assertEqual(lines[1]["_error"]["code"], 403)
+        summary = lines[-1]
+        self.assertEqual(summary[STATUS], STATUS_ERR)
+        self.assertEqual(summary["received"], 2)
+        self.assertEqual(summary["inserted"], 2)
+        self.assertEqual(summary["_error"]["code"], 403)
@@ -1,3 +1,6 @@
+import sys
+from copy import deepcopy
+
 import simplejson as json
 from bson import ObjectId
 from pymongo import ReadPreference
@@ -286,6 +289,182 @@ class TestPatch(TestBase):
         r = self.perform_patch_with_post_override("prog", 1)
         self.assert200(r.status_code)
 
+    def test_patch_direct_write(self):
+        schema = {"name": {"type": "string"}, "qty": {"type": "integer"}}
+        self.app.register_resource("direct", {"direct_writes": True, "schema": schema})
+        r, status = self.post("direct", data={"name": "a", "qty": 1})
+        url = "direct/%s" % r["_id"]
+        etag = r[ETAG]
+
+        r, status = self.patch(url, data={"qty": 2}, headers=[("If-Match", "stale")])
+        self.assert412(status)
+
+        r, status = self.patch(url, data={"qty": 2}, headers=[("If-Match", etag)])
+        self.assert200(status)
+        self.assertNotEqual(r[ETAG], etag)
+        etag = r[ETAG]
+
+        raw_r = self.test_client.get(url)
+        r, status = self.parse_response(raw_r)
+        self.assertEqual((r["name"], r["qty"]), ("a", 2))
+        self.assertEqual(raw_r.headers.get("ETag").replace('"', ""), etag)
+
+        r, status = self.patch(
+            "direct/%s" % ObjectId(), data={"qty": 2}, headers=[("If-Match", etag)]
+        )
+        self.assert404(status)
+
+        # without the etag, documents are retrieved and their etag computed.
+        self.app.config["ENFORCE_IF_MATCH"] = False
+        r, status = self.post("direct", data={"name": "b", "qty": 1})
+        other_url = "direct/%s" % r["_id"]
+        r, status = self.patch(url, data={"qty": 3})
+        self.assert200(status)
+        r_other, status = self.patch(other_url, data={"qty": 3})
+        self.assert200(status)
+        self.assertNotEqual(r[ETAG], r_other[ETAG])
+
+    def test_patch_operators(self):
+        schema = {
+            "name": {"type": "string"},
+            "qty": {"type": "integer", "max": 10},
+            "tags": {"type": "list", "schema": {"type": "string"}},
+        }
+        self.app.register_resource(
+            "counters",
+            {"patch_operators": ["$inc", "$push", "$pull"], "schema": schema},
+        )
+        r, status = self.post("counters", data={"name": "a", "qty": 1, "tags": ["x"]})
+        url = "counters/%s" % r["_id"]
+        etag = r[ETAG]
+
+        changes = {
+            "$inc": {"qty": 2},
+            "$push": {"tags": {"$each": ["y", "z"]}},
+            "name": "b",
+        }
+        r, status = self.patch(url, data=changes, headers=[("If-Match", etag)])
+        self.assert200(status)
+        etag = r[ETAG]
+
+        raw_r = self.test_client.get(url)
+        r, status = self.parse_response(raw_r)
+        self.assertEqual((r["name"], r["qty"], r["tags"]), ("b", 3, ["x", "y", "z"]))
+        self.assertEqual(raw_r.headers.get("ETag").replace('"', ""), etag)
+
+        for changes, issues in (
+            ({"$inc": {"qty": 8}}, {"qty": "max value is 10"}),
+            ({"$inc": {"tags": 1}}, {"tags": "$inc is not allowed on this field"}),
+            ({"$inc": {"qty": 1}, "qty": 2}, {"qty": "conflicting updates"}),
+            ({"$addToSet": {"tags": "x"}}, {"$addToSet": "unknown field"}),
+        ):
+            r, status = self.patch(url, data=changes, headers=[("If-Match", etag)])
+            self.assertValidationErrorStatus(status)
+            self.assertEqual(r[ISSUES], issues)
+
+        changes = {"$pull": {"tags": {"$in": ["x", "z"]}}}
+        r, status = self.patch(url, data=changes, headers=[("If-Match", etag)])
+        self.assert200(status)
+        r, status = self.parse_response(self.test_client.get(url))
+        self.assertEqual(r["tags"], ["y"])
+
+    def test_patch_operators_concurrent(self):
+        self.app.config["ENFORCE_IF_MATCH"] = False
+        schema = {"qty": {"type": "integer"}, "tags": {"type": "list"}}
+        settings = {"patch_operators": ["$inc", "$push"], "versioning": True}
+        self.app.register_resource("counters", dict(settings, schema=schema))
+        r, status = self.post("counters", data={"qty": 1, "tags": ["x"]})
+        url = "counters/%s" % r["_id"]
+
+        # both requests are based on the same original document, as if they
+        # were concurrent.
+        collection = self.connection[MONGO_DBNAME].counters
+        original = collection.find_one({"_id": ObjectId(r["_id"])})
+        module = sys.modules["eve.methods.patch"]
+        get_document = module.get_document
+        module.get_document = lambda *args, **kwargs: deepcopy(original)
+        try:
+            changes = {"$inc": {"qty": 2}, "$push": {"tags": {"$each": ["y"]}}}
+            r, status = self.patch(url, data=changes)
+            self.assert200(status)
+            changes = {"$inc": {"qty": 3}, "$push": {"tags": {"$each": ["z"]}}}
+            r, status = self.patch(url, data=changes)
+            self.assert200(status)
+        finally:
+            module.get_document = get_document
+
+        etag = r[ETAG]
+        raw_r = self.test_client.get(url)
+        r, status = self.parse_response(raw_r)
+        self.assertEqual((r["qty"], r["tags"]), (6, ["x", "y", "z"]))
+        self.assertEqual(r["_version"], 3)
+        self.assertEqual(raw_r.headers.get("ETag").replace('"', ""), etag)
+
+    def test_patch_operators_bounds(self):
+        self.app.config["ENFORCE_IF_MATCH"] = False
+        self.app.config["BANDWIDTH_SAVER"] = False
+        schema = {
+            "qty": {"type": "integer", "max": 5},
+            "tags": {"type": "list", "maxlength": 2},
+            "secret": {"type": "string"},
+        }
+        settings = {
+            "patch_operators": ["$inc", "$push"],
+            "datasource": {"projection": {"secret": 0}},
+            "schema": schema,
+        }
+        self.app.register_resource("counters", settings)
+        r, status = self.post("counters", data={"qty": 2, "tags": [], "secret": "s"})
+        url = "counters/%s" % r["_id"]
+
+        # both requests are based on the same original document, as if they
+        # were concurrent.
+        collection = self.connection[MONGO_DBNAME].counters
+        original = collection.find_one({"_id": ObjectId(r["_id"])})
+        module = sys.modules["eve.methods.patch"]
+        get_document = module.get_document
+        module.get_document = lambda *args, **kwargs: deepcopy(original)
+        try:
+            changes = {"$inc": {"qty": 2}, "$push": {"tags": {"$each": ["x"]}}}
+            r, status = self.patch(url, data=changes)
+            self.assert200(status)
+            self.assertEqual((r["qty"], r["tags"]), (4, ["x"]))
+            self.assertTrue("secret" not in r)
+            r, status = self.patch(url, data={"$inc": {"qty": 2}})
+            self.assertEqual(status, 409)
+            changes = {"$push": {"tags": {"$each": ["y", "z"]}}}
+            r, status = self.patch(url, data=changes)
+            self.assertEqual(status, 409)
+        finally:
+            module.get_document = get_document
+
+        r, status = self.parse_response(self.test_client.get(url))
+        self.assertEqual((r["qty"], r["tags"]), (4, ["x"]))
+
+    def test_patch_nested_changes(self):
+        schema = {
+            "contact": {
+                "type": "dict",
+                "schema": {"email": {"type": "string"}, "phone": {"type": "string"}},
+            },
+            "rows": {"type": "list", "schema": {"type": "dict"}},
+        }
+        self.app.register_resource("nested", {"schema": schema})
+        data = {"contact": {"email": "a@b.c", "phone": "1"}, "rows": [{"a": 1}]}
+        r, status = self.post("nested", data=data)
+        url = "nested/%s" % r["_id"]
+
+        changes = {"contact": {"phone": "2"}, "rows": [{"a": 1, "b": 2}]}
+        r, status = self.patch(url, data=changes, headers=[("If-Match", r[ETAG])])
+        self.assert200(status)
+        etag = r[ETAG]
+
+        raw_r = self.test_client.get(url)
+        r, status = self.parse_response(raw_r)
+        self.assertEqual(r["contact"], {"email": "a@b.c", "phone": "2"})
+        self.assertEqual(r["rows"], [{"a": 1, "b": 2}])
+        self.assertEqual(raw_r.headers.get("ETag").replace('"', ""), etag)
+
     def test_patch_internal(self):
         # test that patch_internal is available and working properly.
         test_field = "ref"
@@ -997,6 +997,123 @@ class TestPost(TestBase):
         _, status = self.parse_response(resp)
         self.assertTrue(json.loads(resp.data)["a_dict"]["dotted.field"])
 
+    def test_multi_post_unique(self):
+        data = [
+            {"ref": "9234567890123456789054321"},
+            {"ref": self.item_ref},
+            {"ref": "5432112345678901234567890"},
+            {"ref": "9234567890123456789054321"},
+        ]
+        r, status = self.post(self.known_resource_url, data=data)
+        self.assertValidationErrorStatus(status)
+        results = r["_items"]
+
+        self.assertEqual(results[0]["_status"], "OK")
+        self.assertEqual(results[2]["_status"], "OK")
+        # values already stored, and values repeated within the payload.
+        self.assertValidationError(results[1], {"ref": "unique"})
+        self.assertValidationError(results[3], {"ref": "unique"})
+
+        data = [{"unique_attribute": "a"}, {"unique_attribute": "b"}]
+        r, status = self.post("test_unique", data=data)
+        self.assert201(status)
+        data = [{"unique_attribute": "c"}, {"unique_attribute": "b"}]
+        r, status = self.post("test_unique", data=data)
+        self.assert422(status)
+        self.assertEqual(r["_items"][0]["_status"], "OK")
+        self.assertValidationError(r["_items"][1], {"unique_attribute": "unique"})
+
+        # values of invalid documents don't conflict with following documents.
+        data = [
+            {"ref": "8234567890123456789054321", "prog": "invalid"},
+            {"ref": "8234567890123456789054321"},
+        ]
+        r, status = self.post(self.known_resource_url, data=data)
+        self.assertValidationErrorStatus(status)
+        self.assertValidationError(r["_items"][0], {"prog": "must be of integer"})
+        self.assertEqual(r["_items"][1]["_status"], "OK")
+
+    def test_multi_post_data_relation(self):
+        missing = str(ObjectId())
+        data = [
+            {"person": self.item_id},
+            {"person": missing},
+            {"invoicing_contacts": [self.item_id, missing]},
+            {"person": self.item_id, "invoicing_contacts": [self.item_id]},
+        ]
+        r, status = self.post("invoices", data=data)
+        self.assertValidationErrorStatus(status)
+        results = r["_items"]
+
+        self.assertEqual(results[0]["_status"], "OK")
+        self.assertEqual(results[3]["_status"], "OK")
+        self.assertValidationError(results[1], {"person": "must exist"})
+        self.assertValidationError(results[2], {"invoicing_contacts": "must exist"})
+
+        data = [{"person": self.item_id}, {"invoicing_contacts": [self.item_id]}]
+        r, status = self.post("invoices", data=data)
+        self.assert201(status)
+
+    def test_post_bulk_unordered(self):
+        settings = {
+            "resource_methods": ["GET", "POST"],
+            "schema": {"code": {"type": "string"}},
+            "mongo_indexes": {"code": ([("code", 1)], {"unique": True})},
+        }
+        self.app.register_resource("ordered", dict(settings))
+        self.app.register_resource("unordered", dict(settings, bulk_ordered=False))
+
+        for resource in ("ordered", "unordered"):
+            _, status = self.post(resource, data={"code": "a"})
+            self.assert201(status)
+
+        data = [{"code": "b"}, {"code": "a"}, {"code": "c"}]
+        _, status = self.post("ordered", data=data)
+        self.assertEqual(status, 409)
+
+        r, status = self.post("unordered", data=data)
+        self.assert201(status)
+        self.assertEqual(r[STATUS], "ERR")
+        self.assertEqual(r["_error"]["code"], 409)
+        results = r["_items"]
+        self.assertEqual(results[0][STATUS], STATUS_OK)
+        self.assertEqual(results[1][ISSUES], {"exception": "Duplicate key error"})
+        self.assertEqual(results[2][STATUS], STATUS_OK)
+
+        collection = self.app.data.driver.db["unordered"]
+        self.assertEqual(collection.count_documents({}), 3)
+
+        r, status = self.post("unordered", data=[{"code": "a"}, {"code": "b"}])
+        self.assertEqual(status, 409)
+        self.assertEqual(r["_error"]["code"], 409)
+
+    def test_post_group_commit(self):
+        settings = {
+            "resource_methods": ["GET", "POST"],
+            "group_commit": True,
+            "schema": {"code": {"type": "string"}},
+            "mongo_indexes": {"code": ([("code", 1)], {"unique": True})},
+        }
+        self.app.register_resource("grouped", settings)
+        inserted = DummyEvent(lambda: True)
+        self.app.on_inserted_grouped += inserted
+
+        r, status = self.post("grouped", data={"code": "a"})
+        self.assert201(status)
+        self.assertEqual(inserted.called[0][0]["code"], "a")
+        collection = self.app.data.driver.db["grouped"]
+        self.assertEqual(collection.find_one({"code": "a"})["_id"], ObjectId(r["_id"]))
+
+        r, status = self.post("grouped", data={"code": "a"})
+        self.assertEqual(status, 409)
+        self.assertEqual(r[ISSUES], {"exception": "Duplicate key error"})
+
+        # ordered bulk inserts are not grouped.
+        _, status = self.post("grouped", data=[{"code": "b"}, {"code": "a"}])
+        self.assertEqual(status, 409)
+        report = self.app.group_commit.report("grouped")[0]
+        self.assertEqual((report["flushes"], report["documents"]), (2, 2))
+
     def test_post_projection_is_honored(self):
         data = {"ref": "1234567890123456789054321", "aninteger": 100}
         self.app.config["BANDWIDTH_SAVER"] = False
@@ -433,6 +433,27 @@ class TestPut(TestBase):
         r, status = self.put("products/FOOBAR", data=product)
         self.assert201(status)
 
+    def test_put_direct_write(self):
+        schema = {"name": {"type": "string"}, "qty": {"type": "integer"}}
+        self.app.register_resource("direct", {"direct_writes": True, "schema": schema})
+        r, status = self.post("direct", data={"name": "a", "qty": 1})
+        url = "direct/%s" % r["_id"]
+        etag = r[ETAG]
+        r, status = self.parse_response(self.test_client.get(url))
+        created = r["_created"]
+
+        r, status = self.put(url, data={"name": "b"}, headers=[("If-Match", "stale")])
+        self.assert412(status)
+
+        r, status = self.put(url, data={"name": "b"}, headers=[("If-Match", etag)])
+        self.assert200(status)
+        self.assertNotEqual(r[ETAG], etag)
+
+        r, status = self.parse_response(self.test_client.get(url))
+        self.assertEqual(r["name"], "b")
+        self.assertTrue("qty" not in r)
+        self.assertEqual(r["_created"], created)
+
     def test_put_internal(self):
         # test that put_internal is available and working properly.
         test_field = "ref"
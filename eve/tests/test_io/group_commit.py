@@ -0,0 +1,153 @@
+import threading
+from unittest import TestCase
+
+from flask import Flask, g
+from werkzeug.exceptions import ServiceUnavailable
+
+from eve.io.group_commit import GroupCommit
+
+
+class TestGroupCommit(TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.group_commit = GroupCommit()
+        self.batches = []
+
+    def insert(self, resource, documents):
+        self.batches.append(list(documents))
+        g.causal_token = "token"
+        ids, errors = [], {}
+        for index, document in enumerate(documents):
+            if document.get("fail"):
+                ids.append(None)
+                errors[index] = (11000, "duplicate")
+            else:
+                ids.append(document["n"])
+        return ids, errors
+
+    def post(self, documents, results, window_ms=200, max_size=4, target=None):
+        with self.app.app_context():
+            try:
+                result = self.group_commit.insert(
+                    "resource",
+                    documents,
+                    self.insert,
+                    window_ms,
+                    max_size,
+                    target=target,
+                )
+            except Exception as e:
+                result = e
+            results.append((documents, result, g.get("causal_token")))
+
+    def test_insert(self):
+        results = []
+        self.post([{"n": 1}, {"n": 2, "fail": True}], results, window_ms=0)
+        _, result, causal_token = results[0]
+        self.assertEqual(result, ([1, None], {1: (11000, "duplicate")}))
+        self.assertEqual(causal_token, "token")
+        self.assertEqual(len(self.batches), 1)
+
+    def test_insert_concurrent(self):
+        results = []
+        threads = [
+            threading.Thread(
+                target=self.post, args=([{"n": n, "fail": n == 2}], results)
+            )
+            for n in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([len(batch) for batch in self.batches], [4, 4])
+        for documents, (ids, errors), causal_token in results:
+            n = documents[0]["n"]
+            if n == 2:
+                self.assertEqual((ids, errors), ([None], {0: (11000, "duplicate")}))
+            else:
+                self.assertEqual((ids, errors), ([n], {}))
+            self.assertEqual(causal_token, "token")
+
+        report = self.group_commit.report("resource")[0]
+        self.assertEqual(report["flushes"], 2)
+        self.assertEqual(report["full_flushes"], 2)
+        self.assertEqual(report["documents"], 8)
+        self.assertEqual(report["avg_size"], 4)
+        self.assertEqual(sum(report["histogram"].values()), 2)
+
+        self.group_commit.clear()
+        self.assertEqual(self.group_commit.report(), [])
+
+    def test_insert_failure(self):
+        def insert(resource, documents):
+            raise ValueError("failure")
+
+        with self.app.app_context():
+            self.assertRaises(
+                ValueError,
+                self.group_commit.insert,
+                "resource",
+                [{"n": 1}],
+                insert,
+                0,
+                4,
+            )
+        # the failed batch is not reused.
+        results = []
+        self.post([{"n": 2}], results, window_ms=0)
+        self.assertEqual(results[0][1], ([2], {}))
+
+    def test_insert_targets(self):
+        results = []
+        threads = [
+            threading.Thread(
+                target=self.post,
+                args=([{"n": n}], results),
+                kwargs={"target": ("resource", n % 2)},
+            )
+            for n in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # documents inserted into different databases are not grouped.
+        self.assertEqual([len(batch) for batch in self.batches], [4, 4])
+        for batch in self.batches:
+            self.assertEqual(len(set(document["n"] % 2 for document in batch)), 1)
+        self.assertEqual(self.group_commit.report("resource")[0]["documents"], 8)
+
+    def test_insert_timeout(self):
+        release = threading.Event()
+
+        def insert(resource, documents):
+            # the leader hangs until the follower gives up.
+            release.wait(1)
+            return self.insert(resource, documents)
+
+        def post(documents, results):
+            with self.app.app_context():
+                try:
+                    results.append(
+                        self.group_commit.insert("resource", documents, insert, 200, 2)
+                    )
+                except ServiceUnavailable as e:
+                    results.append(e)
+                    release.set()
+
+        self.group_commit.flush_timeout = 0.05
+        results = []
+        threads = [
+            threading.Thread(target=post, args=([{"n": n}], results)) for n in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIsInstance(results[0], ServiceUnavailable)
+        self.assertEqual(len(results[1][0]), 1)
+        self.assertEqual(len(self.batches), 1)
@@ -1,16 +1,33 @@
 # -*- coding: utf-8 -*-
+import copy
+import time
 from datetime import datetime
 from unittest import TestCase
 
 import simplejson as json
-from bson import ObjectId, decimal128
+from bson import ObjectId, Timestamp, decimal128
 from bson.dbref import DBRef
 from cerberus import SchemaError
+from flask import g
+from pymongo.errors import ExecutionTimeout
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
 
-from eve.io.mongo import Mongo, MongoJSONEncoder, Validator
+from eve.io.mongo import (Mongo, MongoJSONEncoder, NamedQuery, Validator,
+                          compile_named_queries, compile_schema_types,
+                          method_read_preference, operation_max_time_ms,
+                          operator_bounds, query_hint, read_preference,
+                          request_max_time_ms, validate_materialize)
+from eve.io.mongo.indexes import (equality_fields, filter_is_indexed,
+                                  index_keys, query_fields, sort_is_indexed)
+from eve.io.mongo.mongo import _materialization_due
+from eve.io.mongo.normalizer import normalize_query
 from eve.io.mongo.parser import ParseError, parse
+from eve.io.mongo.stats import (QueryStats, index_name, query_shape,
+                                suggest_index)
 from eve.tests import TestBase
+from eve.tests.auth import ValidBasicAuth
 from eve.tests.test_settings import MONGO_DBNAME
+from eve.utils import ParsedRequest
 
 
 class TestPythonParser(TestCase):
@@ -54,6 +71,27 @@ class TestPythonParser(TestCase):
         self.assertEqual(type(r), dict)
         self.assertEqual(r, {"$or": [{"a": 1}, {"b": 2}]})
 
+    def test_In(self):
+        r = parse('a in [1, "x"]')
+        self.assertEqual(type(r), dict)
+        self.assertEqual(r, {"a": {"$in": [1, "x"]}})
+        r = parse("a in (1, 2)")
+        self.assertEqual(r, {"a": {"$in": [1, 2]}})
+        self.assertRaises(ParseError, parse, "a in b")
+
+    def test_NotIn(self):
+        r = parse("a not in [1, 2]")
+        self.assertEqual(type(r), dict)
+        self.assertEqual(r, {"a": {"$nin": [1, 2]}})
+
+    def test_Is(self):
+        r = parse("a is None")
+        self.assertEqual(type(r), dict)
+        self.assertEqual(r, {"a": None})
+        r = parse("a is not None")
+        self.assertEqual(r, {"a": {"$ne": None}})
+        self.assertRaises(ParseError, parse, "a is 1")
+
     def test_nested_BoolOp(self):
         r = parse("a == 1 or (b == 2 and c == 3)")
         self.assertEqual(type(r), dict)
@@ -429,6 +467,709 @@ class TestMongoValidator(TestCase):
         self.assertTrue(v.validate(doc))
 
 
+class TestSchemaTypes(TestCase):
+    def test_compile_schema_types(self):
+        schema = {
+            "_id": {"type": "objectid"},
+            "name": {"type": "string"},
+            "born": {"type": "datetime"},
+            "prog": {"type": "integer"},
+            "id_list": {"type": "list", "schema": {"type": "objectid"}},
+            "rows": {
+                "type": "list",
+                "schema": {
+                    "type": "dict",
+                    "schema": {"sku": {"type": "string"}, "price": {"type": "integer"}},
+                },
+            },
+            "location": {"type": "dict", "schema": {"city": {"type": "string"}}},
+            "mixed": {"type": "list", "items": [{"type": "string"}, {"type": "objectid"}]},
+            "alist": {"type": "list", "items": [{"type": "string"}, {"type": "integer"}]},
+            "untyped": {"nullable": True},
+        }
+        self.assertEqual(
+            compile_schema_types(schema),
+            {
+                "_id": "objectid",
+                "name": "string",
+                "born": "datetime",
+                "id_list": "objectid",
+                "rows.sku": "string",
+                "location.city": "string",
+                "mixed": "objectid",
+            },
+        )
+
+    def test_compile_schema_types_empty(self):
+        self.assertEqual(compile_schema_types({}), {})
+        self.assertEqual(compile_schema_types(None), {})
+
+
+class TestIndexes(TestCase):
+    indexes = [
+        [("_id", 1)],
+        [("name", 1)],
+        [("role", 1), ("born", -1)],
+        [("location", "2dsphere")],
+    ]
+
+    def test_index_keys(self):
+        info = {
+            "_id_": {"key": [("_id", 1)], "v": 2},
+            "name": {"key": [("name", 1)], "v": 2},
+            "hidden": {"key": [("prog", 1)], "v": 2, "hidden": True},
+        }
+        self.assertEqual(index_keys(info), [[("_id", 1)], [("name", 1)]])
+
+    def test_equality_fields(self):
+        spec = {
+            "name": "john",
+            "prog": {"$gt": 1},
+            "role": {"$in": ["agent"]},
+            "$and": [{"ref": {"$eq": "x"}}, {"title": {"$ne": "Mr."}}],
+        }
+        self.assertEqual(equality_fields(spec), set(["name", "role", "ref"]))
+
+    def test_query_fields(self):
+        spec = {
+            "name": "john",
+            "$or": [{"prog": 1}, {"prog": 2}],
+            "$and": [{"ref": {"$eq": "x"}}, {"title": {"$ne": "Mr."}}],
+        }
+        self.assertEqual(query_fields(spec), set(["name", "ref", "title"]))
+
+    def test_query_hint(self):
+        hints = [
+            {"index": "ref_created", "fields": ["ref"], "sort": ["_created"]},
+            {"index": "ref", "fields": ["ref"]},
+            {"index": "name", "sort": ["name"]},
+        ]
+        sort = [("_created", -1)]
+        self.assertEqual(query_hint(hints, {"ref": "x"}, sort), "ref_created")
+        self.assertEqual(
+            query_hint(hints, {"$and": [{"ref": "x"}, {"a": 1}]}, None), "ref"
+        )
+        self.assertEqual(query_hint(hints, {}, [("name", 1)]), "name")
+        self.assertEqual(query_hint(hints, {"name": "x"}, sort), None)
+        self.assertEqual(query_hint(None, {"ref": "x"}, sort), None)
+
+    def test_filter_is_indexed(self):
+        self.assertTrue(filter_is_indexed({}, self.indexes))
+        self.assertTrue(filter_is_indexed({"name": "john"}, self.indexes))
+        self.assertTrue(filter_is_indexed({"role": {"$in": ["a"]}}, self.indexes))
+        self.assertTrue(
+            filter_is_indexed({"name": "john", "prog": 1}, self.indexes)
+        )
+        self.assertTrue(filter_is_indexed({"$text": {"$search": "x"}}, self.indexes))
+        self.assertTrue(
+            filter_is_indexed(
+                {"$and": [{"prog": 1}, {"name": {"$regex": "^jo"}}]}, self.indexes
+            )
+        )
+        self.assertFalse(filter_is_indexed({"prog": 1}, self.indexes))
+        self.assertFalse(filter_is_indexed({"born": 1}, self.indexes))
+        self.assertFalse(filter_is_indexed({"name": {"$ne": "x"}}, self.indexes))
+        self.assertFalse(filter_is_indexed({"name": {"$regex": "jo"}}, self.indexes))
+        self.assertFalse(
+            filter_is_indexed({"$or": [{"name": "x"}, {"prog": 1}]}, self.indexes)
+        )
+        self.assertTrue(
+            filter_is_indexed({"$or": [{"name": "x"}, {"_id": 1}]}, self.indexes)
+        )
+
+    def test_sort_is_indexed(self):
+        self.assertTrue(sort_is_indexed(None, {}, self.indexes))
+        self.assertTrue(sort_is_indexed([("name", 1)], {}, self.indexes))
+        self.assertTrue(sort_is_indexed([("name", -1)], {}, self.indexes))
+        self.assertTrue(
+            sort_is_indexed([("role", 1), ("born", -1)], {}, self.indexes)
+        )
+        self.assertTrue(
+            sort_is_indexed([("role", -1), ("born", 1)], {}, self.indexes)
+        )
+        self.assertTrue(sort_is_indexed([("born", -1)], {"role": "a"}, self.indexes))
+        self.assertFalse(sort_is_indexed([("born", -1)], {}, self.indexes))
+        self.assertFalse(
+            sort_is_indexed([("role", 1), ("born", 1)], {}, self.indexes)
+        )
+        self.assertFalse(sort_is_indexed([("prog", 1)], {}, self.indexes))
+        self.assertFalse(sort_is_indexed([("location", 1)], {}, self.indexes))
+
+
+class TestQueryStats(TestCase):
+    def test_query_shape(self):
+        query = {
+            "name": "john",
+            "prog": {"$gt": 1, "$lte": 10},
+            "role": {"$in": ["agent", "client"]},
+            "$or": [{"a": 1}, {"b": {"$exists": True}}],
+            "location": {"city": "Rome"},
+        }
+        self.assertEqual(
+            query_shape(query),
+            {
+                "name": 1,
+                "prog": {"$gt": 1, "$lte": 1},
+                "role": {"$in": 1},
+                "$or": [{"a": 1}, {"b": {"$exists": 1}}],
+                "location": {"city": 1},
+            },
+        )
+        self.assertEqual(
+            query_shape({"role": {"$in": ["agent"]}}),
+            query_shape({"role": {"$in": ["agent", "client", "vendor"]}}),
+        )
+
+    def test_suggest_index(self):
+        shape = query_shape(
+            {
+                "born": {"$gt": 1},
+                "name": "john",
+                "role": {"$in": ["a"]},
+                "_deleted": {"$ne": True},
+            }
+        )
+        self.assertEqual(
+            suggest_index(shape, [["prog", -1]]),
+            [["name", 1], ["role", 1], ["prog", -1], ["born", 1]],
+        )
+        self.assertEqual(suggest_index({}, None), None)
+        self.assertEqual(suggest_index({"$or": [{"a": 1}]}), None)
+
+        pipeline = [{"$match": {"name": 1}}, {"$sort": {"born": 1}}]
+        self.assertEqual(suggest_index(pipeline), [["name", 1], ["born", 1]])
+        self.assertEqual(index_name([["name", 1], ["born", -1]]), "name_1_born_-1")
+
+    def test_query_stats(self):
+        stats = QueryStats(max_shapes=2)
+        stats.record("contacts", "find", {"name": 1}, [], 0.5)
+        stats.record("contacts", "find", {"name": 1}, [], 30)
+        stats.record("contacts", "find_one", {"_id": 1}, [], 100)
+
+        ranked = stats.ranked()
+        self.assertEqual(len(ranked), 2)
+        self.assertEqual(ranked[0]["method"], "find_one")
+        find = ranked[1]
+        self.assertEqual(find["count"], 2)
+        self.assertEqual(find["total_ms"], 30.5)
+        self.assertEqual(find["max_ms"], 30)
+        self.assertEqual(find["avg_ms"], 15.25)
+        self.assertEqual(find["histogram"]["<=1"], 1)
+        self.assertEqual(find["histogram"]["<=50"], 1)
+        self.assertEqual(sum(find["histogram"].values()), 2)
+
+        # least recently seen shape is evicted
+        stats.record("contacts", "find", {"name": 1}, [], 1)
+        stats.record("invoices", "find", {}, [], 10000)
+        ranked = stats.ranked()
+        self.assertEqual(len(ranked), 2)
+        self.assertEqual(ranked[0]["histogram"][">5000"], 1)
+        self.assertEqual([e["method"] for e in ranked], ["find", "find"])
+        self.assertEqual(len(stats.ranked("invoices")), 1)
+
+        stats.clear()
+        self.assertEqual(stats.ranked(), [])
+
+
+class TestReadPreference(TestCase):
+    def test_read_preference(self):
+        preference = read_preference("secondaryPreferred")
+        self.assertEqual(preference.mongos_mode, "secondaryPreferred")
+        self.assertEqual(preference.max_staleness, -1)
+
+        preference = read_preference(
+            {"mode": "nearest", "max_staleness_seconds": 90, "tag_sets": [{"dc": "a"}]}
+        )
+        self.assertEqual(preference.mongos_mode, "nearest")
+        self.assertEqual(preference.max_staleness, 90)
+        self.assertEqual(preference.tag_sets, [{"dc": "a"}])
+
+        self.assertEqual(read_preference("primary").mongos_mode, "primary")
+
+        self.assertRaises(ValueError, read_preference, "secondaryFirst")
+        self.assertRaises(ValueError, read_preference, {"max_staleness_seconds": 90})
+        self.assertRaises(
+            ValueError, read_preference, {"mode": "primary", "tag_sets": []}
+        )
+        self.assertRaises(
+            ValueError,
+            read_preference,
+            {"mode": "secondary", "max_staleness_seconds": "90"},
+        )
+
+    def test_method_read_preference(self):
+        self.assertEqual(method_read_preference(None, "find"), None)
+
+        preference = method_read_preference("secondary", "find_one")
+        self.assertEqual(preference.mongos_mode, "secondary")
+
+        value = {"find": "secondaryPreferred", "aggregate": {"mode": "nearest"}}
+        self.assertEqual(
+            method_read_preference(value, "find").mongos_mode, "secondaryPreferred"
+        )
+        self.assertEqual(
+            method_read_preference(value, "aggregate").mongos_mode, "nearest"
+        )
+        self.assertEqual(method_read_preference(value, "find_one"), None)
+
+        self.assertRaises(
+            ValueError, method_read_preference, {"finds": "secondary"}, "find"
+        )
+
+
+# queries which normalize_query() rewrites, used to check that the
+# normalized queries return the same documents as the original ones.
+NORMALIZER_CORPUS = [
+    {"$and": [{"prog": {"$gte": 2}}, {"prog": {"$lt": 8}}]},
+    {"$and": [{"$and": [{"prog": {"$gt": 1}}, {"role": "agent"}]}, {"prog": 3}]},
+    {"$and": [{"prog": {"$in": [1, 2, 3]}}, {"prog": {"$nin": [2]}}]},
+    {"$and": [{"prog": {"$ne": 1}}, {"prog": {"$ne": 2}}]},
+    {"$and": [{"prog": 1}, {"prog": 1}, {"title": "Mr."}]},
+    {"$and": [{"prog": 1}, {"prog": 2}]},
+    {"$and": [{"rows.price": {"$gt": 1}}, {"rows.price": {"$lt": 5}}]},
+    {"$and": [{"alist": {"$exists": True}}, {"alist": {"$size": 2}}]},
+    {
+        "$and": [
+            {"$or": [{"prog": 1}, {"prog": 2}]},
+            {"$or": [{"prog": 2}, {"prog": 3}]},
+        ]
+    },
+    {
+        "$or": [
+            {"$and": [{"prog": {"$gt": 5}}, {"prog": {"$lt": 7}}]},
+            {"$and": [{"role": "client"}]},
+        ]
+    },
+    {"$and": [{"ref": {"$regex": "^a"}}, {"ref": {"$regex": "b"}}]},
+    {"$and": [{"location.city": {"$exists": True}}, {"_deleted": {"$ne": True}}]},
+    {"$or": [{"prog": 1}, {"prog": {"$eq": 2}}, {"prog": {"$in": [2, 3]}}]},
+    {"$or": [{"prog": 1}, {"prog": 2}], "role": "agent"},
+    {"$or": [{"prog": 1}, {"title": "Mr."}]},
+    {"$or": [{"ref": {"$regex": "^a"}}, {"ref": "b"}]},
+]
+
+
+class TestNormalizeQuery(TestCase):
+    def test_flatten(self):
+        self.assertEqual(normalize_query({}), {})
+        self.assertEqual(normalize_query({"a": 1}), {"a": 1})
+        self.assertEqual(
+            normalize_query({"$and": [{"a": 1}, {"b": 2}]}), {"a": 1, "b": 2}
+        )
+        self.assertEqual(
+            normalize_query(
+                {"c": 3, "$and": [{"$and": [{"a": 1}, {"b": 2}]}, {"d": 4}]}
+            ),
+            {"c": 3, "a": 1, "b": 2, "d": 4},
+        )
+
+    def test_merge(self):
+        self.assertEqual(
+            normalize_query({"$and": [{"a": {"$gt": 1}}, {"a": {"$lt": 5}}]}),
+            {"a": {"$gt": 1, "$lt": 5}},
+        )
+        self.assertEqual(
+            normalize_query({"$and": [{"a": 1}, {"a": 1}, {"b": 2}]}), {"a": 1, "b": 2}
+        )
+
+    def test_conflicts(self):
+        # same operator twice
+        query = {"$and": [{"a": {"$ne": 1}}, {"a": {"$ne": 2}}]}
+        self.assertEqual(
+            normalize_query(query), {"a": {"$ne": 1}, "$and": [{"a": {"$ne": 2}}]}
+        )
+        # equality and operator
+        query = {"$and": [{"a": 1}, {"a": {"$gt": 0}}]}
+        self.assertEqual(normalize_query(query), {"a": 1, "$and": [{"a": {"$gt": 0}}]})
+        # operators with modifiers
+        query = {"$and": [{"a": {"$regex": "x"}}, {"a": {"$options": "i"}}]}
+        self.assertEqual(
+            normalize_query(query),
+            {"a": {"$regex": "x"}, "$and": [{"a": {"$options": "i"}}]},
+        )
+        # several $or
+        query = {"$and": [{"$or": [{"a": 1}]}, {"$or": [{"b": 1}]}]}
+        self.assertEqual(
+            normalize_query(query),
+            {"$or": [{"a": 1}], "$and": [{"$or": [{"b": 1}]}]},
+        )
+
+    def test_logical_operators(self):
+        query = {"$or": [{"$and": [{"a": 1}, {"b": 2}]}, {"c": 3}]}
+        self.assertEqual(normalize_query(query), {"$or": [{"a": 1, "b": 2}, {"c": 3}]})
+        query = {"$nor": [{"$and": [{"a": {"$gt": 1}}, {"a": {"$lt": 3}}]}]}
+        self.assertEqual(
+            normalize_query(query), {"$nor": [{"a": {"$gt": 1, "$lt": 3}}]}
+        )
+
+    def test_or_to_in(self):
+        query = {"$or": [{"a": 1}, {"a": {"$eq": 2}}, {"a": {"$in": [1, 3]}}]}
+        self.assertEqual(normalize_query(query), {"a": {"$in": [1, 2, 3]}})
+        query = {"$or": [{"a": 1}, {"a": True}]}
+        self.assertEqual(normalize_query(query), {"a": {"$in": [1, True]}})
+        query = {"$and": [{"$or": [{"a": 1}, {"a": 2}]}, {"a": {"$ne": 3}}]}
+        self.assertEqual(normalize_query(query), {"a": {"$in": [1, 2], "$ne": 3}})
+        # not equalities on a single field
+        for query in (
+            {"$or": [{"a": 1}]},
+            {"$or": [{"a": 1}, {"b": 2}]},
+            {"$or": [{"a": 1}, {"a": {"$gt": 2}}]},
+            {"$or": [{"a": 1, "b": 1}, {"a": 2}]},
+        ):
+            self.assertEqual(normalize_query(query), query)
+
+    def test_malformed(self):
+        for query in ({"$and": []}, {"$and": {"a": 1}}, {"$and": [1]}):
+            self.assertEqual(normalize_query(query), query)
+
+    def test_does_not_alter_query(self):
+        for query in NORMALIZER_CORPUS:
+            original = copy.deepcopy(query)
+            normalize_query(query)
+            self.assertEqual(query, original)
+        for query in NORMALIZER_CORPUS:
+            # idempotence
+            self.assertEqual(
+                normalize_query(normalize_query(query)), normalize_query(query)
+            )
+
+
+class TestNamedQueries(TestCase):
+    definition = {
+        "query": {
+            "role": "$role",
+            "prog": {"$in": "$progs"},
+            "$or": [{"title": "$title"}, {"title": {"$exists": False}}],
+        },
+        "params": {
+            "role": {"type": "string", "allowed": ["agent", "client"]},
+            "progs": {"type": "list", "items": "integer", "default": [1]},
+            "title": {"type": "string", "default": "Mr."},
+        },
+    }
+
+    def test_render(self):
+        query = NamedQuery("q", self.definition, Mongo.operators)
+        self.assertEqual(
+            query.render({"role": "agent", "progs": "1,2", "title": "Dr."}),
+            {
+                "role": "agent",
+                "prog": {"$in": [1, 2]},
+                "$or": [{"title": "Dr."}, {"title": {"$exists": False}}],
+            },
+        )
+        rendered = query.render({"role": "client"})
+        self.assertEqual(rendered["prog"], {"$in": [1]})
+        self.assertEqual(rendered["$or"][0], {"title": "Mr."})
+
+        # the template is left untouched.
+        rendered["$or"][1]["title"]["$exists"] = True
+        rendered["prog"]["$in"].append(2)
+        self.assertEqual(query.query, self.definition["query"])
+        self.assertEqual(query.render({"role": "client"})["prog"], {"$in": [1]})
+        self.assertEqual(
+            query.render({"role": "client"})["$or"][1],
+            {"title": {"$exists": False}},
+        )
+
+    def test_render_invalid_parameters(self):
+        query = NamedQuery("q", self.definition, Mongo.operators)
+        for args in ({}, {"role": "admin"}, {"role": "agent", "progs": "1,x"}):
+            self.assertRaises(ValueError, query.render, args)
+
+    def test_parameter_types(self):
+        definition = {
+            "query": {"_id": "$id", "born": "$born", "n": "$n", "b": "$b"},
+            "params": {
+                "id": {"type": "objectid"},
+                "born": {"type": "datetime"},
+                "n": {"type": "number"},
+                "b": {"type": "boolean"},
+            },
+        }
+        query = NamedQuery("q", definition, Mongo.operators)
+        args = {
+            "id": "50656e4538345b39dd0414f0",
+            "born": "Tue, 06 Nov 2012 10:33:31 GMT",
+            "n": "1.5",
+            "b": "false",
+        }
+        self.assertEqual(
+            query.render(args),
+            {
+                "_id": ObjectId("50656e4538345b39dd0414f0"),
+                "born": datetime(2012, 11, 6, 10, 33, 31),
+                "n": 1.5,
+                "b": False,
+            },
+        )
+
+    def test_compile_named_queries(self):
+        blacklist = ["$where"]
+        for definitions in (
+            [],
+            {"q": {"role": "agent"}},
+            {"q": {"query": {"role": "agent"}, "limit": 1}},
+            {"q": {"query": {"$where": "this.a > 1"}}},
+            {"q": {"query": {"a": {"$foo": 1}}}},
+            {"q": {"query": {"a": "$a"}, "params": {"a": {"type": "set"}}}},
+            {"q": {"query": {"a": "$a"}, "params": {"a": {"type": "dict"}}}},
+            {"q": {"query": {"a": 1}, "params": {"a": {"type": "string"}}}},
+        ):
+            self.assertRaises(
+                ValueError,
+                compile_named_queries,
+                definitions,
+                Mongo.operators,
+                blacklist,
+            )
+
+        queries = compile_named_queries(
+            {"q": self.definition}, Mongo.operators, blacklist
+        )
+        self.assertEqual(queries["q"].name, "q")
+
+        # parameters can't shadow the query arguments.
+        definition = {"query": {"a": "$sort"}, "params": {"sort": {"type": "string"}}}
+        self.assertRaises(
+            ValueError,
+            compile_named_queries,
+            {"q": definition},
+            Mongo.operators,
+            blacklist,
+            ["where", "sort"],
+        )
+
+    def test_is_indexed(self):
+        query = NamedQuery("q", self.definition, Mongo.operators)
+        self.assertTrue(query.is_indexed([[("role", 1), ("prog", 1)]]))
+        self.assertFalse(query.is_indexed([[("_id", 1)]]))
+
+
+class TestMaterialize(TestCase):
+    def setUp(self):
+        self.materialize = {
+            "pipeline": [{"$group": {"_id": "$ref", "count": {"$sum": 1}}}],
+            "collection": "totals",
+            "mode": "out",
+            "refresh": None,
+            "refresh_on": None,
+        }
+
+    def test_validate_materialize(self):
+        validate_materialize(None)
+        validate_materialize(self.materialize)
+        for key, value in (
+            ("pipeline", {"$group": {}}),
+            ("pipeline", [{"$out": "totals"}]),
+            ("collection", None),
+            ("mode", "replace"),
+            ("refresh", "1h"),
+            ("refresh_on", "contacts"),
+            ("unknown", 1),
+        ):
+            materialize = dict(self.materialize, **{key: value})
+            self.assertRaises(ValueError, validate_materialize, materialize)
+
+    def test_materialization_due(self):
+        materialize = self.materialize
+        self.assertTrue(_materialization_due({}, materialize, 100))
+        self.assertFalse(_materialization_due({"refreshed": 50}, materialize, 100))
+        state = {"refreshed": 50, "written": 40}
+        self.assertFalse(_materialization_due(state, materialize, 100))
+        state["written"] = 60
+        self.assertTrue(_materialization_due(state, materialize, 100))
+
+        materialize["refresh"] = 60
+        self.assertFalse(_materialization_due({"refreshed": 50}, materialize, 100))
+        self.assertTrue(_materialization_due({"refreshed": 40}, materialize, 100))
+
+
+class TestOperatorBounds(TestCase):
+    def test_operator_bounds(self):
+        schema = {
+            "qty": {"type": "integer", "min": 0, "max": 10},
+            "tags": {"type": "list", "minlength": 1, "maxlength": 3},
+            "free": {"type": "integer"},
+        }
+        self.assertEqual(operator_bounds(schema, {"$inc": {"free": 1}}), [])
+        self.assertEqual(
+            operator_bounds(schema, {"$inc": {"qty": 2}}),
+            [{"qty": {"$not": {"$gt": 8}}}],
+        )
+        self.assertEqual(
+            operator_bounds(schema, {"$inc": {"qty": -2}}),
+            [{"qty": {"$not": {"$lt": 2}}}],
+        )
+
+        tags = {"$ifNull": ["$tags", []]}
+        operators = {"$push": {"tags": {"$each": ["a", "b"]}}}
+        length = {"$add": [{"$size": tags}, 2]}
+        self.assertEqual(
+            operator_bounds(schema, operators), [{"$expr": {"$lte": [length, 3]}}]
+        )
+        operators = {"$addToSet": {"tags": {"$each": ["a"]}}}
+        added = {"$setDifference": [{"$literal": ["a"]}, tags]}
+        length = {"$add": [{"$size": tags}, {"$size": added}]}
+        self.assertEqual(
+            operator_bounds(schema, operators), [{"$expr": {"$lte": [length, 3]}}]
+        )
+        operators = {"$pull": {"tags": {"$in": ["a"]}}}
+        (bound,) = operator_bounds(schema, operators)
+        self.assertEqual(bound["$expr"]["$or"][1]["$gte"][1], 1)
+
+
+class TestCompiledValidation(TestCase):
+    """Differential tests: documents must get the same outcome, normalized
+    document and errors from the 'compiled' validation engine and from
+    Cerberus.
+    """
+
+    schema = {
+        "name": {"type": "string", "minlength": 2, "maxlength": 8, "required": True},
+        "code": {"type": "string", "regex": "[A-Z]+", "empty": False},
+        "note": {"type": "string", "empty": True, "minlength": 3},
+        "rank": {"type": "integer", "min": 1, "max": 10, "default": 5},
+        "price": {"type": "number", "nullable": True},
+        "flag": {"type": "boolean", "default": False},
+        "kind": {"type": "string", "allowed": ["a", "b"]},
+        "tags": {"type": "list", "allowed": ["x", "y"]},
+        "ref": {"type": "objectid"},
+        "where": {"type": "point"},
+        "either": {"type": ["integer", "string"]},
+        "born": {"type": "datetime"},
+        "fixed": {"type": "string", "readonly": True},
+        "lower": {"type": "string", "coerce": lambda v: v.lower()},
+        "child": {
+            "type": "dict",
+            "schema": {"a": {"type": "integer", "required": True}},
+        },
+        "after": {"type": "string", "dependencies": "name"},
+    }
+
+    documents = [
+        {"name": "john"},
+        {"name": "john", "rank": 1, "price": None, "flag": True, "kind": "a"},
+        {"name": "john", "code": "ABC", "note": "", "tags": ["x", "y"]},
+        {"name": "john", "ref": str(ObjectId()), "either": "x", "born": datetime.now()},
+        {"name": "john", "where": {"type": "Point", "coordinates": [1, 2]}},
+        {"name": "john", "lower": "ABC", "child": {"a": 1}, "after": "x"},
+        {"name": "john", "fixed": "persisted"},
+        {},
+        {"name": "j"},
+        {"name": None},
+        {"name": 1},
+        {"name": "john", "code": "abc"},
+        {"name": "john", "code": ""},
+        {"name": "john", "note": "ab"},
+        {"name": "john", "rank": 0},
+        {"name": "john", "rank": 11, "kind": "c"},
+        {"name": "john", "rank": None},
+        {"name": "john", "tags": ["x", "z"]},
+        {"name": "john", "ref": "not an objectid"},
+        {"name": "john", "where": {"type": "Point"}},
+        {"name": "john", "either": 1.5},
+        {"name": "john", "fixed": "changed"},
+        {"name": "john", "lower": 1, "child": {}},
+        {"name": "john", "unknown": 1},
+        "not a document",
+    ]
+
+    def setUp(self):
+        from eve import Eve
+
+        # no delegated field needs normalization in the 'plain' schema.
+        plain = dict(self.schema)
+        del plain["fixed"], plain["lower"]
+        domain = {}
+        for name, schema in (("", self.schema), ("_plain", plain)):
+            domain["cerberus" + name] = {"schema": copy.deepcopy(schema)}
+            domain["compiled" + name] = {
+                "schema": copy.deepcopy(schema),
+                "validation_engine": "compiled",
+            }
+        self.app = Eve(settings={"DOMAIN": domain})
+        self.persisted = {"_id": ObjectId(), "name": "john", "fixed": "persisted"}
+
+    def outcome(self, resource, method, document):
+        schema = self.app.config["DOMAIN"][resource]["schema"]
+        validator = Validator(schema, resource=resource)
+        try:
+            if method == "validate":
+                valid = validator.validate(copy.deepcopy(document))
+            else:
+                valid = getattr(validator, method)(
+                    copy.deepcopy(document), self.persisted["_id"], self.persisted
+                )
+        except Exception as e:
+            return type(e)
+        return valid, validator.document, validator.errors
+
+    def test_compiled_schema(self):
+        compiled = self.app.config["DOMAIN"]["compiled"]["_compiled_schema"]
+        self.assertEqual(
+            set(compiled.delegated), set(["fixed", "lower", "child", "after"])
+        )
+        self.assertTrue(compiled.delegated_normalization)
+        plain = self.app.config["DOMAIN"]["compiled_plain"]["_compiled_schema"]
+        self.assertFalse(plain.delegated_normalization)
+        cerberus = self.app.config["DOMAIN"]["cerberus"]
+        self.assertEqual(cerberus["_compiled_schema"], None)
+
+        with self.app.app_context():
+            validator = Validator(compiled.schema, resource="compiled")
+            self.assertTrue(validator.compiled_schema is compiled)
+            self.assertTrue(validator.schema is compiled.definitions)
+            # valid documents are not validated by Cerberus as a whole.
+            self.assertEqual(
+                compiled.check({"name": "john"}, False, True, None, validator),
+                {"name": "john", "rank": 5, "flag": False},
+            )
+            self.assertEqual(
+                compiled.check({"name": "j"}, False, True, None, validator), None
+            )
+            # no defaults for the fields of the persisted document.
+            self.assertEqual(
+                compiled.check({}, True, True, {"rank": 1}, validator),
+                {"flag": False},
+            )
+
+    def test_compiled_validation(self):
+        methods = ("validate", "validate_update", "validate_replace")
+        with self.app.app_context():
+            for name in ("", "_plain"):
+                for method in methods:
+                    for document in self.documents:
+                        self.assertEqual(
+                            self.outcome("compiled" + name, method, document),
+                            self.outcome("cerberus" + name, method, document),
+                            "%s(%r)" % (method, document),
+                        )
+
+    def test_compiled_validation_error_as_list(self):
+        self.app.config["VALIDATION_ERROR_AS_LIST"] = True
+        self.test_compiled_validation()
+
+
+class TestTimeBudgets(TestCase):
+    def test_operation_max_time_ms(self):
+        self.assertEqual(operation_max_time_ms(None, "find"), None)
+        self.assertEqual(operation_max_time_ms(500, "count"), 500)
+
+        budget = {"find": 500, "count": 1000}
+        self.assertEqual(operation_max_time_ms(budget, "find"), 500)
+        self.assertEqual(operation_max_time_ms(budget, "count"), 1000)
+        self.assertEqual(operation_max_time_ms(budget, "aggregate"), None)
+
+        for budget in (0, -1, "500", 1.5, True, {"insert": 500}):
+            self.assertRaises(ValueError, operation_max_time_ms, budget, "find")
+
+    def test_request_max_time_ms(self):
+        self.assertEqual(request_max_time_ms(None), None)
+        self.assertEqual(request_max_time_ms(500), 500)
+        self.assertEqual(request_max_time_ms({"find": 500, "count": 1000}), 1000)
+
+
 class TestMongoDriver(TestBase):
     def test_combine_queries(self):
         mongo = Mongo(None)
@@ -475,6 +1216,276 @@ class TestMongoDriver(TestBase):
         self.assertTrue(mongo.query_contains_field(compound_query, "_id"))
         self.assertFalse(mongo.query_contains_field(compound_query, "fake-field"))
 
+    def test_mongotize_schema_types(self):
+        oid = "507c7f79bcf86cd7994f6c0e"
+        date = "Tue, 01 Oct 2013 00:59:22 GMT"
+        with self.app.app_context():
+            spec = self.app.data._mongotize(
+                {
+                    "tid": {"$in": [oid, "not-an-id"]},
+                    "born": {"$gt": date},
+                    "title": date,
+                    "rows": {"$elemMatch": {"sku": oid}},
+                    "unknown": date,
+                    "$or": [{"id_list": oid}, {"location.city": date}],
+                },
+                self.known_resource,
+            )
+        self.assertEqual(spec["tid"]["$in"], [ObjectId(oid), "not-an-id"])
+        self.assertTrue(isinstance(spec["born"]["$gt"], datetime))
+        self.assertEqual(spec["title"], date)
+        self.assertEqual(spec["rows"]["$elemMatch"]["sku"], ObjectId(oid))
+        self.assertTrue(isinstance(spec["unknown"], datetime))
+        self.assertEqual(spec["$or"][0]["id_list"], ObjectId(oid))
+        self.assertEqual(spec["$or"][1]["location.city"], date)
+
+    def test_mongotize_objectid_as_string(self):
+        oid = "507c7f79bcf86cd7994f6c0e"
+        self.domain[self.known_resource]["query_objectid_as_string"] = True
+        with self.app.app_context():
+            spec = self.app.data._mongotize(
+                {"tid": oid, "rows.sku": oid, "unknown": oid}, self.known_resource
+            )
+        self.assertEqual(spec["tid"], ObjectId(oid))
+        self.assertEqual(spec["rows.sku"], oid)
+        self.assertEqual(spec["unknown"], oid)
+
+    def test_query_guard(self):
+        self.domain[self.known_resource]["mongo_query_guard"] = "reject"
+        r, status = self.get(self.known_resource, '?where={"prog": 1}')
+        self.assert400(status)
+        self.assertTrue("unindexed filter" in r["_error"]["message"])
+
+        r, status = self.get(self.known_resource, '?sort=[("prog", -1)]')
+        self.assert400(status)
+        self.assertTrue("unindexed sort" in r["_error"]["message"])
+
+        where = '?where={"_id": "%s"}' % self.item_id
+        r, status = self.get(self.known_resource, where)
+        self.assert200(status)
+        self.assertEqual(len(r["_items"]), 1)
+
+        self.domain[self.known_resource]["mongo_query_guard"] = "timeout"
+        r, status = self.get(self.known_resource, '?where={"prog": 1}')
+        self.assert200(status)
+
+        self.domain[self.known_resource]["mongo_query_guard"] = "log"
+        r, status = self.get(self.known_resource, '?where={"prog": 1}')
+        self.assert200(status)
+
+    def test_collection_indexes_cache(self):
+        with self.app.app_context():
+            collection = self.app.data.pymongo(self.known_resource).db["contacts"]
+            indexes = self.app.data._collection_indexes(collection)
+            self.assertTrue([("_id", 1)] in indexes)
+
+            collection.create_index([("prog", 1)], name="prog")
+            # index metadata is cached
+            self.assertEqual(self.app.data._collection_indexes(collection), indexes)
+
+            self.app.config["MONGO_INDEX_CACHE_TTL"] = 0
+            self.assertTrue(
+                [("prog", 1)] in self.app.data._collection_indexes(collection)
+            )
+            collection.drop_index("prog")
+
+    def test_read_preference_routing(self):
+        resource_def = self.app.config["DOMAIN"][self.known_resource]
+        resource_def["mongo_read_preference"] = {"find": "secondaryPreferred"}
+        data = self.app.data
+        with self.app.test_request_context(method="GET"):
+            target = data._read_collection(self.known_resource, "contacts", "find")
+            self.assertEqual(target.read_preference.mongos_mode, "secondaryPreferred")
+            target = data._read_collection(self.known_resource, "contacts", "find_one")
+            self.assertEqual(target.read_preference.mongos_mode, "primary")
+
+        # lookups performed while serving writes always go to the primary.
+        with self.app.test_request_context(method="PATCH"):
+            target = data._read_collection(self.known_resource, "contacts", "find")
+            self.assertEqual(target.read_preference.mongos_mode, "primary")
+
+    def test_causal_consistency_token(self):
+        resource_def = self.app.config["DOMAIN"][self.known_resource]
+        header = self.app.config["CAUSAL_TOKEN_HEADER"]
+
+        with self.app.test_request_context(headers={header: "token"}):
+            self.assertEqual(self.app.data._write_session(self.known_resource), None)
+            self.assertEqual(self.app.data._read_session(self.known_resource), None)
+
+        resource_def["mongo_causal_consistency"] = True
+        with self.app.test_request_context():
+            session = self.app.data._write_session(self.known_resource)
+            self.assertTrue(session.options.causal_consistency)
+            self.assertEqual(self.app.data._read_session(self.known_resource), None)
+
+            session.advance_operation_time(Timestamp(42, 1))
+            self.app.data._set_causal_token(session)
+            token = g.causal_token
+
+        with self.app.test_request_context(headers={header: token}):
+            session = self.app.data._read_session(self.known_resource)
+            self.assertEqual(session.operation_time, Timestamp(42, 1))
+
+        with self.app.test_request_context(headers={header: "token"}):
+            with self.assertRaises(BadRequest):
+                self.app.data._read_session(self.known_resource)
+
+    def test_max_time_ms(self):
+        self.app.config["DOMAIN"][self.known_resource]["mongo_max_time_ms"] = {
+            "find": 500,
+            "count": 2000,
+        }
+        max_time_ms = self.app.data._max_time_ms
+        with self.app.test_request_context():
+            self.assertEqual(max_time_ms(self.known_resource, "find"), 500)
+            self.assertEqual(max_time_ms(self.known_resource, "find", 100), 100)
+            # the request deadline is shared by all the operations.
+            self.assertTrue(1900 < max_time_ms(self.known_resource, "count") <= 2000)
+            self.assertTrue(max_time_ms(self.known_resource, "aggregate") <= 2000)
+
+        # clients can only ask for shorter budgets.
+        header = self.app.config["REQUEST_TIMEOUT_HEADER"]
+        with self.app.test_request_context(headers={header: "5000"}):
+            self.assertTrue(max_time_ms(self.known_resource, "count") <= 2000)
+        with self.app.test_request_context(headers={header: "200"}):
+            self.assertTrue(max_time_ms(self.known_resource, "count") <= 200)
+
+        with self.app.test_request_context(headers={header: "50"}):
+            max_time_ms(self.known_resource, "find")
+            time.sleep(0.06)
+            with self.assertRaises(ServiceUnavailable) as context:
+                max_time_ms(self.known_resource, "count")
+            self.assertEqual(context.exception.retry_after, 1)
+
+        # reads performed by write requests have no deadline.
+        with self.app.test_request_context(method="PATCH", headers={header: "50"}):
+            max_time_ms(self.known_resource, "find")
+            time.sleep(0.06)
+            self.assertEqual(max_time_ms(self.known_resource, "count"), 2000)
+
+    def test_execution_timeout(self):
+        @self.app.route("/timeout")
+        def timeout():
+            raise ExecutionTimeout("operation exceeded time limit", 50)
+
+        r = self.test_client.get("/timeout")
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(r.headers["Retry-After"], "1")
+        self.assertEqual(json.loads(r.get_data())["_error"]["code"], 503)
+
+    def test_normalize_query_equivalence(self):
+        db = self.connection[MONGO_DBNAME]
+        for query in NORMALIZER_CORPUS:
+            expected = [d["_id"] for d in db.contacts.find(query).sort("_id", 1)]
+            normalized = normalize_query(query)
+            result = [d["_id"] for d in db.contacts.find(normalized).sort("_id", 1)]
+            self.assertEqual(result, expected, query)
+
+    def test_index_hints(self):
+        collection = self.connection[MONGO_DBNAME].contacts
+        collection.create_index("ref", name="ref")
+        resource_def = self.app.config["DOMAIN"][self.known_resource]
+        resource_def["datasource"]["hints"] = [{"index": "ref", "fields": ["ref"]}]
+        data = self.app.data
+
+        req = ParsedRequest()
+        req.hint = "_id_"
+        with self.app.test_request_context():
+            hint = data._query_hint(self.known_resource, req, collection, {}, None)
+            self.assertEqual(hint, None)
+            hint = data._query_hint(
+                self.known_resource, req, collection, {"ref": "x"}, None
+            )
+            self.assertEqual(hint, "ref")
+
+        # authenticated users can't force hints while ADMIN_ROLES is empty.
+        self.app.auth = ValidBasicAuth()
+        auth = [("Authorization", "Basic YWRtaW46c2VjcmV0")]
+        with self.app.test_request_context(headers=auth):
+            hint = data._query_hint(
+                self.known_resource, req, collection, {"ref": "x"}, None
+            )
+            self.assertEqual(hint, "ref")
+
+        self.app.config["ADMIN_ROLES"] = ["admin"]
+        with self.app.test_request_context(headers=auth):
+            hint = data._query_hint(
+                self.known_resource, req, collection, {"ref": "x"}, None
+            )
+            self.assertEqual(hint, "_id_")
+            req.hint = "unknown"
+            with self.assertRaises(BadRequest):
+                data._query_hint(self.known_resource, req, collection, {}, None)
+
+        # both the page query and its count are hinted.
+        where = '{"ref": "%s"}' % self.item_ref
+        url = "%s?where=%s&hint=ref" % (self.known_resource_url, where)
+        r = self.test_client.get(url, headers=auth)
+        self.assert200(r.status_code)
+        self.assertEqual(r.get_json()["_meta"]["total"], 1)
+
+    def test_materialize(self):
+        self.app.register_resource(
+            "totals",
+            {
+                "datasource": {
+                    "source": "contacts",
+                    "aggregation": {
+                        "pipeline": [{"$match": {"_id": "$ref"}}],
+                        "materialize": {
+                            "pipeline": [
+                                {"$group": {"_id": "$ref", "count": {"$sum": 1}}}
+                            ]
+                        },
+                    },
+                }
+            },
+        )
+        db = self.connection[MONGO_DBNAME]
+        states = db[self.app.config["MATERIALIZATIONS_COLLECTION"]]
+
+        r = self.test_client.get("/totals")
+        self.assert200(r.status_code)
+        meta = r.get_json()["_meta"]
+        self.assertFalse(meta["materialized"]["stale"])
+        self.assertIsNotNone(meta["materialized"]["updated"])
+        self.assertEqual(db.totals_materialized.count_documents({}), meta["total"])
+        refreshed = states.find_one({"_id": "totals"})["refreshed"]
+
+        # parameterized requests query the materialized results.
+        url = '/totals?aggregate={"$ref": "%s"}' % self.item_ref
+        r = self.test_client.get(url)
+        items = r.get_json()["_items"]
+        self.assertEqual(items, [{"_id": self.item_ref, "count": 1}])
+        self.assertEqual(states.find_one({"_id": "totals"})["refreshed"], refreshed)
+
+        # writes on the source resource trigger a refresh on the next read.
+        headers = [("If-Match", self.item_etag)]
+        r = self.test_client.delete(self.item_id_url, headers=headers)
+        self.assert204(r.status_code)
+        state = states.find_one({"_id": "totals"})
+        self.assertGreaterEqual(state["written"], refreshed)
+        r = self.test_client.get(url)
+        self.assertEqual(r.get_json()["_items"], [])
+        self.assertGreater(states.find_one({"_id": "totals"})["refreshed"], refreshed)
+
+        # a pending refresh serves the current results as stale.
+        with self.app.test_request_context():
+            self.app.data.materialize("totals", force=True)
+            lease = {"lease": time.time() + 60, "written": time.time()}
+            states.update_one({"_id": "totals"}, {"$set": lease})
+            self.assertTrue(self.app.data.materialize("totals")["stale"])
+
+        # the datasource filter applies to the materialized results.
+        settings = copy.deepcopy(self.domain["totals"])
+        settings["datasource"]["filter"] = {"ref": self.item_ref}
+        settings["datasource"]["aggregation"]["materialize"]["collection"] = "filtered"
+        self.app.register_resource("filtered", settings)
+        db.contacts.update_one({}, {"$set": {"ref": self.item_ref}})
+        r = self.test_client.get("/filtered")
+        self.assertEqual(db.filtered.count_documents({}), 1)
+        self.assertEqual(db.filtered.find_one()["_id"], self.item_ref)
+
     def test_delete_returns_status(self):
         db = self.connection[MONGO_DBNAME]
         count = db.contacts.count_documents({})
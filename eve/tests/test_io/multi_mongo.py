@@ -4,6 +4,7 @@ from datetime import datetime
 import pytest
 import simplejson as json
 from bson import ObjectId
+from flask import g
 from pymongo import MongoClient
 from pymongo.errors import OperationFailure
 
@@ -99,6 +100,20 @@ class TestMethodsAcrossMultiMongo(TestMultiMongo):
         new = db.contacts.find_one({id_field: ObjectId(r[id_field])})
         self.assertTrue(new is not None)
 
+    def test_post_group_commit_multidb(self):
+        # group commits only batch documents inserted into the same database.
+        self.domain["works"]["group_commit"] = True
+        with self.app.test_request_context():
+            self.assertEqual(self.app.data.insert_target("works"), ("works", "MONGO1"))
+            g.mongo_prefix = "MONGO"
+            self.assertEqual(self.app.data.insert_target("works"), ("works", "MONGO"))
+
+        work = self._save_work()
+        db = self.connection[MONGO1_DBNAME]
+        id_field = self.domain["works"]["id_field"]
+        new = db.works.find_one({id_field: ObjectId(work[id_field])})
+        self.assertTrue(new is not None)
+
     def test_patch_multidb(self):
         # test that a PATCH on 'works' udpates data on MONGO1
         work = self._save_work()
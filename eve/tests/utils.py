@@ -4,12 +4,15 @@ import copy
 import hashlib
 from datetime import datetime, timedelta
 
+from bson import SON
 from bson.json_util import dumps
 
 from eve.tests import TestBase
-from eve.utils import (config, date_to_str, debug_error_message, document_etag,
-                       extract_key_values, import_from_string, parse_request,
-                       querydef, str_to_date, validate_filters, weak_date)
+from eve.utils import (AggregationTemplate, aggregation_template, config,
+                       date_to_str, debug_error_message, document_diff,
+                       document_etag, extract_key_values, import_from_string,
+                       parse_request, querydef, str_to_date, validate_filters,
+                       weak_date)
 
 
 class TestUtils(TestBase):
@@ -212,6 +215,47 @@ class TestUtils(TestBase):
             list(extract_key_values("key1", test)), ["value1", "value2", "value3"]
         )
 
+    def test_document_diff(self):
+        original = {
+            "name": "a",
+            "qty": 1,
+            "contact": {"email": "a@b.c", "phone": "123", "address": {"city": "x"}},
+            "tags": ["x", "y"],
+            "rows": [{"qty": 1, "note": "n"}],
+        }
+        updates = {
+            "qty": 1.0,
+            "contact": {"email": "b@b.c", "phone": "123", "address": {}},
+            "tags": ["x", "z"],
+            "rows": [{"qty": 2}, {"qty": 3}],
+            "new": {"a.b": 1},
+        }
+        set_, unset = document_diff(updates, original)
+        self.assertEqual(
+            set_,
+            {
+                "qty": 1.0,
+                "contact.email": "b@b.c",
+                "tags.1": "z",
+                "rows": [{"qty": 2}, {"qty": 3}],
+                "new": {"a.b": 1},
+            },
+        )
+        self.assertEqual(unset, ["contact.address.city"])
+
+        updates = {"contact": {"email": "a@b.c", "a.b": 1}, "rows": [{"qty": 1}]}
+        set_, unset = document_diff(updates, original)
+        self.assertEqual(set_, {"contact": updates["contact"]})
+        self.assertEqual(unset, ["rows.0.note"])
+
+        original = {"contact": {"": 1, "email": "a@b.c"}, "rows": [{"": 1}]}
+        updates = {"contact": {"email": "b@b.c"}, "rows": [{"": 2}]}
+        set_, unset = document_diff(updates, original)
+        self.assertEqual(
+            set_, {"contact": updates["contact"], "rows.0": updates["rows"][0]}
+        )
+        self.assertEqual(unset, [])
+
     def test_debug_error_message(self):
         with self.app.test_request_context():
             self.app.config["DEBUG"] = False
@@ -287,6 +331,105 @@ class TestUtils(TestBase):
                 is None
             )
 
+    def test_validate_filters_values(self):
+        self.app.config["VALIDATE_FILTERS"] = True
+        with self.app.test_request_context():
+            valid = [
+                {"prog": 1},
+                {"prog": {"$gt": 1, "$lte": 10}},
+                {"prog": {"$in": [1, 2]}},
+                {"prog": {"$exists": False}},
+                {"role": "agent"},
+                {"role": ["agent", "client"]},
+                {"role": {"$all": ["agent", "vendor"]}},
+                {"rows.price": {"$gte": 1}},
+                {"rows": {"$elemMatch": {"price": 1}}},
+                {"$or": [{"prog": 1}, {"role": "agent"}]},
+            ]
+            for where in valid:
+                self.assertTrue(
+                    validate_filters(where, self.known_resource) is None, where
+                )
+
+            invalid = [
+                ({"prog": "one"}, "prog"),
+                ({"prog": {"$gt": "one"}}, "prog"),
+                ({"prog": {"$in": 1}}, "prog"),
+                ({"prog": {"$size": "one"}}, "prog"),
+                ({"role": "manager"}, "role"),
+                ({"rows": {"$elemMatch": {"price": "free"}}}, "rows"),
+                ({"prog": 1, "tid": "1234"}, "tid"),
+                ({"$or": [{"prog": 1}, {"prog": "one"}]}, "prog"),
+            ]
+            for where, key in invalid:
+                self.assertEqual(
+                    validate_filters(where, self.known_resource),
+                    "filter on '%s' is invalid" % key,
+                )
+
+    def test_validate_filters_recompiled(self):
+        resource_def = self.app.config["DOMAIN"][self.known_resource]
+        resource_def["allowed_filters"] = ["key"]
+        with self.app.test_request_context():
+            self.assertIsNone(validate_filters({"key": "val"}, self.known_resource))
+            compiled = resource_def["_filters"]
+            self.assertIsNone(validate_filters({"key": "val"}, self.known_resource))
+            self.assertTrue(resource_def["_filters"] is compiled)
+
+            resource_def["allowed_filters"] = ["ref"]
+            self.assertEqual(
+                validate_filters({"key": "val"}, self.known_resource),
+                "filter on 'key' not allowed",
+            )
+            self.assertTrue(resource_def["_filters"] is not compiled)
+            compiled = resource_def["_filters"]
+            self.assertTrue(copy.deepcopy(resource_def)["_filters"] is compiled)
+
+    def test_aggregation_template(self):
+        pipeline = [
+            {"$match": {"date": {"$gte": "$date"}, "x": "$x", "y": {}}},
+            {"$unwind": "$tags"},
+            {"$match": {"$or": [{"tags": "$tags"}, {"x": ["$x"]}]}},
+            {"$sort": SON([("count", -1), ("_id", -1)])},
+            {"$project": {}},
+        ]
+        template = AggregationTemplate(pipeline)
+        self.assertEqual(len(template.pipeline), 4)
+        self.assertEqual(template.placeholders, set(["$date", "$x", "$tags"]))
+
+        self.assertEqual(
+            template.render({"$x": 4, "$other": 1}),
+            [
+                {"$match": {"date": {"$gte": "$date"}, "x": 4}},
+                {"$unwind": "$tags"},
+                {"$match": {"$or": [{"tags": "$tags"}, {"x": [4]}]}},
+                {"$sort": SON([("count", -1), ("_id", -1)])},
+            ],
+        )
+
+        # stages left empty by the client values are pruned.
+        rendered = template.render({"$date": {}, "$x": {}, "$tags": {"$in": [1]}})
+        self.assertEqual(rendered[0], {"$unwind": {"$in": [1]}})
+        self.assertEqual(rendered[1]["$match"]["$or"][0], {"tags": {"$in": [1]}})
+        self.assertTrue(isinstance(rendered[2]["$sort"], SON))
+
+        # rendered pipelines can be updated in place.
+        rendered[1]["$match"]["$or"][1]["x"].append(5)
+        rendered[2]["$sort"]["count"] = 1
+        self.assertEqual(template.pipeline[2]["$match"]["$or"][1], {"x": ["$x"]})
+        self.assertEqual(template.pipeline[3]["$sort"]["count"], -1)
+        self.assertEqual(pipeline[0]["$match"]["y"], {})
+
+    def test_aggregation_template_recompiled(self):
+        resource_def = {"datasource": {"aggregation": {"pipeline": [{"$x": 1}]}}}
+        compiled = aggregation_template(resource_def)
+        self.assertTrue(aggregation_template(resource_def) is compiled)
+        self.assertTrue(copy.deepcopy(resource_def)["_aggregation"] is compiled)
+
+        resource_def["datasource"]["aggregation"]["pipeline"] = [{"$y": 1}]
+        self.assertEqual(aggregation_template(resource_def).render({}), [{"$y": 1}])
+        self.assertTrue(resource_def["_aggregation"] is not compiled)
+
     def test_import_from_string(self):
         dt = import_from_string("datetime.datetime")
         self.assertEqual(dt, datetime)
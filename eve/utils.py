@@ -11,7 +11,9 @@
 """
 
 import hashlib
+import itertools
 import sys
+import threading
 from copy import deepcopy
 from datetime import datetime, timedelta
 from importlib import import_module
@@ -52,6 +54,9 @@ config = Config()
 class ParsedRequest():
     """This class, by means of its attributes, describes a client request.
 
+    .. versionchanged:: 2.2
+       'hint', 'explain' and 'named_query' keywords.
+
     .. versionchanged:: 9,5
        'args' keyword.
 
@@ -97,6 +102,18 @@ class ParsedRequest():
     # `aggregation` value of the query string (?aggregation). Defaults to None.
     aggregation = None
 
+    # `hint` value of the query string (?hint). Only honored for requests
+    # authorized with ADMIN_ROLES. Defaults to None.
+    hint = None
+
+    # True when `explain` is set in the query string (?explain=1). Only
+    # honored for requests authorized with ADMIN_ROLES. Defaults to False.
+    explain = False
+
+    # `query` value of the query string (?query), the name of a query declared
+    # in the resource 'named_queries'. Defaults to None.
+    named_query = None
+
     # `args` value of the original request. Defaults to None.
     args = None
 
@@ -107,6 +124,10 @@ def parse_request(resource):
 
     :param resource: the resource currently being accessed by the client.
 
+    .. versionchanged:: 2.2
+       Support for index hints ('?hint='), explain mode ('?explain=1') and
+       named queries ('?query=').
+
     .. versionchanged:: 0.7
        Handle ETag values surrounded by double quotes. Closes #794.
 
@@ -140,8 +161,12 @@ def parse_request(resource):
         r.embedded = args.get(config.QUERY_EMBEDDED)
     if settings["datasource"]["aggregation"]:
         r.aggregation = args.get(config.QUERY_AGGREGATION)
+    if settings["named_queries"]:
+        r.named_query = args.get(config.QUERY_NAMED)
 
     r.show_deleted = config.SHOW_DELETED_PARAM in args
+    r.hint = args.get(config.QUERY_HINT)
+    r.explain = args.get(config.QUERY_EXPLAIN) in ("1", "true")
 
     max_results_default = config.PAGINATION_DEFAULT if settings["pagination"] else 0
     try:
@@ -406,6 +431,54 @@ def extract_key_values(key, d):
                 yield j
 
 
+def document_diff(updates, original):
+    """Returns the minimal changes which apply `updates` to the `original`
+    document, as a dict of the values to be set and a list of the fields to
+    be removed, both addressed by dotted paths. Subdocuments, and lists which
+    keep their length, are compared item by item, so that only the values
+    which actually changed are set.
+
+    :param updates: the new values of the updated fields.
+    :param original: the original document.
+
+    .. versionadded:: 2.2
+    """
+    set_ = {}
+    unset = []
+
+    def diff(value, original, path):
+        if isinstance(value, dict) and isinstance(original, dict):
+            if any(
+                key == "" or "." in key or key.startswith("$")
+                for key in itertools.chain(value, original)
+            ):
+                # these can't be addressed by dotted paths.
+                set_[path] = value
+                return
+            for key, item in value.items():
+                if key in original:
+                    diff(item, original[key], "%s.%s" % (path, key))
+                else:
+                    set_["%s.%s" % (path, key)] = item
+            unset.extend("%s.%s" % (path, key) for key in original if key not in value)
+        elif (
+            isinstance(value, list)
+            and isinstance(original, list)
+            and len(value) == len(original)
+        ):
+            for index, (item, original_item) in enumerate(zip(value, original)):
+                diff(item, original_item, "%s.%d" % (path, index))
+        elif type(value) is not type(original) or value != original:
+            set_[path] = value
+
+    for field, value in updates.items():
+        if field in original:
+            diff(value, original[field], field)
+        else:
+            set_[field] = value
+    return set_, unset
+
+
 def debug_error_message(msg):
     """Returns the error message `msg` if config.DEBUG is True
     otherwise returns `None` which will cause Werkzeug to provide
@@ -420,106 +493,366 @@ def debug_error_message(msg):
     return None
 
 
-def validate_filters(where, resource):
-    """Report any filter which is not allowed by  `allowed_filters`
+class FilterValidator():
+    """Validates the filters (``?where=``) sent to a resource, against its
+    'allowed_filters' and, when VALIDATE_FILTERS is enabled, its schema.
 
-    :param where: the where clause, as a dict.
-    :param resource: the resource being inspected.
+    Everything which does not depend on the actual filter is computed once:
+    the set of allowed fields, the rules of every (dotted) field path in the
+    schema, and the Cerberus validators for each of them, which are built on
+    first use and cached per thread (validators are stateful). Values are
+    validated according to the query operator they are used with, so that
+    ``{"prog": {"$gt": 1}}`` validates ``1`` against the rules of 'prog'.
 
-    .. versionchanged: 0.5
-       If the data layer supports a list of allowed operators, take them
-       into consideration when validating the query string (#388).
-       Recursively validate the whole query string.
+    Rules which are about the document being stored rather than about the
+    type and format of a value (such as 'required', 'readonly', 'unique' or
+    'data_relation') are ignored.
 
-    .. versionadded: 0.0.9
+    :param allowed_filters: the resource 'allowed_filters'.
+    :param schema: the resource schema.
+    :param validator: the validator class.
+    :param operators: the query operators supported by the data layer.
+
+    .. versionadded:: 2.2
     """
-    operators = getattr(app.data, "operators", set())
-    allowed = config.DOMAIN[resource]["allowed_filters"] + list(operators)
 
-    def validate_filter(filter):
-        for key, value in filter.items():
-            if "*" not in allowed:
+    # rules which do not apply to filter values.
+    ignored_rules = (
+        "required",
+        "readonly",
+        "unique",
+        "unique_to_user",
+        "unique_within_resource",
+        "data_relation",
+        "dependencies",
+        "excludes",
+        "default",
+        "default_setter",
+    )
 
-                def recursive_check_allowed(filter_key, allowed_filters):
-                    if filter_key not in allowed_filters:
-                        base_composed_key, _, _ = filter_key.rpartition(".")
-                        return base_composed_key and recursive_check_allowed(
-                            base_composed_key, allowed_filters
-                        )
+    logical_operators = ("$or", "$and", "$nor")
+    value_operators = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte")
+    list_operators = ("$in", "$nin", "$all")
+
+    def __init__(self, allowed_filters, schema, validator, operators=()):
+        self.allowed_filters = list(allowed_filters)
+        self.schema = schema
+        self.validator = validator
+        self.allowed = set(self.allowed_filters) | set(operators)
+        self.wildcard = "*" in self.allowed
+        self.fields = {}
+        self._compile_fields(schema, "")
+        self._local = threading.local()
+
+    def __deepcopy__(self, memo):
+        # compiled state is immutable, and validators are per-thread anyway.
+        return self
+
+    def is_current(self, allowed_filters, schema, validator):
+        """Returns True if the validator has been compiled for the given
+        settings. Schemas are compared by identity: replacing the schema of a
+        resource (as registering it again does) is detected, while changing
+        it in place is not, and requires the '_filters' setting to be
+        dropped.
+        """
+        return (
+            self.schema is schema
+            and self.validator is validator
+            and self.allowed_filters == list(allowed_filters)
+        )
 
-                    return True
+    def validate(self, where, validate_values=False):
+        """Returns an error message for the first invalid filter found in the
+        `where` clause, or None if all of them are valid.
 
-                if not recursive_check_allowed(key, allowed):
-                    return "filter on '%s' not allowed" % key
+        :param where: the where clause, as a dict.
+        :param validate_values: whether filter values should be validated
+                                against the schema.
+        """
+        for key, value in where.items():
+            if not self.is_allowed(key):
+                return "filter on '%s' not allowed" % key
 
-            if key in ("$or", "$and", "$nor"):
+            if key in self.logical_operators:
                 if not isinstance(value, list):
                     return "operator '%s' expects a list of sub-queries" % key
                 for v in value:
                     if not isinstance(v, dict):
                         return "operator '%s' expects a list of sub-queries" % key
-                    r = validate_filter(v)
+                    r = self.validate(v, validate_values)
                     if r:
                         return r
+            elif validate_values and not key.startswith("$"):
+                if not self.is_valid(key, value):
+                    return "filter on '%s' is invalid" % key
+        return None
+
+    def is_allowed(self, key):
+        """Returns True if filtering on `key` is allowed, either because it is
+        an allowed field or operator, or because one of its parent fields is
+        allowed.
+        """
+        if self.wildcard or key in self.allowed:
+            return True
+        while "." in key:
+            key = key.rpartition(".")[0]
+            if key in self.allowed:
+                return True
+        return False
+
+    def is_valid(self, path, value):
+        """Returns True if `value` is a valid filter value for the field at
+        `path`.
+        """
+        return any(
+            self._is_valid(path, i, rules, value)
+            for i, rules in enumerate(self.fields.get(path, ()))
+        )
+
+    def _is_valid(self, path, i, rules, value):
+        if isinstance(value, dict) and value and all(k[0] == "$" for k in value):
+            return all(
+                self._is_valid_operation(path, i, rules, op, arg)
+                for op, arg in value.items()
+            )
+        return self._check(path, i, rules, value)
+
+    def _is_valid_operation(self, path, i, rules, op, arg):
+        if op in self.value_operators:
+            return self._check(path, i, rules, arg)
+        if op in self.list_operators:
+            return isinstance(arg, list) and all(
+                self._check(path, i, rules, v) for v in arg
+            )
+        if op == "$not":
+            return not isinstance(arg, dict) or self._is_valid(path, i, rules, arg)
+        if op == "$exists":
+            return isinstance(arg, (bool, int))
+        if op == "$size":
+            return isinstance(arg, int) and not isinstance(arg, bool)
+        if op == "$elemMatch":
+            if not isinstance(arg, dict):
+                return False
+            if all(k[0] == "$" for k in arg):
+                return all(
+                    self._is_valid_operation(path, i, rules, k, v)
+                    for k, v in arg.items()
+                )
+            return all(self.is_valid("%s.%s" % (path, k), v) for k, v in arg.items())
+        # other operators ($regex, $type, geo operators, etc.) are not
+        # checked against the field rules.
+        return True
+
+    def _check(self, path, i, rules, value):
+        """Validates a value as either the whole field value or, for list
+        fields, one of its items (MongoDB matches both).
+        """
+        if self._validate(path, i, rules, value):
+            return True
+        if rules.get("type") == "list" and not isinstance(value, list):
+            return self._validate(path, i, rules, [value])
+        return False
+
+    def _validate(self, path, i, rules, value):
+        validators = getattr(self._local, "validators", None)
+        if validators is None:
+            validators = self._local.validators = {}
+        field = path.rpartition(".")[2]
+        v = validators.get((path, i))
+        if v is None:
+            v = validators[(path, i)] = self.validator({field: rules})
+        return v.validate({field: value})
+
+    def _compile_fields(self, schema, prefix):
+        if not isinstance(schema, dict):
+            return
+        for field, rules in schema.items():
+            if not isinstance(rules, dict):
+                continue
+            path = "%s.%s" % (prefix, field) if prefix else field
+            self.fields.setdefault(path, []).append(
+                dict((k, v) for k, v in rules.items() if k not in self.ignored_rules)
+            )
+            for sub_schema in self._sub_schemas(rules):
+                self._compile_fields(sub_schema, path)
+
+    def _sub_schemas(self, rules):
+        def dict_sub_schema(base):
+            if isinstance(base, dict) and base.get("type") == "dict":
+                return base.get("schema")
+            return None
+
+        if rules.get("type") == "list":
+            if "schema" in rules:
+                candidates = [rules["schema"]]
             else:
-                if config.VALIDATE_FILTERS:
-
-                    def get_sub_schemas(base_schema):
-                        def dict_sub_schema(base):
-                            if base.get("type") == "dict":
-                                return base.get("schema")
-
-                            return None
-
-                        if base_schema.get("type") == "list":
-                            if "schema" in base_schema:
-                                # Try to get dict sub-schema for arbitrary
-                                # sized list
-                                sub = dict_sub_schema(base_schema["schema"])
-                                return [sub] if sub is not None else []
-                            if "items" in base_schema:
-                                # Try to get dict sub-schema(s) for
-                                # fixed-size list
-                                items = base_schema["items"]
-                                sub_schemas = []
-                                for item in items:
-                                    sub = dict_sub_schema(item)
-                                    if sub is not None:
-                                        sub_schemas.append(sub)
-
-                                return sub_schemas
-                        else:
-                            sub = dict_sub_schema(base_schema)
-                            return [sub] if sub is not None else []
-
-                    def recursive_validate_filter(key, value, schema):
-                        if key not in schema:
-                            base_key, _, sub_keys = key.partition(".")
-                            if sub_keys and base_key in schema:
-                                # key is the composition of base field and
-                                # sub-fields
-                                sub_schemas = get_sub_schemas(schema[base_key])
-                                for sub_schema in sub_schemas:
-                                    if recursive_validate_filter(
-                                        sub_keys, value, sub_schema
-                                    ):
-                                        return True
-
-                            return False
-                        field_schema = schema.get(key)
-                        v = app.validator({key: field_schema})
-                        return v.validate({key: value})
-
-                    res_schema = config.DOMAIN[resource]["schema"]
-                    if not recursive_validate_filter(key, value, res_schema):
-                        return "filter on '%s' is invalid" % key
-
-                    return None
+                candidates = rules.get("items") or []
+        else:
+            candidates = [rules]
+        return [s for s in map(dict_sub_schema, candidates) if s is not None]
+
+
+def validate_filters(where, resource):
+    """Report any filter which is not allowed by  `allowed_filters`
+
+    :param where: the where clause, as a dict.
+    :param resource: the resource being inspected.
+
+    .. versionchanged:: 2.2
+       Rely on a precompiled :class:`FilterValidator`, stored with the
+       resource settings. Validation is operator-aware, and all the keys of
+       the where clause are validated.
+
+    .. versionchanged: 0.5
+       If the data layer supports a list of allowed operators, take them
+       into consideration when validating the query string (#388).
+       Recursively validate the whole query string.
+
+    .. versionadded: 0.0.9
+    """
+    resource_def = config.DOMAIN[resource]
+    allowed = resource_def["allowed_filters"]
 
     if "*" in allowed and not config.VALIDATE_FILTERS:
         return None
 
-    return validate_filter(where)
+    filters = filter_validator(resource_def, app.validator, app.data)
+    return filters.validate(where, config.VALIDATE_FILTERS)
+
+
+def filter_validator(resource_def, validator, data):
+    """Returns the :class:`FilterValidator` of a resource, compiling it if
+    it is missing or if the resource settings have been replaced since it
+    was compiled. See :meth:`FilterValidator.is_current`.
+
+    :param resource_def: the resource settings.
+    :param validator: the validator class.
+    :param data: the data layer.
+
+    .. versionadded:: 2.2
+    """
+    allowed = resource_def["allowed_filters"]
+    schema = resource_def["schema"]
+    filters = resource_def.get("_filters")
+    if filters is None or not filters.is_current(allowed, schema, validator):
+        operators = getattr(data, "operators", set())
+        filters = FilterValidator(allowed, schema, validator, operators)
+        resource_def["_filters"] = filters
+    return filters
+
+
+class AggregationTemplate():
+    """A compiled aggregation pipeline. Empty stages and empty dicts, which
+    would be pruned from every request pipeline, are pruned once, and the
+    positions of the '$placeholder' values are recorded for every stage, so
+    that serving a request only takes a copy of the pipeline with the client
+    values in place, and pruning the stages where a placeholder has been
+    replaced with an empty dict.
+
+    :param pipeline: the aggregation pipeline.
+
+    .. versionadded:: 2.2
+    """
+
+    def __init__(self, pipeline):
+        self.source = pipeline
+        self.pipeline = []
+        self.positions = []
+        self.placeholders = set()
+        for stage in deepcopy(pipeline):
+            self._prune(stage)
+            if not stage:
+                continue
+            positions = {}
+            self._compile(stage, positions)
+            self.pipeline.append(stage)
+            self.positions.append(positions)
+
+    def __deepcopy__(self, memo):
+        # compiled state is never updated in place.
+        return self
+
+    def is_current(self, pipeline):
+        """Returns True if the template has been compiled for the given
+        pipeline.
+        """
+        return self.source is pipeline
+
+    def render(self, values):
+        """Returns a copy of the pipeline, with placeholders replaced by the
+        matching `values` (the client aggregation query). Placeholders which
+        have no value are left untouched, while stages (and stage keys) which
+        are left empty by the replacement are removed.
+        """
+        values = dict(
+            (key, value) for key, value in values.items() if key in self.placeholders
+        )
+        pipeline = []
+        for stage, positions in zip(self.pipeline, self.positions):
+            # the pipeline is copied as hooks and the data layer update it in
+            # place.
+            stage, replaced = self._fill(stage, positions, values)
+            if replaced:
+                self._prune(stage)
+                if not stage:
+                    continue
+            pipeline.append(stage)
+        return pipeline
+
+    def _compile(self, node, positions):
+        items = node.items() if isinstance(node, dict) else enumerate(node)
+        for key, value in items:
+            if isinstance(value, (dict, list)):
+                nested = {}
+                self._compile(value, nested)
+                if nested:
+                    positions[key] = nested
+            elif isinstance(value, str) and value.startswith("$"):
+                positions[key] = value
+                self.placeholders.add(value)
+
+    def _fill(self, node, positions, values):
+        if isinstance(node, dict):
+            filled, keys = node.copy(), list(node)
+        else:
+            filled, keys = list(node), range(len(node))
+        replaced = False
+        for key in keys:
+            position = positions.get(key)
+            if isinstance(position, str):
+                if position in values:
+                    filled[key] = deepcopy(values[position])
+                    replaced = True
+            elif isinstance(filled[key], (dict, list)):
+                filled[key], nested = self._fill(filled[key], position or {}, values)
+                replaced = replaced or nested
+        return filled, replaced
+
+    def _prune(self, node):
+        # only dicts are pruned: a (nested) key is removed when its value is
+        # an empty dict.
+        for key, value in list(node.items()):
+            if isinstance(value, dict):
+                self._prune(value)
+                if not value:
+                    del node[key]
+
+
+def aggregation_template(resource_def):
+    """Returns the :class:`AggregationTemplate` of an aggregation resource,
+    compiling it if it is missing or if the pipeline has been replaced since
+    it was compiled.
+
+    :param resource_def: the resource settings.
+
+    .. versionadded:: 2.2
+    """
+    pipeline = resource_def["datasource"]["aggregation"]["pipeline"]
+    template = resource_def.get("_aggregation")
+    if template is None or not template.is_current(pipeline):
+        template = AggregationTemplate(pipeline)
+        resource_def["_aggregation"] = template
+    return template
 
 
 def auto_fields(resource):
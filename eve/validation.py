@@ -13,6 +13,8 @@
 """
 
 import copy
+import re
+from collections.abc import Iterable, Sized
 
 import cerberus
 import cerberus.errors
@@ -22,13 +24,99 @@ from eve.utils import config
 
 
 class Validator(cerberus.Validator):
+    """
+    .. versionchanged:: 2.2
+       Resources using the 'compiled' validation engine are validated by
+       their compiled schema, falling back to Cerberus when it fails. The
+       expanded Cerberus schema is reused by all the validators of the
+       resource.
+    """
+
     def __init__(self, *args, **kwargs):
         if not config.VALIDATION_ERROR_AS_LIST:
             kwargs["error_handler"] = SingleErrorAsStringErrorHandler
 
         self.is_update_operation = False
+        self.compiled_schema = None
+        self._delegate = None
+
+        resource = kwargs.get("resource")
+        schema = args[0] if args else kwargs.get("schema")
+        compiled = (
+            config.DOMAIN.get(resource, {}).get("_compiled_schema")
+            if resource
+            else None
+        )
+        if (
+            compiled is not None
+            and schema is compiled.schema
+            and not kwargs.get("is_child")
+        ):
+            if compiled.definitions is not None:
+                # skip the expansion and validation of the schema.
+                if args:
+                    args = (compiled.definitions,) + args[1:]
+                else:
+                    kwargs["schema"] = compiled.definitions
+            self.compiled_schema = compiled
+
         super().__init__(*args, **kwargs)
 
+        if self.compiled_schema is not None and compiled.definitions is None:
+            compiled.definitions = self.schema
+
+    def validate(self, document, schema=None, update=False, normalize=True):
+        """Normalizes and validates `document`. See
+        :meth:`cerberus.Validator.validate`.
+
+        When the resource uses the 'compiled' validation engine, the document
+        is checked by the compiled schema, and only the fields it does not
+        cover are validated by Cerberus. Should the compiled checks fail,
+        the whole document is validated by Cerberus, so that errors are
+        reported as usual.
+
+        .. versionadded:: 2.2
+        """
+        compiled = self.compiled_schema
+        if compiled is not None and schema is None:
+            persisted = self.persisted_document if self.is_update_operation else None
+            normalized = compiled.check(document, update, normalize, persisted, self)
+            if normalized is not None:
+                return self._delegate_validation(normalized, update, normalize)
+        return super().validate(document, schema, update, normalize)
+
+    def _delegate_validation(self, document, update, normalize):
+        """Validates the fields of `document` which are not covered by the
+        compiled schema with Cerberus, and makes the outcome available as
+        if the whole document had been validated.
+        """
+        compiled = self.compiled_schema
+        if compiled.delegated:
+            if self._delegate is None:
+                self._delegate = self.__class__(
+                    compiled.delegated_definitions or compiled.delegated
+                )
+                if compiled.delegated_definitions is None:
+                    compiled.delegated_definitions = self._delegate.schema
+            delegate = self._delegate
+            # share the request state (document id, persisted document, ...)
+            delegate._config.update(self._config)
+            delegate.allow_unknown = True
+            delegate.is_update_operation = self.is_update_operation
+            delegate.validate(
+                document,
+                update=update,
+                normalize=normalize and compiled.delegated_normalization,
+            )
+            document, errors = delegate.document, delegate._errors
+        else:
+            errors = cerberus.errors.ErrorList()
+
+        self.update = update
+        self.document = document
+        self._errors = errors
+        return not bool(errors)
+
     def validate_update(
         self, document, document_id, persisted_document=None, normalize_document=True
     ):
@@ -43,9 +131,7 @@ class Validator(cerberus.Validator):
         self.is_update_operation = True
         self.document_id = document_id
         self.persisted_document = persisted_document
-        return super().validate(
-            document, update=True, normalize=normalize_document
-        )
+        return self.validate(document, update=True, normalize=normalize_document)
 
     def validate_replace(self, document, document_id, persisted_document=None):
         """Validation method to be invoked when performing a document
@@ -63,7 +149,19 @@ class Validator(cerberus.Validator):
         """
         self.document_id = document_id
         self.persisted_document = persisted_document
-        return super().validate(document)
+        return self.validate(document)
+
+    def prepare_bulk(self, documents):
+        """Invoked before the documents of a bulk payload are validated one
+        at a time. Data layer validators can override this in order to
+        perform the checks which require database lookups at once, and to
+        detect conflicts between the documents of the payload.
+
+        :param documents: the documents to be validated.
+
+        .. versionadded:: 2.2
+        """
+        pass
 
     def _normalize_default(self, mapping, schema, field):
         """{'nullable': True}"""
@@ -175,3 +273,302 @@ class SingleErrorAsStringErrorHandler(cerberus.errors.BasicErrorHandler):
                 self._unpack_single_element_lists(tree[field][-1])
             if len(tree[field]) == 1:
                 tree[field] = tree[field][0]
+
+
+# rules checked by compiled schemas. Fields using any other rule (custom
+# rules, nested schemas, coercion, default setters...) are left to Cerberus.
+COMPILED_RULES = frozenset(
+    (
+        "allowed",
+        "default",
+        "empty",
+        "max",
+        "maxlength",
+        "meta",
+        "min",
+        "minlength",
+        "nullable",
+        "regex",
+        "required",
+        "type",
+        "versioned",
+    )
+)
+
+
+NORMALIZATION_RULES = frozenset(
+    (
+        "coerce",
+        "default",
+        "default_setter",
+        "purge_unknown",
+        "readonly",
+        "rename",
+        "rename_handler",
+    )
+)
+
+
+class CompiledSchema():
+    """A resource schema compiled into a specialized Python function, used
+    by the 'compiled' validation engine.
+
+    The function applies the defaults of the compiled fields and checks
+    their rules, the same way Cerberus would. It only tells whether a
+    document is valid: errors are always reported by Cerberus, which
+    validates the documents the compiled checks reject. Fields using rules
+    which are not in :data:`COMPILED_RULES` are validated by Cerberus.
+
+    :param validator: the validator class, which provides the types.
+    :param schema: the resource schema.
+    :param allow_unknown: the resource 'allow_unknown' setting.
+
+    .. versionadded:: 2.2
+    """
+
+    def __init__(self, validator, schema, allow_unknown=False):
+        self.schema = schema
+        self.allow_unknown = allow_unknown
+        self.compiled = {}
+        self.delegated = {}
+        for field, rules in schema.items():
+            if _compilable(validator, rules):
+                self.compiled[field] = rules
+            else:
+                self.delegated[field] = rules
+
+        # whether the delegated fields have rules which apply at
+        # normalization time, for Cerberus normalization is costly.
+        self.delegated_normalization = _normalizes(self.delegated)
+
+        # the expanded Cerberus schemas, set by the first validator.
+        self.definitions = None
+        self.delegated_definitions = None
+
+        self.source, namespace = _generate_check(
+            validator, self.compiled, set(schema), allow_unknown
+        )
+        exec(compile(self.source, "<compiled schema>", "exec"), namespace)
+        self._check = namespace["check"]
+
+    def __deepcopy__(self, memo):
+        # the compiled function is never updated.
+        return self
+
+    def check(self, document, update, normalize, persisted, validator):
+        """Returns a normalized copy of `document` if the compiled fields are
+        valid, None otherwise.
+
+        :param document: the document to be validated.
+        :param update: whether required fields should be ignored.
+        :param normalize: whether defaults should be applied.
+        :param persisted: the persisted document of an update (PATCH), whose
+                          fields do not get a default.
+        :param validator: the validator instance, which checks custom types.
+        """
+        if not isinstance(document, dict):
+            return None
+        document = copy.copy(document)
+        try:
+            if self._check(document, update, normalize, persisted, validator):
+                return document
+        except Exception:
+            # let Cerberus deal with it.
+            pass
+        return None
+
+
+def compile_schema(validator, schema, allow_unknown=False):
+    """Returns the :class:`CompiledSchema` of a resource, or None if the
+    resource cannot use the 'compiled' validation engine, in which case it is
+    validated by Cerberus.
+
+    :param validator: the validator class.
+    :param schema: the resource schema.
+    :param allow_unknown: the resource 'allow_unknown' setting.
+
+    .. versionadded:: 2.2
+    """
+    if not isinstance(allow_unknown, bool):
+        # unknown fields are validated against a schema.
+        return None
+    return CompiledSchema(validator, schema, allow_unknown)
+
+
+def _compilable(validator, rules):
+    if not isinstance(rules, dict) or not COMPILED_RULES.issuperset(rules):
+        return False
+    for rule in ("empty", "nullable", "required"):
+        if not isinstance(rules.get(rule, False), bool):
+            return False
+    for rule in ("minlength", "maxlength"):
+        if not isinstance(rules.get(rule, 0), int):
+            return False
+    if not isinstance(rules.get("regex", ""), str):
+        return False
+    if not isinstance(rules.get("allowed", ()), (list, tuple, set, frozenset)):
+        return False
+    types = rules.get("type", [])
+    for type_ in [types] if isinstance(types, str) else types:
+        if not isinstance(type_, str) or not (
+            type_ in validator.types_mapping
+            or hasattr(validator, "_validate_type_" + type_)
+        ):
+            return False
+    return True
+
+
+def _normalizes(schema):
+    # whether any field of `schema` has rules which apply (or are checked, in
+    # the case of 'readonly') while normalizing.
+    return any(_rules_normalize(rules) for rules in schema.values())
+
+
+def _rules_normalize(rules):
+    if not isinstance(rules, dict):
+        # rules set from the registry.
+        return True
+    for rule, value in rules.items():
+        if rule in NORMALIZATION_RULES or "of_" in rule:
+            return True
+        if rule == "schema":
+            types = rules.get("type")
+            types = [types] if isinstance(types, str) else types or []
+            if isinstance(value, str):
+                return True
+            if "list" not in types and _normalizes(value):
+                return True
+            if "dict" not in types and _rules_normalize(value):
+                return True
+        elif rule in ("keysrules", "valuesrules", "keyschema", "valueschema"):
+            if _rules_normalize(value):
+                return True
+        elif rule in ("allof", "anyof", "noneof", "oneof", "items"):
+            if any(_rules_normalize(item) for item in value):
+                return True
+    return False
+
+
+def _generate_check(validator, compiled, fields, allow_unknown):
+    """Returns the source code of the function checking the `compiled`
+    fields, and the namespace it must be executed in.
+    """
+    namespace = {"Iterable": Iterable, "Sized": Sized}
+
+    def constant(value):
+        name = "_c%d" % len(namespace)
+        namespace[name] = value
+        return name
+
+    lines = ["def check(document, update, normalize, persisted, validator):"]
+
+    defaults = [field for field, rules in compiled.items() if "default" in rules]
+    if defaults:
+        lines.append("    if normalize:")
+        for field in defaults:
+            # like Validator._normalize_default()
+            lines += [
+                "        if %r not in document and (" % field,
+                "            persisted is None or %r not in persisted" % field,
+                "        ):",
+                "            document[%r] = %s"
+                % (field, constant(compiled[field]["default"])),
+            ]
+
+    if not allow_unknown:
+        lines += [
+            "    if not %s.issuperset(document):" % constant(frozenset(fields)),
+            "        return False",
+        ]
+
+    for field, rules in compiled.items():
+        lines += [
+            "    if %r in document:" % field,
+            "        value = document[%r]" % field,
+            "        if value is None:",
+            "            %s" % ("pass" if rules.get("nullable") else "return False"),
+            "        else:",
+        ]
+        checks = _field_checks(validator, rules, constant)
+        lines += ["            " + line for line in checks]
+        if rules.get("required"):
+            lines += ["    elif not update:", "        return False"]
+
+    lines.append("    return True")
+    return "\n".join(lines) + "\n", namespace
+
+
+def _field_checks(validator, rules, constant):
+    """Returns the lines checking the (not None) value of a field, in the
+    order Cerberus validates the rules.
+    """
+    lines = []
+
+    types = rules.get("type")
+    if types:
+        conditions = []
+        for type_ in [types] if isinstance(types, str) else types:
+            definition = validator.types_mapping.get(type_)
+            if definition is not None:
+                conditions.append(
+                    "isinstance(value, %s) and not isinstance(value, %s)"
+                    % (
+                        constant(definition.included_types),
+                        constant(definition.excluded_types),
+                    )
+                )
+            else:
+                conditions.append("validator._validate_type_%s(value)" % type_)
+        lines += ["if not (%s):" % " or ".join(conditions), "    return False"]
+
+    sized = []
+    if "allowed" in rules:
+        allowed = constant(rules["allowed"])
+        sized += [
+            "if isinstance(value, Iterable) and not isinstance(value, str):",
+            "    if any(item not in %s for item in value):" % allowed,
+            "        return False",
+            "elif value not in %s:" % allowed,
+            "    return False",
+        ]
+    if "minlength" in rules:
+        sized += [
+            "if isinstance(value, Iterable) and len(value) < %d:" % rules["minlength"],
+            "    return False",
+        ]
+    if "maxlength" in rules:
+        sized += [
+            "if isinstance(value, Iterable) and len(value) > %d:" % rules["maxlength"],
+            "    return False",
+        ]
+    if "regex" in rules:
+        pattern = rules["regex"]
+        if not pattern.endswith("$"):
+            pattern += "$"
+        sized += [
+            "if isinstance(value, str) and not %s.match(value):"
+            % constant(re.compile(pattern)),
+            "    return False",
+        ]
+
+    if "empty" in rules:
+        # empty values skip the rules about their content.
+        lines.append("if isinstance(value, Sized) and len(value) == 0:")
+        lines.append("    %s" % ("pass" if rules["empty"] else "return False"))
+        if sized:
+            lines.append("else:")
+            lines += ["    " + line for line in sized]
+    else:
+        lines += sized
+
+    for rule, operator in (("min", "<"), ("max", ">")):
+        if rule in rules:
+            lines += [
+                "try:",
+                "    if value %s %s:" % (operator, constant(rules[rule])),
+                "        return False",
+                "except TypeError:",
+                "    pass",
+            ]
+
+    return lines or ["pass"]